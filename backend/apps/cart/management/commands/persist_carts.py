@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from apps.cart.storage import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = '将 Redis 中有变更的购物车回写数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='持续运行，按间隔定期回写')
+        parser.add_argument('--interval', type=float, default=5, help='回写间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=100, help='每批回写的购物车数量')
+
+    def handle(self, *args, **options):
+        storage = get_cart_storage()
+        while True:
+            total = 0
+            while True:
+                count = storage.persist(batch_size=options['batch_size'])
+                total += count
+                if count < options['batch_size']:
+                    break
+            if total:
+                self.stdout.write(f'已回写 {total} 个购物车')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('购物车回写完成'))
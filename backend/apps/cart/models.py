@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from apps.core.dirty_fields import DirtyFieldsMixin
 from apps.users.models import User
 from apps.products.models import Product
 
@@ -17,7 +18,7 @@ class Cart(models.Model):
     def __str__(self):
         return f'{self.user.username}的购物车'
 
-class CartItem(models.Model):
+class CartItem(DirtyFieldsMixin, models.Model):
     """购物车商品"""
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE, verbose_name='购物车')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='商品')
@@ -40,6 +41,6 @@ class CartItem(models.Model):
 
     def save(self, *args, **kwargs):
         """保存前检查库存"""
-        if self.quantity > self.product.stock:
+        if self.quantity > self.product.available_stock:
             raise ValueError('商品库存不足')
         super().save(*args, **kwargs) 
\ No newline at end of file
@@ -1,8 +1,9 @@
 from rest_framework import serializers
-from .models import Cart, CartItem
+from .models import CartItem
 from apps.products.serializers import ProductSerializer
+from apps.core.profiling import ProfiledSerializerMixin
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """购物车商品序列化器"""
     product = ProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
@@ -26,16 +27,14 @@ class CartItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('商品不存在')
         return value
 
-class CartSerializer(serializers.ModelSerializer):
-    """购物车序列化器"""
+class CartSerializer(ProfiledSerializerMixin, serializers.Serializer):
+    """购物车序列化器（序列化购物车存储返回的 CartState）"""
+    id = serializers.IntegerField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Cart
-        fields = ['id', 'items', 'total_price', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
 
     def get_total_price(self, obj):
         """计算购物车总价"""
-        return sum(item.product.price * item.quantity for item in obj.items.filter(selected=True)) 
\ No newline at end of file
+        return sum(item.product.price * item.quantity for item in obj.items if item.selected) 
\ No newline at end of file
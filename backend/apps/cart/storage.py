@@ -0,0 +1,374 @@
+"""
+购物车存储后端
+
+通过 settings.CART_STORAGE['BACKEND'] 选择:
+    apps.cart.storage.DatabaseCartStorage  直接读写 Cart/CartItem 表
+    apps.cart.storage.RedisCartStorage     每个用户一个 Redis hash，由 persist_carts 命令异步回写数据库
+
+两个后端对外提供相同的接口，视图和下单流程只依赖这里的接口。
+购物车商品 ID（CartLine.id，update_item/remove_item/select_item 的 item_id）统一为商品 ID，
+与后端无关，切换后端后前端持有的 ID 仍然有效。
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.products.models import Product
+from .models import Cart, CartItem
+
+
+class CartItemNotFound(Exception):
+    """购物车商品不存在"""
+
+
+class CartLine:
+    """购物车中的一行商品，id 即商品 ID"""
+
+    def __init__(self, id, product_id, quantity, selected, created_at, updated_at):
+        self.id = id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.selected = selected
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.product = None
+
+
+class CartState:
+    """购物车快照"""
+
+    def __init__(self, id, user_id, items, created_at, updated_at):
+        self.id = id
+        self.user_id = user_id
+        self.items = items
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+
+def check_stock(product_id, quantity):
+    """检查可售库存（扣除已预占的数量），只读取库存两列"""
+    stock = Product.objects.filter(id=product_id).values_list('stock', 'reserved_stock').first()
+    if stock is None:
+        raise ValueError('商品不存在')
+    if quantity > stock[0] - stock[1]:
+        raise ValueError('商品库存不足')
+
+
+class BaseCartStorage:
+    def __init__(self, **options):
+        self.options = options
+
+    def get_cart(self, user):
+        raise NotImplementedError
+
+    def add_item(self, user, product_id, quantity=1):
+        raise NotImplementedError
+
+    def update_item(self, user, item_id, quantity):
+        raise NotImplementedError
+
+    def remove_item(self, user, item_id):
+        raise NotImplementedError
+
+    def select_item(self, user, item_id, selected):
+        raise NotImplementedError
+
+    def clear(self, user):
+        raise NotImplementedError
+
+    def remove_products(self, user, product_ids):
+        """删除购物车中指定商品（下单后调用）"""
+        raise NotImplementedError
+
+    def persist(self, batch_size=100):
+        """将热数据回写数据库，返回回写的购物车数量"""
+        return 0
+
+    def reset(self):
+        """丢弃全部热数据"""
+
+
+class DatabaseCartStorage(BaseCartStorage):
+    """直接读写数据库"""
+
+    def _get_cart(self, user):
+        cart, created = Cart.objects.get_or_create(user=user)
+        return cart
+
+    def _get_item(self, user, item_id):
+        try:
+            return CartItem.objects.select_related('product').get(cart__user=user, product_id=item_id)
+        except CartItem.DoesNotExist:
+            raise CartItemNotFound
+
+    @staticmethod
+    def _line(item):
+        return CartLine(item.product_id, item.product_id, item.quantity, item.selected, item.created_at, item.updated_at)
+
+    def get_cart(self, user):
+        cart = self._get_cart(user)
+        items = [self._line(item) for item in cart.items.all()]
+        return CartState(cart.id, user.id, items, cart.created_at, cart.updated_at)
+
+    def add_item(self, user, product_id, quantity=1):
+        cart = self._get_cart(user)
+        cart_item = CartItem.objects.filter(cart=cart, product_id=product_id).first()
+        if cart_item:
+            cart_item.quantity += quantity
+        else:
+            cart_item = CartItem(cart=cart, product_id=product_id, quantity=quantity)
+        cart_item.save()
+        return self._line(cart_item)
+
+    def update_item(self, user, item_id, quantity):
+        cart_item = self._get_item(user, item_id)
+        cart_item.quantity = quantity
+        cart_item.save()
+        return self._line(cart_item)
+
+    def remove_item(self, user, item_id):
+        deleted, _ = CartItem.objects.filter(cart__user=user, product_id=item_id).delete()
+        if not deleted:
+            raise CartItemNotFound
+
+    def select_item(self, user, item_id, selected):
+        cart_item = self._get_item(user, item_id)
+        cart_item.selected = selected
+        cart_item.save()
+        return self._line(cart_item)
+
+    def clear(self, user):
+        CartItem.objects.filter(cart__user=user).delete()
+
+    def remove_products(self, user, product_ids):
+        CartItem.objects.filter(cart__user=user, product_id__in=product_ids).delete()
+
+
+class RedisCartStorage(BaseCartStorage):
+    """
+    Redis 购物车
+
+    每个用户一个 hash（cart:<user_id>），字段按商品 ID 区分:
+        _cart       数据库中的购物车 ID
+        _created    购物车创建时间戳
+        q:<商品ID>  数量
+        s:<商品ID>  是否选中（1/0）
+        c:<商品ID>  加入时间戳
+        u:<商品ID>  更新时间戳
+
+    hash 不存在时从数据库懒加载；每次修改将用户加入 cart:dirty 集合，
+    由 persist() 批量回写 Cart/CartItem 表。
+    """
+    KEY_PREFIX = 'cart:'
+    DIRTY_KEY = 'cart:dirty'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        import redis
+        self.client = redis.Redis.from_url(options.get('REDIS_URL', 'redis://127.0.0.1:6379/2'))
+        self.ttl = options.get('TTL', 7 * 24 * 3600)
+
+    def _key(self, user_id):
+        return f'{self.KEY_PREFIX}{user_id}'
+
+    @staticmethod
+    def _to_datetime(value):
+        return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+
+    def _load(self, user):
+        """确保热数据存在，不存在时从数据库加载"""
+        key = self._key(user.id)
+        if self.client.expire(key, self.ttl):
+            return
+
+        cart, created = Cart.objects.get_or_create(user=user)
+        mapping = {
+            '_cart': cart.id,
+            '_created': cart.created_at.timestamp(),
+        }
+        for item in cart.items.all():
+            mapping[f'q:{item.product_id}'] = item.quantity
+            mapping[f's:{item.product_id}'] = int(item.selected)
+            mapping[f'c:{item.product_id}'] = item.created_at.timestamp()
+            mapping[f'u:{item.product_id}'] = item.updated_at.timestamp()
+
+        # 使用 HSETNX，不覆盖并发写入的数据
+        pipe = self.client.pipeline()
+        for field, value in mapping.items():
+            pipe.hsetnx(key, field, value)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def _mark_dirty(self, user_id):
+        self.client.sadd(self.DIRTY_KEY, user_id)
+
+    def _parse(self, user_id, data):
+        data = {field.decode(): value.decode() for field, value in data.items()}
+        items = []
+        for field, quantity in data.items():
+            if not field.startswith('q:'):
+                continue
+            product_id = int(field[2:])
+            created = data.get(f'c:{product_id}')
+            updated = data.get(f'u:{product_id}', created)
+            items.append(CartLine(
+                product_id,
+                product_id,
+                int(quantity),
+                data.get(f's:{product_id}', '1') == '1',
+                self._to_datetime(created) if created else None,
+                self._to_datetime(updated) if updated else None,
+            ))
+        items.sort(key=lambda line: line.created_at or timezone.now(), reverse=True)
+
+        cart_created = self._to_datetime(data['_created']) if '_created' in data else None
+        updated_at = max((line.updated_at for line in items if line.updated_at), default=cart_created)
+        cart_id = int(data['_cart']) if '_cart' in data else None
+        return CartState(cart_id, user_id, items, cart_created, updated_at)
+
+    def _get_line(self, user, product_id):
+        state = self.get_cart(user)
+        for line in state.items:
+            if line.product_id == product_id:
+                return line
+        raise CartItemNotFound
+
+    def _require_item(self, user, item_id):
+        if not self.client.hexists(self._key(user.id), f'q:{item_id}'):
+            raise CartItemNotFound
+
+    def get_cart(self, user):
+        self._load(user)
+        return self._parse(user.id, self.client.hgetall(self._key(user.id)))
+
+    def add_item(self, user, product_id, quantity=1):
+        self._load(user)
+        key = self._key(user.id)
+        now = time.time()
+
+        new_quantity = self.client.hincrby(key, f'q:{product_id}', quantity)
+        try:
+            check_stock(product_id, new_quantity)
+        except ValueError:
+            # 回滚本次增加的数量
+            if self.client.hincrby(key, f'q:{product_id}', -quantity) <= 0:
+                self.client.hdel(key, f'q:{product_id}', f's:{product_id}', f'c:{product_id}', f'u:{product_id}')
+            raise
+
+        pipe = self.client.pipeline()
+        pipe.hsetnx(key, f's:{product_id}', 1)
+        pipe.hsetnx(key, f'c:{product_id}', now)
+        pipe.hset(key, f'u:{product_id}', now)
+        pipe.execute()
+        self._mark_dirty(user.id)
+        return self._get_line(user, product_id)
+
+    def update_item(self, user, item_id, quantity):
+        self._load(user)
+        self._require_item(user, item_id)
+        check_stock(item_id, quantity)
+        self.client.hset(self._key(user.id), mapping={
+            f'q:{item_id}': quantity,
+            f'u:{item_id}': time.time(),
+        })
+        self._mark_dirty(user.id)
+        return self._get_line(user, int(item_id))
+
+    def remove_item(self, user, item_id):
+        self._load(user)
+        removed = self.client.hdel(
+            self._key(user.id), f'q:{item_id}', f's:{item_id}', f'c:{item_id}', f'u:{item_id}'
+        )
+        if not removed:
+            raise CartItemNotFound
+        self._mark_dirty(user.id)
+
+    def select_item(self, user, item_id, selected):
+        self._load(user)
+        self._require_item(user, item_id)
+        self.client.hset(self._key(user.id), mapping={
+            f's:{item_id}': int(bool(selected)),
+            f'u:{item_id}': time.time(),
+        })
+        self._mark_dirty(user.id)
+        return self._get_line(user, int(item_id))
+
+    def clear(self, user):
+        state = self.get_cart(user)
+        self.remove_products(user, [line.product_id for line in state.items])
+
+    def remove_products(self, user, product_ids):
+        if not product_ids:
+            return
+        self._load(user)
+        fields = [f'{prefix}:{product_id}' for product_id in product_ids for prefix in 'qscu']
+        self.client.hdel(self._key(user.id), *fields)
+        self._mark_dirty(user.id)
+
+    def persist(self, batch_size=100):
+        user_ids = self.client.spop(self.DIRTY_KEY, batch_size) or []
+        count = 0
+        for user_id in user_ids:
+            user_id = int(user_id)
+            try:
+                if self._write_back(user_id):
+                    count += 1
+            except Exception:
+                # 回写失败时重新标记，等待下一轮
+                self._mark_dirty(user_id)
+                raise
+        return count
+
+    def _write_back(self, user_id):
+        """将单个用户的热数据同步到数据库"""
+        data = self.client.hgetall(self._key(user_id))
+        if not data:
+            return False
+        state = self._parse(user_id, data)
+        desired = {line.product_id: line for line in state.items}
+
+        with transaction.atomic():
+            cart, created = Cart.objects.get_or_create(user_id=user_id)
+            existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+
+            CartItem.objects.filter(cart=cart).exclude(product_id__in=desired).delete()
+
+            changed = []
+            for product_id, item in existing.items():
+                line = desired.get(product_id)
+                if line and (item.quantity != line.quantity or item.selected != line.selected):
+                    item.quantity = line.quantity
+                    item.selected = line.selected
+                    item.updated_at = line.updated_at or timezone.now()
+                    changed.append(item)
+            if changed:
+                CartItem.objects.bulk_update(changed, ['quantity', 'selected', 'updated_at'])
+
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, quantity=line.quantity, selected=line.selected)
+                for product_id, line in desired.items()
+                if product_id not in existing
+            ])
+            Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
+        return True
+
+    def reset(self):
+        for key in self.client.scan_iter(match=f'{self.KEY_PREFIX}*'):
+            self.client.delete(key)
+
+
+_storage = None
+
+
+def get_cart_storage():
+    """获取配置的购物车存储后端"""
+    global _storage
+    if _storage is None:
+        config = dict(getattr(settings, 'CART_STORAGE', {}))
+        backend = config.pop('BACKEND', 'apps.cart.storage.DatabaseCartStorage')
+        _storage = import_string(backend)(**config)
+    return _storage
@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.products.models import Category, Product
+from apps.users.models import User
+from .storage import DatabaseCartStorage, RedisCartStorage
+
+
+class CartStorageContractMixin:
+    """两个存储后端执行相同的操作，购物车商品 ID 均为商品 ID"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        category = Category.objects.create(name='手机')
+        # 先建一个商品，使商品 ID 与购物车商品的主键错开
+        Product.objects.create(category=category, name='占位', description='', price=1, stock=1)
+        cls.phone = Product.objects.create(category=category, name='手机', description='', price=100, stock=10)
+        cls.case = Product.objects.create(category=category, name='手机壳', description='', price=20, stock=10)
+
+    def get_storage(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.storage = self.get_storage()
+        patcher = mock.patch('apps.cart.views.get_cart_storage', return_value=self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def items(self):
+        response = self.client.get('/cart/cart/')
+        return {item['id']: item for item in response.data['results'][0]['items']}
+
+    def test_item_id_is_product_id(self):
+        response = self.client.post(
+            '/cart/cart/0/add_item/', {'product_id': self.phone.id, 'quantity': 1}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['id'], self.phone.id)
+        self.assertEqual(list(self.items()), [self.phone.id])
+
+    def test_update_select_and_remove(self):
+        self.storage.add_item(self.user, self.phone.id, 1)
+        self.storage.add_item(self.user, self.case.id, 1)
+
+        response = self.client.put(
+            '/cart/cart/0/update_item/', {'item_id': self.phone.id, 'quantity': 3}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['id'], response.data['quantity']), (self.phone.id, 3))
+
+        response = self.client.put(
+            '/cart/cart/0/select_item/', {'item_id': self.case.id, 'selected': False}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(response.data['selected'])
+
+        items = self.items()
+        self.assertEqual(items[self.phone.id]['quantity'], 3)
+        self.assertFalse(items[self.case.id]['selected'])
+
+        response = self.client.delete('/cart/cart/0/remove_item/', {'item_id': self.phone.id}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(self.items()), [self.case.id])
+
+        response = self.client.delete('/cart/cart/0/remove_item/', {'item_id': self.phone.id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_reject_invalid_item_id(self):
+        self.storage.add_item(self.user, self.phone.id, 1)
+        response = self.client.put('/cart/cart/0/update_item/', {'item_id': 'abc', 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete('/cart/cart/0/remove_item/', {'item_id': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DatabaseCartStorageTest(CartStorageContractMixin, TestCase):
+
+    def get_storage(self):
+        return DatabaseCartStorage()
+
+
+class RedisCartStorageTest(CartStorageContractMixin, TestCase):
+
+    def get_storage(self):
+        import redis
+        storage = RedisCartStorage(**{
+            key: value for key, value in getattr(settings, 'CART_STORAGE', {}).items() if key != 'BACKEND'
+        })
+        # 使用单独的键前缀，不影响开发环境中的购物车
+        storage.KEY_PREFIX = 'test:cart:'
+        storage.DIRTY_KEY = 'test:cart:dirty'
+        try:
+            storage.client.ping()
+        except redis.ConnectionError:
+            self.skipTest('Redis 不可用')
+        self.addCleanup(storage.reset)
+        return storage
@@ -2,15 +2,22 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.shortcuts import get_object_or_404
-from .models import Cart, CartItem
+from apps.core.eager_loading import eager_load
+from apps.products.models import Product
+from apps.products.serializers import ProductSerializer
+from .models import Cart
 from .serializers import CartSerializer, CartItemSerializer
+from .storage import get_cart_storage, CartItemNotFound
 
 class CartViewSet(viewsets.ModelViewSet):
     """购物车视图集"""
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def storage(self):
+        return get_cart_storage()
+
     def get_queryset(self):
         """获取用户的购物车"""
         return Cart.objects.filter(user=self.request.user)
@@ -20,28 +27,70 @@ class CartViewSet(viewsets.ModelViewSet):
         cart, created = Cart.objects.get_or_create(user=self.request.user)
         return cart
 
+    def attach_products(self, lines):
+        """一次查询为购物车商品附加商品信息，过滤已删除的商品"""
+        products = eager_load(
+            Product.objects.filter(id__in=[line.product_id for line in lines]),
+            ProductSerializer
+        ).in_bulk()
+        result = []
+        for line in lines:
+            line.product = products.get(line.product_id)
+            if line.product is not None:
+                result.append(line)
+        return result
+
+    def cart_data(self):
+        state = self.storage.get_cart(self.request.user)
+        state.items = self.attach_products(state.items)
+        return CartSerializer(state).data
+
+    def item_data(self, line):
+        self.attach_products([line])
+        return CartItemSerializer(line).data
+
+    def list(self, request, *args, **kwargs):
+        """获取用户的购物车（保持分页结构）"""
+        return Response({
+            'count': 1,
+            'next': None,
+            'previous': None,
+            'results': [self.cart_data()]
+        })
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.cart_data())
+
+    @staticmethod
+    def parse_item_id(value):
+        """购物车商品 ID 即商品 ID"""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError('商品ID不正确')
+
+    @staticmethod
+    def parse_quantity(value):
+        try:
+            quantity = int(value)
+        except (TypeError, ValueError):
+            raise ValueError('商品数量不正确')
+        if quantity < 1:
+            raise ValueError('商品数量必须大于0')
+        return quantity
+
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
         """添加商品到购物车"""
-        cart = self.get_object()
         serializer = CartItemSerializer(data=request.data)
         if serializer.is_valid():
             try:
-                # 检查是否已存在该商品
-                cart_item = CartItem.objects.filter(
-                    cart=cart,
-                    product_id=serializer.validated_data['product_id']
-                ).first()
-                
-                if cart_item:
-                    # 如果已存在，更新数量
-                    cart_item.quantity += serializer.validated_data.get('quantity', 1)
-                    cart_item.save()
-                else:
-                    # 如果不存在，创建新项
-                    serializer.save(cart=cart)
-                
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                line = self.storage.add_item(
+                    request.user,
+                    serializer.validated_data['product_id'],
+                    serializer.validated_data.get('quantity', 1)
+                )
+                return Response(self.item_data(line), status=status.HTTP_200_OK)
             except ValueError as e:
                 return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -49,7 +98,6 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['put'])
     def update_item(self, request, pk=None):
         """更新购物车商品数量"""
-        cart = self.get_object()
         item_id = request.data.get('item_id')
         quantity = request.data.get('quantity')
         
@@ -60,12 +108,11 @@ class CartViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            cart_item = CartItem.objects.get(cart=cart, id=item_id)
-            cart_item.quantity = quantity
-            cart_item.save()
-            serializer = CartItemSerializer(cart_item)
-            return Response(serializer.data)
-        except CartItem.DoesNotExist:
+            line = self.storage.update_item(
+                request.user, self.parse_item_id(item_id), self.parse_quantity(quantity)
+            )
+            return Response(self.item_data(line))
+        except CartItemNotFound:
             return Response(
                 {'error': '购物车商品不存在'},
                 status=status.HTTP_404_NOT_FOUND
@@ -79,7 +126,6 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['delete'])
     def remove_item(self, request, pk=None):
         """删除购物车商品"""
-        cart = self.get_object()
         item_id = request.data.get('item_id')
         
         if not item_id:
@@ -89,26 +135,28 @@ class CartViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            cart_item = CartItem.objects.get(cart=cart, id=item_id)
-            cart_item.delete()
+            self.storage.remove_item(request.user, self.parse_item_id(item_id))
             return Response(status=status.HTTP_204_NO_CONTENT)
-        except CartItem.DoesNotExist:
+        except CartItemNotFound:
             return Response(
                 {'error': '购物车商品不存在'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
     @action(detail=True, methods=['delete'])
     def clear(self, request, pk=None):
         """清空购物车"""
-        cart = self.get_object()
-        cart.items.all().delete()
+        self.storage.clear(request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['put'])
     def select_item(self, request, pk=None):
         """选择/取消选择购物车商品"""
-        cart = self.get_object()
         item_id = request.data.get('item_id')
         selected = request.data.get('selected', True)
         
@@ -119,13 +167,15 @@ class CartViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            cart_item = CartItem.objects.get(cart=cart, id=item_id)
-            cart_item.selected = selected
-            cart_item.save()
-            serializer = CartItemSerializer(cart_item)
-            return Response(serializer.data)
-        except CartItem.DoesNotExist:
+            line = self.storage.select_item(request.user, self.parse_item_id(item_id), selected)
+            return Response(self.item_data(line))
+        except CartItemNotFound:
             return Response(
                 {'error': '购物车商品不存在'},
                 status=status.HTTP_404_NOT_FOUND
-            ) 
\ No newline at end of file
+            )
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
@@ -3,4 +3,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
-    verbose_name = '核心功能' 
\ No newline at end of file
+    verbose_name = '核心功能'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import metrics
+        connection_created.connect(metrics.count_connection, dispatch_uid='metrics_count_connection')
@@ -0,0 +1,449 @@
+"""
+接口基准测试
+
+每个场景描述一个热点接口：setup() 准备数据，prepare(i) 在计时之外为第 i 次请求做准备，
+request(i) 返回本次请求的 (方法, 路径, 数据)。run_scenario() 在进程内通过 APIClient
+发起请求，记录每次请求的耗时和 SQL 查询数，汇总为延迟分位数、吞吐量和查询数。
+
+结果可以与阈值文件或上一次的结果比较，超出时由 bench 命令返回非零状态，用于 CI。
+
+生成数据和执行场景需在 isolated_environment() 中进行，缓存、购物车、领取计数器、筛选维度索引、
+联想快照和统计快照都换成进程内或临时目录中的实现，不影响共享的 Redis 和本机数据文件。
+"""
+import contextlib
+import io
+import math
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.cart import storage as cart_storage
+from apps.cart.storage import get_cart_storage
+from apps.core import metrics, profiling, snowflake
+from apps.core.snowflake import generate_no
+from apps.coupons import quota
+from apps.coupons.models import Coupon
+from apps.orders.models import Order, OrderItem
+from apps.products.models import Product
+from apps.search import facet_index, suggest
+from apps.search.suggest import rebuild_suggestions
+from apps.users.models import UserAddress
+
+User = get_user_model()
+
+# 吞吐量为下限，其余指标为上限
+LOWER_BOUND_METRICS = {'throughput_rps'}
+
+
+# 按配置创建并缓存在模块中的后端实例，隔离期间重新创建
+BACKEND_INSTANCES = [
+    (cart_storage, '_storage'),
+    (quota, '_counter'),
+    (facet_index, '_index'),
+    (suggest, '_index'),
+    (snowflake, '_generator'),
+    (snowflake, '_lease'),
+]
+
+
+@contextlib.contextmanager
+def isolated_environment():
+    """替换共享的缓存和存储后端，退出时恢复"""
+    saved = [getattr(module, name) for module, name in BACKEND_INSTANCES]
+    with tempfile.TemporaryDirectory() as directory, override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+        CART_STORAGE={'BACKEND': 'apps.cart.storage.DatabaseCartStorage'},
+        COUPON_QUOTA={'BACKEND': 'apps.coupons.quota.LocalQuotaCounter'},
+        FACET_INDEX={'BACKEND': 'apps.search.facet_index.LocalFacetIndex'},
+        SEARCH_SUGGEST={**suggest.config(), 'PATH': os.path.join(directory, 'search', 'suggest.idx')},
+        METRICS={**metrics.config(), 'DIR': os.path.join(directory, 'metrics')},
+        REQUEST_PROFILING={**profiling.config(), 'DIR': os.path.join(directory, 'profiling')},
+    ):
+        for module, name in BACKEND_INSTANCES:
+            setattr(module, name, None)
+        try:
+            yield
+        finally:
+            # 租用的进程号记录在临时缓存中，在恢复配置前释放
+            snowflake._release_lease()
+            for (module, name), value in zip(BACKEND_INSTANCES, saved):
+                setattr(module, name, value)
+
+
+class BenchEnvironment:
+    """场景共享的数据：商品 ID 列表、浏览类场景使用的默认用户，以及为写入类场景分配的独立用户"""
+
+    def __init__(self):
+        self.product_ids = list(
+            Product.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+        )
+        if not self.product_ids:
+            raise ValueError('没有可用于基准测试的商品')
+        self.users = iter(
+            User.objects.filter(addresses__isnull=False).distinct().order_by('id')
+        )
+        self.default_user = self.next_user()
+
+    def next_user(self):
+        try:
+            return next(self.users)
+        except StopIteration:
+            raise ValueError('用户数量不足，请增加 --users')
+
+    def product_id(self, i):
+        return self.product_ids[i % len(self.product_ids)]
+
+
+def make_orders(user, product_ids, status):
+    """直接写库为用户创建订单（每个订单一件商品），用于支付和退换货场景"""
+    address = UserAddress.objects.filter(user=user).first()
+    products = Product.objects.in_bulk(product_ids)
+    orders = []
+    for product_id in product_ids:
+        price = products[product_id].price
+        orders.append(Order(
+            user=user,
+            order_no=generate_no('ORDER'),
+            total_amount=price,
+            shipping_fee=Decimal('10'),
+            final_amount=price + Decimal('10'),
+            status=status,
+            shipping_address=address,
+            shipping_name=address.receiver,
+            shipping_phone=address.phone,
+            shipping_province=address.province,
+            shipping_city=address.city,
+            shipping_district=address.district,
+            shipping_address_detail=address.address,
+        ))
+    Order.objects.bulk_create(orders)
+    orders = list(Order.objects.filter(order_no__in=[order.order_no for order in orders]).order_by('id'))
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product_id=product_id,
+            product_name=products[product_id].name,
+            product_image='',
+            price=products[product_id].price,
+            quantity=1,
+            total_price=products[product_id].price,
+        )
+        for order, product_id in zip(orders, product_ids)
+    ])
+    return orders
+
+
+class Scenario:
+    name = None
+    expected_status = (200,)
+
+    def __init__(self, env, count):
+        """count 为本场景总请求数（含预热）"""
+        self.env = env
+        self.count = count
+        self.user = None
+
+    def setup(self):
+        pass
+
+    def prepare(self, i):
+        pass
+
+    def request(self, i):
+        raise NotImplementedError
+
+    def handle_response(self, i, response):
+        """在计时之外处理第 i 次请求的响应"""
+
+
+class ProductListScenario(Scenario):
+    """沿 next 游标翻页，翻过 PAGES 页或到最后一页后回到第一页"""
+    name = 'product_list'
+    PAGES = 5
+
+    def setup(self):
+        self.next_url = None
+        self.page = 0
+
+    def request(self, i):
+        return 'get', self.next_url or '/products/products/', None
+
+    def handle_response(self, i, response):
+        self.page += 1
+        self.next_url = response.data.get('next') if response.status_code == 200 else None
+        if self.page >= self.PAGES or not self.next_url:
+            self.next_url = None
+            self.page = 0
+
+
+class ProductDetailScenario(Scenario):
+    name = 'product_detail'
+
+    def request(self, i):
+        return 'get', f'/products/products/{self.env.product_id(i)}/', None
+
+
+class ProductSearchScenario(Scenario):
+    name = 'product_search'
+
+    def setup(self):
+        self.terms = list(Product.objects.order_by('id').values_list('name', flat=True)[:20])
+
+    def request(self, i):
+        # 取商品名的第一个词，命中率接近线上
+        return 'get', '/products/products/', {'search': self.terms[i % len(self.terms)].split()[0]}
+
+
+class ProductSuggestScenario(Scenario):
+    name = 'product_suggest'
+
+    def setup(self):
+        rebuild_suggestions()
+        names = Product.objects.order_by('id').values_list('name', flat=True)[:20]
+        # 模拟逐字输入：每个商品名的前 1~3 个字符
+        self.prefixes = [name[:length] for name in names for length in (1, 2, 3)]
+
+    def request(self, i):
+        return 'get', '/products/products/suggest/', {'q': self.prefixes[i % len(self.prefixes)]}
+
+
+class CartAddScenario(Scenario):
+    name = 'cart_add'
+
+    def setup(self):
+        self.user = self.env.next_user()
+        get_cart_storage().clear(self.user)
+
+    def request(self, i):
+        return 'post', '/cart/cart/0/add_item/', {'product_id': self.env.product_id(i), 'quantity': 1}
+
+
+class CartUpdateScenario(Scenario):
+    name = 'cart_update'
+
+    def setup(self):
+        self.user = self.env.next_user()
+        storage = get_cart_storage()
+        storage.clear(self.user)
+        self.item_ids = [
+            storage.add_item(self.user, self.env.product_id(i), 1).id
+            for i in range(min(self.count, 20))
+        ]
+
+    def request(self, i):
+        return 'put', '/cart/cart/0/update_item/', {
+            'item_id': self.item_ids[i % len(self.item_ids)],
+            'quantity': i % 2 + 1,
+        }
+
+
+class OrderCreateScenario(Scenario):
+    name = 'order_create'
+    expected_status = (201,)
+
+    def setup(self):
+        self.user = self.env.next_user()
+        self.address_id = UserAddress.objects.filter(user=self.user).values_list('id', flat=True).first()
+        self.storage = get_cart_storage()
+        self.storage.clear(self.user)
+
+    def prepare(self, i):
+        self.storage.add_item(self.user, self.env.product_id(i), 1)
+
+    def request(self, i):
+        return 'post', '/orders/orders/', {
+            'address_id': self.address_id,
+            'payment_method': 'alipay',
+            'items': [{'id': self.env.product_id(i), 'quantity': 1}],
+        }
+
+
+class OrderPayScenario(Scenario):
+    name = 'order_pay'
+    expected_status = (202,)
+
+    def setup(self):
+        self.user = self.env.next_user()
+        self.orders = make_orders(self.user, [self.env.product_id(i) for i in range(self.count)], status=0)
+
+    def request(self, i):
+        return 'post', f'/orders/orders/{self.orders[i].id}/pay/', {'payment_method': 'alipay'}
+
+
+class CouponClaimScenario(Scenario):
+    name = 'coupon_claim'
+
+    def setup(self):
+        self.user = self.env.next_user()
+        now = timezone.now()
+        # 不限发行量、不限每人领取次数，每次请求都能领取成功
+        self.coupon = Coupon.objects.create(
+            name='基准测试优惠券',
+            type=1,
+            amount=10,
+            min_amount=100,
+            start_time=now - timedelta(days=1),
+            end_time=now + timedelta(days=1),
+            status=1,
+            total_quantity=0,
+            per_user_limit=0,
+        )
+
+    def request(self, i):
+        return 'post', f'/coupons/coupons/{self.coupon.id}/claim/', None
+
+
+class ReturnCreateScenario(Scenario):
+    name = 'return_create'
+    expected_status = (201,)
+
+    def setup(self):
+        self.user = self.env.next_user()
+        self.product_ids = [self.env.product_id(i) for i in range(self.count)]
+        self.orders = make_orders(self.user, self.product_ids, status=3)  # 已完成
+
+    def request(self, i):
+        return 'post', '/returns/requests/', {
+            'order_id': self.orders[i].id,
+            'product_id': self.product_ids[i],
+            'quantity': 1,
+            'type': 1,
+            'reason': '商品质量问题',
+        }
+
+
+SCENARIOS = [
+    ProductListScenario,
+    ProductDetailScenario,
+    ProductSearchScenario,
+    ProductSuggestScenario,
+    CartAddScenario,
+    CartUpdateScenario,
+    OrderCreateScenario,
+    OrderPayScenario,
+    CouponClaimScenario,
+    ReturnCreateScenario,
+]
+
+
+def percentile(sorted_values, p):
+    """线性插值计算分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lower = math.floor(k)
+    upper = math.ceil(k)
+    if lower == upper:
+        return sorted_values[int(k)]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(durations, query_counts, errors):
+    """汇总单个场景的测量结果，耗时单位为毫秒"""
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        'iterations': len(durations),
+        'errors': errors,
+        'mean_ms': round(total / len(durations), 3) if durations else 0.0,
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p90_ms': round(percentile(durations, 90), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'p99_ms': round(percentile(durations, 99), 3),
+        'max_ms': round(durations[-1], 3) if durations else 0.0,
+        'throughput_rps': round(len(durations) / total * 1000, 2) if total else 0.0,
+        'queries_mean': round(sum(query_counts) / len(query_counts), 2) if query_counts else 0.0,
+        'queries_max': max(query_counts, default=0),
+    }
+
+
+def run_scenario(scenario_class, env, iterations, warmup):
+    """执行一个场景，前 warmup 次请求不计入结果"""
+    scenario = scenario_class(env, iterations + warmup)
+    scenario.setup()
+    client = APIClient()
+    client.force_authenticate(scenario.user or env.default_user)
+
+    query_count = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal query_count
+        query_count += 1
+        return execute(sql, params, many, context)
+
+    durations = []
+    query_counts = []
+    errors = 0
+    # 部分视图会 print 调试信息，测量期间丢弃，避免干扰命令输出
+    with connection.execute_wrapper(count_queries), contextlib.redirect_stdout(io.StringIO()):
+        for i in range(iterations + warmup):
+            scenario.prepare(i)
+            method, path, data = scenario.request(i)
+            query_count = 0
+            started = time.perf_counter()
+            if method == 'get':
+                response = client.get(path, data)
+            else:
+                response = getattr(client, method)(path, data, format='json')
+            elapsed = (time.perf_counter() - started) * 1000
+            scenario.handle_response(i, response)
+            if i < warmup:
+                continue
+            durations.append(elapsed)
+            query_counts.append(query_count)
+            if response.status_code not in scenario.expected_status:
+                errors += 1
+    return summarize(durations, query_counts, errors)
+
+
+def check_thresholds(results, thresholds):
+    """
+    检查结果是否超出阈值，返回失败说明列表
+
+    thresholds 形如 {"product_list": {"p95_ms": 50, "queries_max": 4}, "*": {"errors": 0}}，
+    "*" 对所有场景生效；throughput_rps 为下限，其余指标为上限
+    """
+    failures = []
+    for name, metrics in results.items():
+        limits = dict(thresholds.get('*', {}), **thresholds.get(name, {}))
+        for metric, limit in limits.items():
+            if metric not in metrics:
+                failures.append(f'{name}: 未知指标 {metric}')
+                continue
+            value = metrics[metric]
+            if metric in LOWER_BOUND_METRICS:
+                if value < limit:
+                    failures.append(f'{name}: {metric}={value} 低于阈值 {limit}')
+            elif value > limit:
+                failures.append(f'{name}: {metric}={value} 超过阈值 {limit}')
+    return failures
+
+
+def compare_baseline(results, baseline, max_regression):
+    """
+    与上一次的结果比较，返回失败说明列表
+
+    p95 延迟增长超过 max_regression（比例）或最大查询数增加时视为退化
+    """
+    failures = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous['p95_ms'] and metrics['p95_ms'] > previous['p95_ms'] * (1 + max_regression):
+            failures.append(
+                f'{name}: p95_ms 从 {previous["p95_ms"]} 退化到 {metrics["p95_ms"]}'
+            )
+        if metrics['queries_max'] > previous['queries_max']:
+            failures.append(
+                f'{name}: queries_max 从 {previous["queries_max"]} 增加到 {metrics["queries_max"]}'
+            )
+    return failures
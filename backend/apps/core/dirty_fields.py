@@ -0,0 +1,92 @@
+"""
+按修改的字段保存模型
+
+模型混入 DirtyFieldsMixin 后，从数据库加载或保存时记录各字段的值，再次 save() 且未指定 update_fields 时
+只写入修改过的字段（以及 auto_now 字段），不重写 description、收货地址等未修改的大字段，
+缩短行锁持有时间，减少 redo log。没有修改时不执行 UPDATE，也不发送 pre_save/post_save 信号。
+
+    class Product(DirtyFieldsMixin, models.Model):
+        ...
+
+    product = Product.objects.get(pk=1)
+    product.is_active = False
+    product.save()  # UPDATE ... SET is_active = ..., updated_at = ... WHERE id = 1
+
+没有记录已保存值的实例（如升级前序列化到缓存中的实例）无法判断修改了哪些字段，仍整行保存，
+但不写入 excluded_from_full_save 中只由条件 UPDATE 维护的计数字段。新建的实例按 Django 默认方式插入。
+DIRTY_FIELDS['WARN_FULL_SAVE'] 开启时（默认随 DEBUG）整行保存会记录警告日志，指向调用 save() 的代码。
+
+JSONField 等可变值原地修改（如 obj.data['key'] = 1）不会被发现，需要重新赋值。
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WARN_FULL_SAVE': False,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'DIRTY_FIELDS', {})}
+
+
+class DirtyFieldsMixin:
+    """记录字段的已保存值，save() 时自动传入 update_fields"""
+
+    # 整行保存时不写入的字段
+    excluded_from_full_save = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = dict(zip(field_names, values))
+        return instance
+
+    def _remember(self, fields=None):
+        deferred = self.get_deferred_fields()
+        saved = self.__dict__.setdefault('_saved_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred or (fields is not None and field.name not in fields
+                                             and field.attname not in fields):
+                continue
+            saved[field.attname] = getattr(self, field.attname)
+
+    def get_dirty_fields(self):
+        """返回加载或上次保存后修改过的字段名，实例未经加载时返回 None"""
+        saved = self.__dict__.get('_saved_values')
+        if saved is None:
+            return None
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+            and (field.attname not in saved or saved[field.attname] != getattr(self, field.attname))
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            dirty = self.get_dirty_fields()
+            if dirty is None:
+                if config()['WARN_FULL_SAVE']:
+                    logger.warning('%s(pk=%s) 未跟踪字段修改，整行保存', type(self).__name__, self.pk, stacklevel=2)
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.excluded_from_full_save
+                ]
+            elif dirty:
+                kwargs['update_fields'] = dirty + [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) and field.name not in dirty
+                ]
+            else:
+                kwargs['update_fields'] = []
+        super().save(*args, **kwargs)
+        self._remember(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._remember(fields)
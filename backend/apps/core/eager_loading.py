@@ -0,0 +1,125 @@
+"""
+根据序列化器声明的字段自动构造 select_related / prefetch_related
+
+序列化器中通过 source 访问的外键（如 category.name）使用 select_related，
+嵌套的一对多/多对多序列化器（如 images、specifications）使用 Prefetch，
+从而避免逐行序列化时产生 N+1 查询。
+使用 DynamicFieldsMixin 的序列化器按请求的 ?fields= / ?expand= 只加载实际输出的关联。
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .serializers import DynamicFieldsMixin, field_options
+
+
+def _nested_serializer(field):
+    """返回字段对应的嵌套序列化器，不是嵌套序列化器时返回 None"""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    if isinstance(field, serializers.ModelSerializer):
+        return field
+    return None
+
+
+def _add_prefetch(prefetches, lookup, related_model, nested_plan):
+    """同一 lookup 只保留一次，存在嵌套序列化器时优先使用"""
+    for index, (existing, _, existing_plan) in enumerate(prefetches):
+        if existing == lookup:
+            if existing_plan is None and nested_plan is not None:
+                prefetches[index] = (lookup, related_model, nested_plan)
+            return
+    prefetches.append((lookup, related_model, nested_plan))
+
+
+def _plan(serializer):
+    """
+    解析序列化器实例的字段，返回 (select_related 列表, prefetch 列表)
+
+    prefetch 列表的元素为 (lookup, 关联模型, 嵌套序列化器的查询计划或 None)
+    """
+    model = serializer.Meta.model
+    select_related = []
+    prefetches = []
+
+    for field in serializer.fields.values():
+        if field.write_only or not field.source or field.source == '*':
+            continue
+
+        attrs = field.source.split('.')
+        current_model = model
+        path = []
+        for position, attr in enumerate(attrs):
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation or attr != model_field.name:
+                # 普通字段，或通过 xxx_id 直接读取外键值
+                break
+
+            path.append(attr)
+            lookup = '__'.join(path)
+            is_last = position == len(attrs) - 1
+            nested = _nested_serializer(field) if is_last else None
+            nested_plan = _plan(nested) if nested is not None else None
+
+            if model_field.many_to_many or model_field.one_to_many:
+                # 一对多 / 多对多关系使用 Prefetch，嵌套字段交给 Prefetch 的 queryset 处理
+                _add_prefetch(prefetches, lookup, model_field.related_model, nested_plan)
+                break
+
+            if is_last and nested is None:
+                # 仅输出外键主键（如 PrimaryKeyRelatedField），无需关联查询
+                break
+
+            if lookup not in select_related:
+                select_related.append(lookup)
+            current_model = model_field.related_model
+
+            if nested_plan is not None:
+                # 外键指向的嵌套序列化器，将其查询计划合并到当前路径下
+                nested_select, nested_prefetches = nested_plan
+                for nested_lookup in nested_select:
+                    full_lookup = f'{lookup}__{nested_lookup}'
+                    if full_lookup not in select_related:
+                        select_related.append(full_lookup)
+                for nested_lookup, related_model, child_plan in nested_prefetches:
+                    _add_prefetch(prefetches, f'{lookup}__{nested_lookup}', related_model, child_plan)
+
+    return select_related, prefetches
+
+
+@lru_cache(maxsize=256)
+def _build_plan(serializer_class, fields=(), expand=()):
+    """按序列化器类和 fields / expand 选项缓存查询计划"""
+    if issubclass(serializer_class, DynamicFieldsMixin):
+        serializer = serializer_class(fields=fields or None, expand=expand)
+    else:
+        serializer = serializer_class()
+    return _plan(serializer)
+
+
+def _apply_plan(queryset, plan):
+    select_related, prefetches = plan
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    for lookup, related_model, nested_plan in prefetches:
+        related_queryset = related_model._default_manager.all()
+        if nested_plan is not None:
+            related_queryset = _apply_plan(related_queryset, nested_plan)
+        queryset = queryset.prefetch_related(Prefetch(lookup, queryset=related_queryset))
+    return queryset
+
+
+def eager_load(queryset, serializer_class, request=None):
+    """
+    按序列化器字段为 queryset 添加 select_related 和 Prefetch
+
+    传入 request 时按其中的 ?fields= / ?expand= 只加载实际输出的关联数据
+    """
+    if not hasattr(getattr(serializer_class, 'Meta', None), 'model'):
+        return queryset
+    return _apply_plan(queryset, _build_plan(serializer_class, *field_options(request)))
@@ -0,0 +1,138 @@
+"""
+Idempotency-Key 支持
+
+客户端在 POST 请求中携带 Idempotency-Key 头（每次提交生成一个，超时重试时沿用），
+同一用户、同一接口、同一 key 的请求只执行一次：
+
+    首次请求        获取处理锁后执行，成功（2xx）的响应保存 TTL 秒
+    重复请求        直接返回保存的响应，附带 Idempotent-Replayed: true 响应头
+    并发的重复请求  等待首次请求完成后返回其响应，超过 WAIT 秒仍未完成时返回 409
+    参数不同        同一 key 用于参数不同的请求时返回 422
+
+失败的响应不保存，释放锁后客户端可以用同一 key 重试。处理锁在 LOCK_TIMEOUT 秒后自动过期，
+应不小于 uWSGI 的 harakiri，避免进程被杀死后 key 一直不可用。请求在 LOCK_TIMEOUT 秒内完成时才删除锁，
+超时后锁可能已过期并被其他请求获取，此时等待其自动过期而不删除。缓存不可用时不做幂等控制，直接执行请求；
+响应保存失败时只记录日志，不影响已经执行成功的请求。
+
+    class OrderViewSet(viewsets.ModelViewSet):
+        @idempotent
+        def create(self, request, *args, **kwargs):
+            ...
+"""
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TTL': 24 * 3600,
+    'LOCK_TIMEOUT': 60,
+    'WAIT': 10,
+    'POLL_INTERVAL': 0.1,
+}
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+CACHE_PREFIX = 'idempotency'
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def _cache_key(request, key):
+    digest = hashlib.sha256(f'{request.path}:{key}'.encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{request.user.pk or "-"}:{digest}'
+
+
+def _fingerprint(request):
+    """请求参数的摘要，用于发现同一 key 被用于不同的请求"""
+    payload = json.dumps([request.method, request.path, request.data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} 已用于参数不同的请求'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    metrics.inc('idempotent_replays_total')
+    return Response(stored['data'], status=stored['status'], headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(view_method):
+    """为 ViewSet 的写操作添加 Idempotency-Key 支持"""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'{HEADER} 长度不能超过 {MAX_KEY_LENGTH}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        options = config()
+        cache_key = _cache_key(request, key)
+        lock_key = f'{cache_key}:lock'
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + options['WAIT']
+        while True:
+            try:
+                stored = cache.get(cache_key)
+                locked = stored is None and cache.add(lock_key, 1, options['LOCK_TIMEOUT'])
+            except Exception:
+                logger.exception('读取幂等响应失败')
+                return view_method(self, request, *args, **kwargs)
+
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            if locked:
+                locked_at = time.monotonic()
+                break
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'detail': f'相同 {HEADER} 的请求正在处理，请稍后重试'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(options['POLL_INTERVAL'])
+
+        try:
+            # 获取锁之前首次请求可能刚好完成并释放了锁
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            response = view_method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                try:
+                    cache.set(cache_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                    }, options['TTL'])
+                except Exception:
+                    logger.exception('保存幂等响应失败')
+            return response
+        finally:
+            try:
+                # 锁未过期时仍由当前请求持有，可以直接删除
+                if time.monotonic() - locked_at < options['LOCK_TIMEOUT']:
+                    cache.delete(lock_key)
+            except Exception:
+                logger.exception('释放幂等处理锁失败')
+
+    return wrapper
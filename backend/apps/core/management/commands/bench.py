@@ -0,0 +1,116 @@
+import io
+import json
+import platform
+from datetime import datetime
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from apps.core import bench
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = '对热点接口进行基准测试，输出延迟分位数、吞吐量和 SQL 查询数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', help='逗号分隔的场景名，默认全部: ' + ', '.join(
+            scenario.name for scenario in bench.SCENARIOS
+        ))
+        parser.add_argument('--iterations', type=int, default=200, help='每个场景计入结果的请求数')
+        parser.add_argument('--warmup', type=int, default=20, help='每个场景的预热请求数')
+        parser.add_argument('--users', type=int, default=50, help='生成的用户数量')
+        parser.add_argument('--products', type=int, default=500, help='生成的商品数量')
+        parser.add_argument('--orders', type=int, default=2000, help='生成的订单数量')
+        parser.add_argument('--seed', type=int, default=42, help='测试数据随机种子')
+        parser.add_argument('--keepdb', action='store_true', help='保留测试数据库，下次运行时复用')
+        parser.add_argument('--output', help='结果 JSON 文件路径')
+        parser.add_argument('--thresholds', help='阈值 JSON 文件，超出时命令失败')
+        parser.add_argument('--baseline', help='上一次的结果 JSON 文件，性能退化时命令失败')
+        parser.add_argument('--max-regression', type=float, default=0.2, help='允许的 p95 延迟增长比例')
+
+    def handle(self, *args, **options):
+        scenarios = bench.SCENARIOS
+        if options['scenarios']:
+            by_name = {scenario.name: scenario for scenario in bench.SCENARIOS}
+            names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+            unknown = [name for name in names if name not in by_name]
+            if unknown:
+                raise CommandError(f'未知场景: {", ".join(unknown)}')
+            scenarios = [by_name[name] for name in names]
+
+        thresholds = self.load_json(options['thresholds']) if options['thresholds'] else {}
+        baseline = self.load_json(options['baseline'])['results'] if options['baseline'] else {}
+
+        # 与测试运行器相同，在独立的测试数据库中运行，不影响当前数据库；
+        # 缓存、Redis 后端和本机数据文件也换成隔离的实现
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            with bench.isolated_environment():
+                self.seed(options)
+                env = bench.BenchEnvironment()
+                results = {}
+                for scenario in scenarios:
+                    self.stdout.write(f'运行场景 {scenario.name}...')
+                    results[scenario.name] = bench.run_scenario(
+                        scenario, env, options['iterations'], options['warmup']
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.print_results(results)
+        report = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'users': options['users'],
+                'products': options['products'],
+                'orders': options['orders'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'结果已写入 {options["output"]}')
+
+        failures = bench.check_thresholds(results, thresholds)
+        failures += bench.compare_baseline(results, baseline, options['max_regression'])
+        if failures:
+            raise CommandError('基准测试未通过:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('基准测试完成'))
+
+    @staticmethod
+    def load_json(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'无法读取 {path}: {e}')
+
+    def seed(self, options):
+        if options['keepdb'] and Product.objects.exists():
+            return
+        self.stdout.write('生成测试数据...')
+        call_command(
+            'generate_mock_data',
+            users=options['users'],
+            products=options['products'],
+            orders=options['orders'],
+            seed=options['seed'],
+            stdout=io.StringIO(),
+        )
+
+    def print_results(self, results):
+        columns = ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_mean', 'queries_max', 'errors']
+        self.stdout.write(f'{"scenario":<16}' + ''.join(f'{column:>16}' for column in columns))
+        for name, metrics in results.items():
+            self.stdout.write(f'{name:<16}' + ''.join(f'{metrics[column]:>16}' for column in columns))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from apps.cart.models import Cart, CartItem
+from apps.cart.storage import get_cart_storage
 
 class Command(BaseCommand):
     help = '清空购物车和购物车商品数据'
@@ -14,5 +15,9 @@ class Command(BaseCommand):
         # 清空购物车表
         Cart.objects.all().delete()
         self.stdout.write('已清空购物车表')
+
+        # 清空购物车热数据
+        get_cart_storage().reset()
+        self.stdout.write('已清空购物车缓存')
         
         self.stdout.write(self.style.SUCCESS('购物车数据清空完成！')) 
\ No newline at end of file
@@ -0,0 +1,61 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core import profiling
+
+
+class Command(BaseCommand):
+    help = '汇总所有进程最近一段时间的接口性能统计'
+
+    SORT_KEYS = {
+        'p95': lambda item: item['p95_ms'],
+        'count': lambda item: item['count'],
+        'total': lambda item: item['count'] * item['mean_ms'],
+        'db': lambda item: item['db_ms'],
+        'queries': lambda item: item['queries'],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=15, help='统计最近多少分钟')
+        parser.add_argument('--sort', choices=sorted(self.SORT_KEYS), default='p95', help='排序字段')
+        parser.add_argument('--json', action='store_true', help='以 JSON 格式输出')
+
+    def handle(self, *args, **options):
+        # 先写入本进程尚未落盘的数据（在 shell 中调用时有用）
+        profiling.recorder.flush()
+        stats = profiling.load_stats(time.time() - options['minutes'] * 60)
+
+        rows = []
+        for view, aggregate in stats.items():
+            count = aggregate.count
+            rows.append({
+                'view': view,
+                'count': count,
+                'errors': aggregate.errors,
+                'mean_ms': round(aggregate.total_ms / count, 2),
+                'p50_ms': round(aggregate.percentile(50), 2),
+                'p95_ms': round(aggregate.percentile(95), 2),
+                'p99_ms': round(aggregate.percentile(99), 2),
+                'max_ms': round(aggregate.max_ms, 2),
+                'queries': round(aggregate.queries / count, 2),
+                'db_ms': round(aggregate.db_ms / count, 2),
+                'view_ms': round(aggregate.view_ms / count, 2),
+                'serializer_ms': round(aggregate.serializer_ms / count, 2),
+                'render_ms': round(aggregate.render_ms / count, 2),
+            })
+        rows.sort(key=self.SORT_KEYS[options['sort']], reverse=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            return
+        if not rows:
+            self.stdout.write('没有统计数据')
+            return
+
+        columns = ['count', 'errors', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'db_ms', 'view_ms', 'serializer_ms', 'render_ms']
+        width = max(len(row['view']) for row in rows) + 2
+        self.stdout.write(f'{"view":<{width}}' + ''.join(f'{column:>14}' for column in columns))
+        for row in rows:
+            self.stdout.write(f'{row["view"]:<{width}}' + ''.join(f'{row[column]:>14}' for column in columns))
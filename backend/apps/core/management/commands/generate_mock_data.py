@@ -1,214 +1,423 @@
-from django.core.management.base import BaseCommand
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
 from django.utils import timezone
 from apps.products.models import Category, Product, ProductImage, ProductSpecification
+from apps.products import cache as catalog_cache
 from apps.orders.models import Order, OrderItem
 from apps.coupons.models import Coupon, UserCoupon
 from apps.users.models import UserAddress
 from apps.cart.models import Cart, CartItem
-from apps.returns.models import ReturnRequest, ReturnImage
-import random
-from datetime import datetime, timedelta
-from decimal import Decimal
+from apps.returns.models import ReturnRequest
+from apps.search.facets import rebuild_facets
+from apps.search.index import rebuild_index
+from apps.search.suggest import rebuild_suggestions
 
 User = get_user_model()
 
+MAIN_CATEGORIES = ['电子产品', '服装', '食品', '家居', '图书']
+PRODUCT_NAMES = [
+    'iPhone 13', 'MacBook Pro', 'AirPods Pro',
+    '休闲T恤', '牛仔裤', '运动鞋',
+    '有机水果', '进口零食', '茶叶',
+    '沙发', '床垫', '衣柜',
+    '小说', '教材', '杂志'
+]
+SPECS = [('颜色', '黑色'), ('尺寸', '标准'), ('材质', '优质')]
+PROVINCES = ['北京', '上海', '广东', '浙江', '江苏']
+CITIES = ['北京', '上海', '广州', '深圳', '杭州', '南京']
+RETURN_REASONS = ['商品质量问题', '商品与描述不符', '商品损坏', '其他原因']
+COUPON_TYPES = [
+    ('满100减10', 1, 10, 100),
+    ('满200减30', 1, 30, 200),
+    ('满500减100', 1, 100, 500),
+    ('9折优惠券', 2, 9, 100),
+    ('8折优惠券', 2, 8, 200),
+]
+ADDRESSES_PER_USER = 2
+SHIPPING_FEE = Decimal('10')
+
+# bulk_create 时手动指定创建时间，使数据在时间上分布，贴近线上查询计划，且多次生成结果一致
+TIMESTAMP_MODELS = [
+    User, UserAddress, Product, ProductImage, ProductSpecification,
+    UserCoupon, Order, OrderItem, ReturnRequest, Cart, CartItem,
+]
+
+
+def _mix(seed, kind, index):
+    """确定性的整数哈希（splitmix64），按编号派生商品价格等属性，无需查库"""
+    value = (seed * 0x9E3779B97F4A7C15 + kind * 0xBF58476D1CE4E5B9 + index) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+def product_price(ctx, index):
+    return Decimal(100 + _mix(ctx['seed'], 1, index) % 9901)
+
+
+def product_name(index):
+    return f'{PRODUCT_NAMES[index % len(PRODUCT_NAMES)]} {index + 1}'
+
+
+def product_image(index):
+    return f'https://example.com/images/product_{index + 1}.jpg'
+
+
+def address_fields(ctx, user_index, k):
+    value = _mix(ctx['seed'], 2, user_index * ADDRESSES_PER_USER + k)
+    city = CITIES[value % len(CITIES)]
+    return {
+        'receiver': f'收货人{k + 1}',
+        'phone': f'138{value % 100000000:08d}',
+        'province': PROVINCES[(value >> 8) % len(PROVINCES)],
+        'city': city,
+        'district': f'{city}区',
+        'address': f'测试街道{k + 1}号',
+    }
+
+
+def _random_time(rng, ctx, days):
+    return ctx['end_time'] - timedelta(seconds=rng.randrange(days * 86400))
+
+
+@contextmanager
+def explicit_timestamps():
+    """临时关闭 auto_now / auto_now_add，使用生成数据中指定的时间"""
+    fields = [
+        field for model in TIMESTAMP_MODELS for field in model._meta.fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _rng(ctx, stage, chunk_start):
+    """每个分块使用独立的随机数种子，结果与进程数和执行顺序无关"""
+    return random.Random(f'{ctx["seed"]}:{stage}:{chunk_start}')
+
+
+def generate_users(ctx, start, end):
+    rng = _rng(ctx, 'users', start)
+    users = []
+    addresses = []
+    for i in range(start, end):
+        created_at = _random_time(rng, ctx, 730)
+        # 用户名按用户ID编号，重复执行时不与已生成的用户冲突
+        user_id = ctx['user_base'] + i
+        users.append(User(
+            id=user_id,
+            username=f'test_user_{user_id}',
+            email=f'test_user_{user_id}@example.com',
+            password=ctx['password'],
+            is_active=True,
+            date_joined=created_at,
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+        for k in range(ADDRESSES_PER_USER):
+            addresses.append(UserAddress(
+                id=ctx['address_base'] + i * ADDRESSES_PER_USER + k,
+                user_id=user_id,
+                is_default=k == 0,
+                created_at=created_at,
+                updated_at=created_at,
+                **address_fields(ctx, i, k)
+            ))
+    User.objects.bulk_create(users, batch_size=ctx['batch_size'])
+    UserAddress.objects.bulk_create(addresses, batch_size=ctx['batch_size'])
+    return len(users)
+
+
+def generate_products(ctx, start, end):
+    rng = _rng(ctx, 'products', start)
+    products = []
+    images = []
+    specs = []
+    for i in range(start, end):
+        product_id = ctx['product_base'] + i
+        created_at = _random_time(rng, ctx, 730)
+        name = product_name(i)
+        products.append(Product(
+            id=product_id,
+            category_id=rng.choice(ctx['category_ids']),
+            name=name,
+            description=f'这是{name}的详细描述...',
+            price=product_price(ctx, i),
+            stock=rng.randint(10, 1000),
+            sales=rng.randint(0, 500),
+            status='published',
+            is_active=True,
+            main_image_url=product_image(i),
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+        images.append(ProductImage(
+            product_id=product_id, image_url=product_image(i), is_main=True, created_at=created_at
+        ))
+        specs.extend(
+            ProductSpecification(product_id=product_id, name=spec_name, value=spec_value, created_at=created_at)
+            for spec_name, spec_value in SPECS
+        )
+    Product.objects.bulk_create(products, batch_size=ctx['batch_size'])
+    ProductImage.objects.bulk_create(images, batch_size=ctx['batch_size'])
+    ProductSpecification.objects.bulk_create(specs, batch_size=ctx['batch_size'])
+    return len(products)
+
+
+def generate_user_coupons(ctx, start, end):
+    rng = _rng(ctx, 'user_coupons', start)
+    user_coupons = []
+    for i in range(start, end):
+        # 每个用户随机获得1-3张优惠券
+        for coupon_id in rng.sample(ctx['coupon_ids'], min(rng.randint(1, 3), len(ctx['coupon_ids']))):
+            status = rng.choice([0, 1, 2])  # 0: 未使用, 1: 已使用, 2: 已过期
+            created_at = _random_time(rng, ctx, 60)
+            user_coupons.append(UserCoupon(
+                user_id=ctx['user_base'] + i,
+                coupon_id=coupon_id,
+                status=status,
+                created_at=created_at,
+                used_at=created_at + timedelta(days=rng.randint(1, 30)) if status == 1 else None
+            ))
+    UserCoupon.objects.bulk_create(user_coupons, batch_size=ctx['batch_size'])
+    return end - start
+
+
+def generate_orders(ctx, start, end):
+    rng = _rng(ctx, 'orders', start)
+    orders = []
+    items = []
+    returns = []
+    for i in range(start, end):
+        order_id = ctx['order_base'] + i
+        user_index = rng.randrange(ctx['users'])
+        address_index = rng.randrange(ADDRESSES_PER_USER)
+        address = address_fields(ctx, user_index, address_index)
+        created_at = _random_time(rng, ctx, 365)
+        status = rng.choice([0, 1, 2, 3, 4])  # 待付款、待发货、待收货、已完成、已取消
+
+        total_amount = Decimal('0')
+        product_indexes = rng.sample(range(ctx['products']), min(rng.randint(1, 3), ctx['products']))
+        for product_index in product_indexes:
+            price = product_price(ctx, product_index)
+            quantity = rng.randint(1, 3)
+            total_amount += price * quantity
+            items.append(OrderItem(
+                order_id=order_id,
+                product_id=ctx['product_base'] + product_index,
+                product_name=product_name(product_index),
+                product_image=product_image(product_index),
+                price=price,
+                quantity=quantity,
+                total_price=price * quantity,
+                created_at=created_at,
+            ))
+
+        orders.append(Order(
+            id=order_id,
+            user_id=ctx['user_base'] + user_index,
+            order_no=f'MOCK{order_id:016d}',
+            total_amount=total_amount,
+            shipping_fee=SHIPPING_FEE,
+            final_amount=total_amount + SHIPPING_FEE,
+            status=status,
+            shipping_address_id=ctx['address_base'] + user_index * ADDRESSES_PER_USER + address_index,
+            shipping_name=address['receiver'],
+            shipping_phone=address['phone'],
+            shipping_province=address['province'],
+            shipping_city=address['city'],
+            shipping_district=address['district'],
+            shipping_address_detail=address['address'],
+            payment_method='alipay',
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+
+        # 已完成订单中约 10% 申请退换货
+        if status == 3 and rng.random() < 0.1:
+            product_index = product_indexes[0]
+            returns.append(ReturnRequest(
+                user_id=ctx['user_base'] + user_index,
+                order_id=order_id,
+                product_id=ctx['product_base'] + product_index,
+                total_price=product_price(ctx, product_index),
+                actual_amount=product_price(ctx, product_index),
+                type=rng.choice([1, 2]),  # 1: 退货, 2: 换货
+                reason=f'测试退换货原因 - {rng.choice(RETURN_REASONS)}',
+                status=rng.choice([0, 1, 2, 3, 4]),
+                created_at=created_at + timedelta(days=1),
+                updated_at=created_at + timedelta(days=1),
+            ))
+
+    Order.objects.bulk_create(orders, batch_size=ctx['batch_size'])
+    OrderItem.objects.bulk_create(items, batch_size=ctx['batch_size'])
+    ReturnRequest.objects.bulk_create(returns, batch_size=ctx['batch_size'])
+    return len(orders)
+
+
+def generate_carts(ctx, start, end):
+    rng = _rng(ctx, 'carts', start)
+    carts = []
+    items = []
+    for i in range(start, end):
+        cart_id = ctx['cart_base'] + i
+        created_at = _random_time(rng, ctx, 30)
+        carts.append(Cart(id=cart_id, user_id=ctx['user_base'] + i, created_at=created_at, updated_at=created_at))
+        product_indexes = rng.sample(range(ctx['products']), min(rng.randint(1, 5), ctx['products']))
+        items.extend(
+            CartItem(
+                cart_id=cart_id,
+                product_id=ctx['product_base'] + product_index,
+                quantity=rng.randint(1, 3),
+                selected=rng.choice([True, False]),
+                created_at=created_at,
+                updated_at=created_at
+            )
+            for product_index in product_indexes
+        )
+    Cart.objects.bulk_create(carts, batch_size=ctx['batch_size'])
+    CartItem.objects.bulk_create(items, batch_size=ctx['batch_size'])
+    return len(carts)
+
+
+def _run_chunk(func, ctx, start, end):
+    with explicit_timestamps():
+        return func(ctx, start, end)
+
+
 class Command(BaseCommand):
-    help = '生成测试数据，包括用户、商品、订单和优惠券'
+    help = '生成测试数据，包括用户、商品、订单和优惠券（支持大数据量压测）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='用户数量')
+        parser.add_argument('--products', type=int, default=15, help='商品数量')
+        parser.add_argument('--orders', type=int, default=20, help='订单数量')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子，相同参数生成相同数据')
+        parser.add_argument('--end-date', help='数据时间范围的截止日期（YYYY-MM-DD），默认今天')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='每个分块生成的记录数量')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每条 INSERT 语句的行数')
+        parser.add_argument('--workers', type=int, default=1, help='并行生成数据的进程数')
+        parser.add_argument('--skip-search-index', action='store_true', help='不重建商品搜索索引、筛选维度索引和联想词快照')
 
     def handle(self, *args, **options):
+        if options['users'] < 1 or options['products'] < 1:
+            raise CommandError('--users 和 --products 至少为 1')
+
+        if options['end_date']:
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d')
+        else:
+            end_date = datetime.combine(timezone.localdate(), datetime.min.time())
+        self.options = options
         self.stdout.write('开始生成测试数据...')
-        
-        # 创建测试用户
-        self.stdout.write('创建测试用户...')
-        users = self.create_test_users()
-        
-        # 创建商品分类
+        started = time.monotonic()
+
         self.stdout.write('创建商品分类...')
-        categories = self.create_categories()
-        
-        # 创建商品
-        self.stdout.write('创建商品...')
-        products = self.create_products(categories)
-        
-        # 创建用户地址
-        self.stdout.write('创建用户地址...')
-        addresses = self.create_user_addresses(users)
-        
-        # 创建优惠券
+        category_ids = self.create_categories()
         self.stdout.write('创建优惠券...')
-        coupons = self.create_coupons()
-        
-        # 创建用户优惠券
-        self.stdout.write('创建用户优惠券...')
-        self.create_user_coupons(users, coupons)
-        
-        # 创建订单
-        self.stdout.write('创建订单...')
-        orders = self.create_orders(users, products, addresses)
-        
-        # 创建购物车
-        self.stdout.write('创建购物车...')
-        self.create_carts(users, products)
-        
-        # 创建退换货申请
-        self.stdout.write('创建退换货申请...')
-        self.create_returns(users, orders)
-        
-        self.stdout.write(self.style.SUCCESS('测试数据生成完成！'))
-
-    def create_test_users(self):
-        """创建测试用户"""
-        users = []
-        for i in range(10):
-            username = f'test_user_{i}'
-            email = f'test_user_{i}@example.com'
-            password = 'test123456'
-            
-            user, created = User.objects.get_or_create(
-                username=username,
-                defaults={
-                    'email': email,
-                    'is_active': True
-                }
+        coupon_ids = self.create_coupons()
+
+        ctx = {
+            'seed': options['seed'],
+            'users': options['users'],
+            'products': options['products'],
+            'batch_size': options['batch_size'],
+            'end_time': timezone.make_aware(end_date + timedelta(days=1)),
+            'password': make_password('test123456', salt=f'mockdata{options["seed"]}'),  # 所有用户共用一个密码哈希，避免逐个计算
+            'category_ids': category_ids,
+            'coupon_ids': coupon_ids,
+            'user_base': self.next_id(User),
+            'address_base': self.next_id(UserAddress),
+            'product_base': self.next_id(Product),
+            'order_base': self.next_id(Order),
+            'cart_base': self.next_id(Cart),
+        }
+
+        self.run_stage('用户及地址', generate_users, options['users'], ctx)
+        self.run_stage('商品', generate_products, options['products'], ctx)
+        self.run_stage('用户优惠券', generate_user_coupons, options['users'], ctx)
+        for coupon_id in coupon_ids:
+            Coupon.objects.filter(id=coupon_id).update(
+                claimed_count=UserCoupon.objects.filter(coupon_id=coupon_id).count()
             )
-            
-            if created:
-                user.set_password(password)
-                user.save()
-                self.stdout.write(f'创建用户: {username}')
-            
-            users.append(user)
-        return users
+        self.run_stage('订单', generate_orders, options['orders'], ctx)
+        self.run_stage('购物车', generate_carts, options['users'], ctx)
+
+        if not options['skip_search_index']:
+            self.stdout.write('重建商品搜索索引...')
+            rebuild_index()
+            self.stdout.write('重建商品筛选维度索引...')
+            rebuild_facets()
+            self.stdout.write('重建搜索联想词快照...')
+            rebuild_suggestions()
+        catalog_cache.bump_version(catalog_cache.CATEGORY, catalog_cache.PRODUCT, catalog_cache.SPECIFICATION)
+
+        self.stdout.write(self.style.SUCCESS(f'测试数据生成完成！耗时 {time.monotonic() - started:.1f} 秒'))
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+    def run_stage(self, name, func, total, ctx):
+        """按分块生成数据，--workers 大于 1 时使用多进程并行"""
+        if total <= 0:
+            return
+        started = time.monotonic()
+        chunk_size = self.options['chunk_size']
+        chunks = [(func, ctx, start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+        workers = min(self.options['workers'], len(chunks))
+
+        if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            # 子进程不能复用父进程的数据库连接
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                count = sum(pool.starmap(_run_chunk, chunks))
+        else:
+            count = sum(_run_chunk(*chunk) for chunk in chunks)
+
+        self.stdout.write(f'创建{name}: {count} 条，耗时 {time.monotonic() - started:.1f} 秒')
 
     def create_categories(self):
         """创建商品分类"""
-        categories = []
-        main_categories = ['电子产品', '服装', '食品', '家居', '图书']
-        
-        for main_name in main_categories:
+        category_ids = []
+        for main_name in MAIN_CATEGORIES:
             main_category, _ = Category.objects.get_or_create(
                 name=main_name,
                 defaults={'level': 1}
             )
-            categories.append(main_category)
-            
+            category_ids.append(main_category.id)
+
             # 创建子分类
             for i in range(3):
-                sub_name = f'{main_name}子分类{i+1}'
                 sub_category, _ = Category.objects.get_or_create(
-                    name=sub_name,
+                    name=f'{main_name}子分类{i+1}',
                     parent=main_category,
                     defaults={'level': 2}
                 )
-                categories.append(sub_category)
-        
-        return categories
-
-    def create_products(self, categories):
-        """创建商品"""
-        products = []
-        product_names = [
-            'iPhone 13', 'MacBook Pro', 'AirPods Pro',
-            '休闲T恤', '牛仔裤', '运动鞋',
-            '有机水果', '进口零食', '茶叶',
-            '沙发', '床垫', '衣柜',
-            '小说', '教材', '杂志'
-        ]
-        
-        for name in product_names:
-            category = random.choice(categories)
-            price = random.randint(100, 10000)
-            stock = random.randint(10, 100)
-            
-            product, created = Product.objects.get_or_create(
-                name=name,
-                defaults={
-                    'category': category,
-                    'description': f'这是{name}的详细描述...',
-                    'price': price,
-                    'stock': stock,
-                    'status': 'published',
-                    'is_active': True
-                }
-            )
-            
-            if created:
-                # 创建商品图片
-                ProductImage.objects.create(
-                    product=product,
-                    image_url=f'https://example.com/images/{name}.jpg',
-                    is_main=True
-                )
-                
-                # 创建商品规格
-                specs = [
-                    ('颜色', '黑色'),
-                    ('尺寸', '标准'),
-                    ('材质', '优质')
-                ]
-                for spec_name, spec_value in specs:
-                    ProductSpecification.objects.create(
-                        product=product,
-                        name=spec_name,
-                        value=spec_value
-                    )
-                
-                self.stdout.write(f'创建商品: {name}')
-            
-            products.append(product)
-        
-        return products
-
-    def create_user_addresses(self, users):
-        """创建用户地址"""
-        addresses = []
-        provinces = ['北京', '上海', '广东', '浙江', '江苏']
-        cities = ['北京', '上海', '广州', '深圳', '杭州', '南京']
-        
-        for user in users:
-            for i in range(2):  # 每个用户创建2个地址
-                province = random.choice(provinces)
-                city = random.choice(cities)
-                district = f'{city}区'
-                address = f'测试街道{i+1}号'
-                
-                address_obj, created = UserAddress.objects.get_or_create(
-                    user=user,
-                    defaults={
-                        'receiver': f'收货人{i+1}',
-                        'phone': f'1380000{random.randint(1000, 9999)}',
-                        'province': province,
-                        'city': city,
-                        'district': district,
-                        'address': address,
-                        'is_default': i == 0
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f'创建地址: {user.username} - {address}')
-                
-                addresses.append(address_obj)
-        
-        return addresses
+                category_ids.append(sub_category.id)
+        return category_ids
 
     def create_coupons(self):
         """创建优惠券"""
-        coupons = []
+        coupon_ids = []
         now = timezone.now()
-        
-        # 满减券
-        coupon_types = [
-            ('满100减10', 1, 10, 100),
-            ('满200减30', 1, 30, 200),
-            ('满500减100', 1, 100, 500),
-            ('9折优惠券', 2, 9, 100),
-            ('8折优惠券', 2, 8, 200),
-        ]
-        
-        for name, type_, amount, min_amount in coupon_types:
-            coupon, created = Coupon.objects.get_or_create(
+        for name, type_, amount, min_amount in COUPON_TYPES:
+            coupon, _ = Coupon.objects.get_or_create(
                 name=name,
                 defaults={
                     'type': type_,
@@ -219,156 +428,5 @@ class Command(BaseCommand):
                     'status': 1
                 }
             )
-            
-            if created:
-                self.stdout.write(f'创建优惠券: {name}')
-            
-            coupons.append(coupon)
-        
-        return coupons
-
-    def create_user_coupons(self, users, coupons):
-        """创建用户优惠券"""
-        for user in users:
-            # 每个用户随机获得1-3张优惠券
-            num_coupons = random.randint(1, 3)
-            selected_coupons = random.sample(coupons, min(num_coupons, len(coupons)))
-            
-            for coupon in selected_coupons:
-                # 随机设置优惠券状态
-                status = random.choice([0, 1, 2])  # 0: 未使用, 1: 已使用, 2: 已过期
-                used_at = None
-                if status == 1:  # 如果状态是已使用，设置使用时间
-                    used_at = timezone.now() - timedelta(days=random.randint(1, 30))
-                
-                UserCoupon.objects.get_or_create(
-                    user=user,
-                    coupon=coupon,
-                    defaults={
-                        'status': status,
-                        'used_at': used_at
-                    }
-                )
-
-    def create_orders(self, users, products, addresses):
-        """创建订单"""
-        order_statuses = [0, 1, 2, 3, 4]  # 待付款、待发货、待收货、已完成、已取消
-        orders = []
-        
-        for user in users:
-            # 每个用户创建1-3个订单
-            num_orders = random.randint(1, 3)
-            user_addresses = [addr for addr in addresses if addr.user == user]
-            
-            for _ in range(num_orders):
-                status = random.choice(order_statuses)
-                address = random.choice(user_addresses)
-                
-                # 创建订单
-                order = Order.objects.create(
-                    user=user,
-                    order_no=f'ORDER{random.randint(100000, 999999)}',
-                    total_amount=Decimal('0'),
-                    status=status,
-                    shipping_address=address,
-                    shipping_name=address.receiver,
-                    shipping_phone=address.phone,
-                    shipping_province=address.province,
-                    shipping_city=address.city,
-                    shipping_district=address.district,
-                    shipping_address_detail=address.address,
-                    payment_method='alipay'
-                )
-                
-                # 添加订单商品
-                num_items = random.randint(1, 3)
-                selected_products = random.sample(products, min(num_items, len(products)))
-                
-                for product in selected_products:
-                    quantity = random.randint(1, 3)
-                    price = product.price
-                    
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        product_name=product.name,
-                        product_image=product.images.first().image_url if product.images.exists() else '',
-                        price=price,
-                        quantity=quantity,
-                        total_price=price * quantity
-                    )
-                
-                # 更新订单总金额
-                order.total_amount = sum(item.total_price for item in order.items.all())
-                order.save()
-                
-                self.stdout.write(f'创建订单: {order.order_no}')
-                orders.append(order)
-        
-        return orders
-
-    def create_carts(self, users, products):
-        """创建购物车数据"""
-        for user in users:
-            # 创建购物车
-            cart, created = Cart.objects.get_or_create(user=user)
-            
-            if created:
-                self.stdout.write(f'创建购物车: {user.username}')
-            
-            # 添加购物车商品
-            num_items = random.randint(1, 5)
-            selected_products = random.sample(products, min(num_items, len(products)))
-            
-            for product in selected_products:
-                quantity = random.randint(1, 3)
-                selected = random.choice([True, False])
-                
-                CartItem.objects.get_or_create(
-                    cart=cart,
-                    product=product,
-                    defaults={
-                        'quantity': quantity,
-                        'selected': selected
-                    }
-                )
-
-    def create_returns(self, users, orders):
-        """创建退换货申请"""
-        return_types = [1, 2]  # 1: 退货, 2: 换货
-        return_statuses = [0, 1, 2, 3, 4]  # 待审核、已同意、已拒绝、已完成、已取消
-        
-        for user in users:
-            # 获取用户的已完成订单
-            user_orders = [order for order in orders if order.user == user and order.status == 3]
-            
-            if not user_orders:
-                continue
-            
-            # 每个用户随机对1-2个已完成订单申请退换货
-            num_returns = random.randint(1, 2)
-            selected_orders = random.sample(user_orders, min(num_returns, len(user_orders)))
-            
-            for order in selected_orders:
-                return_type = random.choice(return_types)
-                status = random.choice(return_statuses)
-                reason = f'测试退换货原因 - {random.choice(["商品质量问题", "商品与描述不符", "商品损坏", "其他原因"])}'
-                
-                return_request, created = ReturnRequest.objects.get_or_create(
-                    order=order,
-                    defaults={
-                        'user': user,
-                        'type': return_type,
-                        'reason': reason,
-                        'status': status
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f'创建退换货申请: {order.order_no} - {return_request.get_type_display()}')
-                    
-                    # 创建退换货图片（示例URL）
-                    ReturnImage.objects.create(
-                        return_request=return_request,
-                        image='returns/example.jpg'  # 实际使用时需要替换为真实图片
-                    )
\ No newline at end of file
+            coupon_ids.append(coupon.id)
+        return coupon_ids
@@ -0,0 +1,242 @@
+"""
+Prometheus 指标
+
+只在 uWSGI worker 中记录：各 worker 在内存中累计计数器、直方图和仪表盘，定期写入 settings.METRICS['DIR'] 下
+以 worker 编号命名的快照文件（见 snapshots.py）。测试、bench 和管理命令等其他进程不记录，不写入快照目录。
+/metrics 接口合并所有 worker 的快照后按 Prometheus 文本格式输出，结果与由哪个 worker 响应抓取无关:
+    计数器、直方图  所有 worker 求和；worker 重启后从同一编号的快照继续累计，保证单调递增
+    仪表盘          只对写入快照的进程仍在运行的 worker 求和
+
+配置 settings.METRICS:
+    ENABLED         是否记录
+    DIR             快照目录
+    FLUSH_INTERVAL  写入快照的最小间隔（秒）
+    ALLOWED_IPS     允许访问 /metrics 的 IP，默认只允许本机，为空时不限制
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .snapshots import process_alive, read_own_snapshot, read_snapshots, worker_id, write_snapshot
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': os.path.join(settings.BASE_DIR, 'var', 'metrics'),
+    'FLUSH_INTERVAL': 5,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# 请求耗时直方图的桶上限（秒）
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+# 指标名称 -> (类型, 说明)
+METRICS = {
+    'http_requests_total': (COUNTER, 'HTTP 请求数'),
+    'http_request_duration_seconds': (HISTOGRAM, 'HTTP 请求耗时'),
+    'db_queries_total': (COUNTER, 'SQL 查询数'),
+    'db_query_duration_seconds_total': (COUNTER, 'SQL 查询总耗时'),
+    'db_connections_open': (GAUGE, '各线程请求结束时已打开的数据库连接数之和'),
+    'db_connections_created_total': (COUNTER, '新建的数据库连接数'),
+    'product_cache_requests_total': (COUNTER, '商品缓存读取次数'),
+    'product_cache_hit_ratio': (GAUGE, '商品缓存命中率'),
+    'orders_created_total': (COUNTER, '创建的订单数'),
+    'payments_completed_total': (COUNTER, '完成的支付数'),
+    'coupons_claimed_total': (COUNTER, '优惠券领取请求数'),
+    'idempotent_replays_total': (COUNTER, '按 Idempotency-Key 返回已保存响应的请求数'),
+    'facet_index_sync_failures_total': (COUNTER, '筛选维度位图索引同步失败次数'),
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def _series_key(name, labels):
+    """序列标识，labels 按名称排序后序列化，可作为 JSON 对象的 key"""
+    return json.dumps([name, sorted((labels or {}).items())], ensure_ascii=False)
+
+
+class Registry:
+    """进程内的指标存储"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.last_flush = 0.0
+
+    def _start(self):
+        """
+        进程中首次记录时（包括 fork 出的 worker），从同一 worker 编号的快照接续计数器和直方图，
+        上一个进程的仪表盘不再保留
+        """
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+        previous = read_own_snapshot(config()['DIR']) or {}
+        with self.lock:
+            if self.pid == pid:
+                return
+            self.pid = pid
+            self.counters = dict(previous.get('counters', {}))
+            self.histograms = dict(previous.get('histograms', {}))
+            self.gauges = {}
+
+    def inc(self, name, labels=None, value=1):
+        key = _series_key(name, labels)
+        self._start()
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, value, labels=None):
+        key = _series_key(name, labels)
+        self._start()
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': [0] * (len(DURATION_BUCKETS) + 1), 'sum': 0.0, 'count': 0
+                }
+            histogram['buckets'][bisect_left(DURATION_BUCKETS, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+        self._maybe_flush()
+
+    def set_gauge(self, name, value, labels=None):
+        self._start()
+        with self.lock:
+            self.gauges[_series_key(name, labels)] = value
+
+    def _maybe_flush(self):
+        if time.time() - self.last_flush >= config()['FLUSH_INTERVAL']:
+            self.flush()
+
+    def flush(self):
+        if self.pid != os.getpid():
+            # 本进程没有记录过，不覆盖同一 worker 编号的快照
+            return
+        with self.lock:
+            self.last_flush = time.time()
+            snapshot = {
+                'counters': dict(self.counters),
+                'histograms': {key: dict(value, buckets=list(value['buckets'])) for key, value in self.histograms.items()},
+                'gauges': dict(self.gauges),
+            }
+        if any(snapshot.values()):
+            write_snapshot(config()['DIR'], snapshot)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def recording():
+    """是否记录指标：已启用且在 uWSGI worker 中运行"""
+    return config()['ENABLED'] and worker_id() is not None
+
+
+def inc(name, labels=None, value=1):
+    """递增计数器，未启用或不在 uWSGI worker 中时不记录"""
+    if recording():
+        registry.inc(name, labels, value)
+
+
+def observe(name, value, labels=None):
+    if recording():
+        registry.observe(name, value, labels)
+
+
+def set_gauge(name, value, labels=None):
+    if recording():
+        registry.set_gauge(name, value, labels)
+
+
+def count_connection(sender, connection, **kwargs):
+    """connection_created 信号处理函数"""
+    inc('db_connections_created_total', {'alias': connection.alias})
+
+
+def collect():
+    """合并所有进程的快照，返回 (counters, histograms, gauges)"""
+    registry.flush()
+    counters = {}
+    histograms = {}
+    gauges = {}
+    for pid, snapshot in read_snapshots(config()['DIR']):
+        for key, value in snapshot.get('counters', {}).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, value in snapshot.get('histograms', {}).items():
+            merged = histograms.setdefault(key, {
+                'buckets': [0] * (len(DURATION_BUCKETS) + 1), 'sum': 0.0, 'count': 0
+            })
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], value['buckets'])]
+            merged['sum'] += value['sum']
+            merged['count'] += value['count']
+        if process_alive(pid):
+            for key, value in snapshot.get('gauges', {}).items():
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """按 Prometheus 文本格式输出全部指标"""
+    counters, histograms, gauges = collect()
+
+    # 根据命中/未命中计数计算商品缓存命中率
+    cache_counts = {}
+    for key, value in counters.items():
+        name, labels = json.loads(key)
+        if name == 'product_cache_requests_total':
+            cache_counts[dict(labels).get('result')] = value
+    cache_total = sum(cache_counts.values())
+    if cache_total:
+        gauges[_series_key('product_cache_hit_ratio', None)] = cache_counts.get('hit', 0) / cache_total
+
+    series = {}
+    for store in (counters, histograms, gauges):
+        for key, value in store.items():
+            name, labels = json.loads(key)
+            series.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in sorted(series.get(name, []), key=lambda item: item[0]):
+            if metric_type == HISTOGRAM:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ['+Inf'], value['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value["sum"])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics, profiling
+
+
+class RequestProfilingMiddleware:
+    """
+    记录每个请求的 SQL 查询数、数据库耗时、视图耗时、序列化耗时、渲染耗时和总耗时
+
+    应放在 MIDDLEWARE 的第一位，使总耗时覆盖其他中间件。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = profiling.config()
+
+    def __call__(self, request):
+        if not self.options['ENABLED']:
+            return self.get_response(request)
+
+        profile, token = profiling.start_profile()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profiling.count_queries))
+                response = self.get_response(request)
+        except Exception:
+            profile.finish(started)
+            profiling.recorder.record(profile, error=True)
+            raise
+        finally:
+            profiling.end_profile(token)
+
+        profile.finish(started)
+        profiling.recorder.record(profile, error=response.status_code >= 500)
+        if self.options['SERVER_TIMING']:
+            response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = profiling.current_profile()
+        if profile is not None:
+            profile.view = profiling.view_name(request, view_func)
+            profile.view_started = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的 Prometheus 指标（按路由统计请求数和耗时）
+
+    放在 RequestProfilingMiddleware 之后时，同时记录该请求的 SQL 查询数和耗时。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = metrics.config()['ENABLED']
+        # 数据库连接按线程保存，记录各线程最近一次请求结束时的状态，仪表盘为进程内所有线程之和
+        self.open_connections = {}  # {(线程ID, 别名): 是否打开}
+        self.connections_lock = threading.Lock()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self.record(request, 500, started)
+            raise
+        self.record(request, response.status_code, started)
+        return response
+
+    def record(self, request, status_code, started):
+        match = getattr(request, 'resolver_match', None)
+        route = profiling.view_name(request, match.func) if match else profiling.UNRESOLVED
+        labels = {'route': route, 'method': request.method}
+        metrics.inc('http_requests_total', dict(labels, status=str(status_code)))
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, labels)
+
+        profile = profiling.current_profile()
+        if profile is not None and profile.queries:
+            metrics.inc('db_queries_total', {'route': route}, profile.queries)
+            metrics.inc('db_query_duration_seconds_total', {'route': route}, profile.db_ms / 1000)
+
+        self.record_connections()
+
+    def record_connections(self):
+        thread_id = threading.get_ident()
+        totals = defaultdict(int)
+        with self.connections_lock:
+            for connection in connections.all():
+                self.open_connections[thread_id, connection.alias] = int(connection.connection is not None)
+            for (_, alias), is_open in self.open_connections.items():
+                totals[alias] += is_open
+        for alias, total in totals.items():
+            metrics.set_gauge('db_connections_open', total, {'alias': alias})
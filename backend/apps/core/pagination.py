@@ -0,0 +1,267 @@
+"""
+键集（keyset）分页
+
+按排序字段的取值定位下一页，例如默认排序 (-created_at, -id) 的下一页条件为
+    created_at <= 上一页最后一行的 created_at AND (created_at < ... OR id < ...)
+查询只扫描索引中需要的行，不使用 OFFSET，翻到多深的页耗时都一样。
+
+游标是对排序字段取值的不透明编码（base64 JSON），客户端只需使用响应中的 next/previous 链接。
+排序包含非模型字段（例如搜索相关度）时，无法按取值定位，退化为在游标中编码偏移量。
+
+默认不返回总数；?count=estimate 使用数据库统计信息估算，?count=exact 返回精确总数。
+"""
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder 会把时间截断到毫秒，游标需要保留完整精度"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def estimate_count(queryset):
+    """
+    使用数据库的统计信息估算查询结果行数，不执行 COUNT(*)
+
+    MySQL、PostgreSQL 读取 EXPLAIN 中优化器估算的行数；其他数据库没有可用的估算，返回精确值。
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    sql, params = queryset.values('pk').query.sql_with_params()
+
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+        return int((row.get('rows') or 0) * float(row.get('filtered') or 100) / 100)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    return queryset.count()
+
+
+class KeysetPagination(BasePagination):
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 10)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    # 模型没有默认排序时使用
+    default_ordering = ('-created_at', '-id')
+    invalid_cursor_message = '无效的分页游标'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+        self.model = queryset.model
+
+        order_by = self.get_order_by(queryset)
+        self.signature = ','.join(order_by)
+        self.ordering = self.get_keyset_ordering(order_by)
+        cursor = self.decode_cursor(request)
+
+        if self.ordering is None:
+            return self.paginate_by_offset(queryset, cursor)
+        return self.paginate_by_keyset(queryset.order_by(*self.ordering_expressions()), cursor)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        if mode == 'exact':
+            return queryset.count()
+        return None
+
+    def get_order_by(self, queryset):
+        query = queryset.query
+        if query.order_by:
+            return [str(item) for item in query.order_by]
+        if query.default_ordering and self.model._meta.ordering:
+            return [str(item) for item in self.model._meta.ordering]
+        return list(self.default_ordering)
+
+    def get_keyset_ordering(self, order_by):
+        """
+        返回 [(字段, 是否降序), ...]，末尾补充主键保证排序唯一；
+        排序中有注解、关联字段或可为空的字段时返回 None（使用偏移量分页）
+        """
+        opts = self.model._meta
+        ordering = []
+        for item in order_by:
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            if name == 'pk':
+                name = opts.pk.name
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if field.is_relation or field.null:
+                return None
+            ordering.append((field, descending))
+            if field.primary_key:
+                return ordering
+        ordering.append((opts.pk, ordering[-1][1] if ordering else True))
+        return ordering
+
+    def ordering_expressions(self):
+        return [f'-{field.name}' if descending else field.name for field, descending in self.ordering]
+
+    def keyset_condition(self, values, reverse):
+        """排在游标之后（reverse 时为之前）的行"""
+        condition = Q()
+        for index, (field, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            term = Q(**{f'{field.name}__{lookup}': values[index]})
+            for previous_index, (previous_field, _) in enumerate(self.ordering[:index]):
+                term &= Q(**{previous_field.name: values[previous_index]})
+            condition |= term
+        # 冗余的首字段范围条件，便于数据库直接使用索引范围扫描
+        first_field, descending = self.ordering[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{first_field.name}__{lookup}': values[0]}) & condition
+
+    def paginate_by_keyset(self, queryset, cursor):
+        reverse = bool(cursor and cursor.get('r'))
+        if cursor:
+            try:
+                values = [field.to_python(value) for (field, _), value in zip(self.ordering, cursor['v'])]
+            except (KeyError, TypeError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            if len(values) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self.keyset_condition(values, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+
+        if not rows:
+            # 页面为空时没有可以编码为游标的行，不返回下一页；向前翻页为空时也不返回上一页
+            self.has_next = False
+            if reverse:
+                self.has_previous = False
+        self.next_position = self.position(rows[-1]) if self.has_next else None
+        self.previous_position = self.position(rows[0]) if rows and self.has_previous else None
+        return rows
+
+    def position(self, row):
+        return [getattr(row, field.attname) for field, _ in self.ordering]
+
+    def paginate_by_offset(self, queryset, cursor):
+        try:
+            offset = max(int(cursor.get('o', 0)), 0) if cursor else 0
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = offset > 0
+        self.offset = offset
+        return rows[:self.page_size]
+
+    def encode_cursor(self, data):
+        data = dict(data, s=self.signature)
+        raw = json.dumps(data, cls=CursorEncoder, separators=(',', ':')).encode('utf-8')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, base64.urlsafe_b64encode(raw).decode('ascii')
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # 游标只对生成它的排序有效
+        if not isinstance(data, dict) or data.get('s') != self.signature:
+            raise NotFound(self.invalid_cursor_message)
+        return data
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.ordering is None:
+            return self.encode_cursor({'o': self.offset + self.page_size})
+        return self.encode_cursor({'v': self.next_position})
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.ordering is None:
+            offset = max(self.offset - self.page_size, 0)
+            if offset == 0:
+                return remove_query_param(self.base_url, self.cursor_query_param)
+            return self.encode_cursor({'o': offset})
+        if self.previous_position is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor({'v': self.previous_position, 'r': True})
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'description': '仅在 ?count=estimate 或 ?count=exact 时返回'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'integer'}},
+            {'name': self.count_query_param, 'required': False, 'in': 'query',
+             'schema': {'type': 'string', 'enum': ['estimate', 'exact']}},
+        ]
@@ -0,0 +1,292 @@
+"""
+请求性能统计
+
+RequestProfilingMiddleware 为每个请求记录 SQL 查询数、数据库耗时、视图耗时、序列化耗时、渲染耗时和总耗时，
+按视图和动作（例如 OrderViewSet.create）汇总：
+
+    视图耗时    从进入视图到开始渲染响应，包括其中的 SQL 和序列化
+    序列化耗时  使用 ProfiledSerializerMixin 的序列化器将对象转换为响应数据（to_representation），
+                嵌套的序列化器计入最外层，其中的 SQL（例如延迟加载的关联）同时计入数据库耗时
+    渲染耗时    ProfiledJSONRenderer 将响应数据编码为 JSON，需配置在 REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] 中
+
+统计数据先在进程内按时间窗口（默认每分钟一个）聚合为直方图，定期写入
+settings.REQUEST_PROFILING['DIR'] 下以 uWSGI worker 编号命名的快照文件（见 snapshots.py），
+worker 重启后接续同一文件中的窗口；dump_request_stats 命令读取并合并所有进程的快照，
+得到最近一段时间内各接口的滚动统计。与 Prometheus 指标一样只在 uWSGI worker 中汇总，
+其他进程（runserver、测试）只返回 Server-Timing 头。
+
+配置 settings.REQUEST_PROFILING:
+    ENABLED         是否记录
+    SERVER_TIMING   是否在响应中返回 Server-Timing 头
+    DIR             快照目录
+    WINDOW          时间窗口长度（秒）
+    RETENTION       保留的窗口数量
+    FLUSH_INTERVAL  写入快照的最小间隔（秒）
+"""
+import atexit
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .snapshots import read_own_snapshot, read_snapshots, worker_id, write_snapshot
+
+# 总耗时直方图的桶上限（毫秒），最后一个桶为 +Inf
+BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'DIR': os.path.join(settings.BASE_DIR, 'var', 'profiling'),
+    'WINDOW': 60,
+    'RETENTION': 60,
+    'FLUSH_INTERVAL': 10,
+}
+
+UNRESOLVED = '<unresolved>'
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILING', {})}
+
+
+class RequestProfile:
+    """单个请求的统计"""
+
+    def __init__(self):
+        self.view = UNRESOLVED
+        self.queries = 0
+        self.db_ms = 0.0
+        self.view_ms = 0.0
+        self.serializer_ms = 0.0
+        self.render_ms = 0.0
+        self.total_ms = 0.0
+        self.view_started = None
+        self.render_started = None
+        self.serializing = False
+
+    def finish(self, started):
+        """请求结束时计算总耗时和视图耗时，未经 ProfiledJSONRenderer 渲染的视图耗时截止到请求结束"""
+        ended = time.perf_counter()
+        self.total_ms = (ended - started) * 1000
+        if self.view_started is not None:
+            self.view_ms = ((self.render_started or ended) - self.view_started) * 1000
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;desc="{self.queries} queries";dur={self.db_ms:.1f}',
+            f'view;dur={self.view_ms:.1f}',
+            f'serializer;dur={self.serializer_ms:.1f}',
+            f'render;dur={self.render_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+
+def current_profile():
+    """当前请求的统计，不在请求中时返回 None"""
+    return _current.get()
+
+
+def start_profile():
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def end_profile(token):
+    _current.reset(token)
+
+
+def view_name(request, view_func):
+    """
+    视图名称
+
+    DRF 视图集为 类名.动作（OrderViewSet.create、OrderViewSet.pay），
+    其他类视图为 类名.请求方法，函数视图为 模块.函数名
+    """
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    method = request.method.lower()
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+def count_queries(execute, sql, params, many, context):
+    """connection.execute_wrapper 使用的包装函数，累计查询数和数据库耗时"""
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.db_ms += (time.perf_counter() - started) * 1000
+
+
+class ProfiledSerializerMixin:
+    """记录序列化耗时的序列化器，many=True 时按每个对象累计"""
+
+    def to_representation(self, instance):
+        profile = _current.get()
+        if profile is None or profile.serializing:
+            return super().to_representation(instance)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serializing = False
+            profile.serializer_ms += (time.perf_counter() - started) * 1000
+
+
+class ProfiledJSONRenderer(JSONRenderer):
+    """记录渲染耗时的 JSONRenderer，渲染开始的时间同时是视图耗时的终点"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        if profile.render_started is None:
+            profile.render_started = started
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            profile.render_ms += (time.perf_counter() - started) * 1000
+
+
+class Aggregate:
+    """一个视图在一个时间窗口内的汇总"""
+    FIELDS = ('count', 'errors', 'queries', 'db_ms', 'view_ms', 'serializer_ms', 'render_ms', 'total_ms', 'max_ms')
+
+    def __init__(self, data=None):
+        data = data or {}
+        for field in self.FIELDS:
+            setattr(self, field, data.get(field, 0))
+        self.buckets = list(data.get('buckets') or [0] * (len(BUCKETS) + 1))
+
+    def add(self, profile, error):
+        self.count += 1
+        self.errors += int(error)
+        self.queries += profile.queries
+        self.db_ms += profile.db_ms
+        self.view_ms += profile.view_ms
+        self.serializer_ms += profile.serializer_ms
+        self.render_ms += profile.render_ms
+        self.total_ms += profile.total_ms
+        self.max_ms = max(self.max_ms, profile.total_ms)
+        self.buckets[bisect_left(BUCKETS, profile.total_ms)] += 1
+
+    def merge(self, other):
+        for field in self.FIELDS:
+            if field == 'max_ms':
+                self.max_ms = max(self.max_ms, other.max_ms)
+            else:
+                setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def percentile(self, p):
+        """根据直方图估算分位数（桶内线性插值），落在 +Inf 桶时返回最大值"""
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                if index == len(BUCKETS):
+                    return self.max_ms
+                lower = BUCKETS[index - 1] if index else 0
+                return lower + (BUCKETS[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.max_ms
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['buckets'] = self.buckets
+        return data
+
+
+class StatsRecorder:
+    """进程内的滚动统计，定期写入快照文件"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.windows = {}  # {窗口起始时间: {视图: Aggregate}}
+        self.last_flush = time.time()
+
+    def _start(self):
+        """进程中首次记录时，接续同一 worker 编号的快照中的窗口"""
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+        previous = read_own_snapshot(config()['DIR']) or {}
+        with self.lock:
+            if self.pid == pid:
+                return
+            self.pid = pid
+            self.windows = {
+                int(window): {view: Aggregate(data) for view, data in views.items()}
+                for window, views in previous.items()
+            }
+
+    def record(self, profile, error=False):
+        if worker_id() is None:
+            return
+        self._start()
+        options = config()
+        now = time.time()
+        window = int(now // options['WINDOW'] * options['WINDOW'])
+        with self.lock:
+            views = self.windows.setdefault(window, {})
+            views.setdefault(profile.view, Aggregate()).add(profile, error)
+            should_flush = now - self.last_flush >= options['FLUSH_INTERVAL']
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        if self.pid != os.getpid():
+            # 本进程没有记录过，不覆盖同一 worker 编号的快照
+            return
+        options = config()
+        now = time.time()
+        oldest = now - options['WINDOW'] * options['RETENTION']
+        with self.lock:
+            self.last_flush = now
+            for window in [window for window in self.windows if window < oldest]:
+                del self.windows[window]
+            snapshot = {
+                str(window): {view: aggregate.to_dict() for view, aggregate in views.items()}
+                for window, views in self.windows.items()
+            }
+        if snapshot:
+            write_snapshot(options['DIR'], snapshot)
+
+
+recorder = StatsRecorder()
+atexit.register(recorder.flush)
+
+
+def load_stats(since):
+    """
+    合并所有进程快照中 since（时间戳）之后的窗口，返回 {视图: Aggregate}
+
+    超出保留期的快照文件（对应已退出的进程）在读取时删除
+    """
+    options = config()
+    expire_before = time.time() - options['WINDOW'] * options['RETENTION']
+    result = {}
+    for pid, snapshot in read_snapshots(options['DIR'], expire_before):
+        for window, views in snapshot.items():
+            if int(window) < since:
+                continue
+            for view, data in views.items():
+                result.setdefault(view, Aggregate()).merge(Aggregate(data))
+    return result
@@ -0,0 +1,112 @@
+"""
+按请求裁剪序列化器字段
+
+DynamicFieldsMixin 支持两个查询参数（多个值用逗号分隔，嵌套字段用点号）：
+    ?fields=id,name,items.quantity    只输出列出的字段
+    ?expand=images,items.product      输出 Meta.expandable_fields 中默认不输出的字段，
+                                      或将默认的精简表示替换为完整表示
+
+    class ProductListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+        class Meta:
+            model = Product
+            fields = ['id', 'name', 'price']
+            expandable_fields = {
+                'images': ('apps.products.serializers.ProductImageSerializer', {'many': True}),
+            }
+
+查询参数只作用于最外层的序列化器，嵌套的 DynamicFieldsMixin 序列化器由外层按点号后的部分传入。
+也可以在构造时通过 fields= / expand= 参数指定。
+"""
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_names(value):
+    """
+    'id,items,items.quantity' -> {'id': {''}, 'items': {'', 'quantity'}}
+
+    空字符串表示该名称本身被列出（而不只是其下的嵌套字段）
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    result = {}
+    for name in value or ():
+        name = name.strip()
+        if not name:
+            continue
+        head, _, rest = name.partition('.')
+        result.setdefault(head, set()).add(rest)
+    return result
+
+
+def field_options(request):
+    """
+    请求中的字段选项，返回可哈希的 (fields, expand)，用于 eager_load 等按选项缓存的场景
+    """
+    if request is None:
+        return (), ()
+    params = request.query_params
+    return (
+        tuple(sorted(set(params.get(FIELDS_PARAM, '').split(',')) - {''})),
+        tuple(sorted(set(params.get(EXPAND_PARAM, '').split(',')) - {''})),
+    )
+
+
+class DynamicFieldsMixin:
+    """支持 fields / expand 的序列化器"""
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested_fields = fields
+        self._requested_expand = expand
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_field_options(self):
+        """返回 (fields, expand)，均为 parse_names 的结果，fields 为 None 表示不限制"""
+        fields, expand = self._requested_fields, self._requested_expand
+        if fields is None and expand is None and self._is_root():
+            request = self.context.get('request')
+            if request is not None:
+                fields = request.query_params.get(FIELDS_PARAM)
+                expand = request.query_params.get(EXPAND_PARAM)
+        fields = parse_names(fields) if fields else None
+        return fields, parse_names(expand)
+
+    def build_expanded_field(self, name):
+        serializer_class, kwargs = self.Meta.expandable_fields[name]
+        if isinstance(serializer_class, str):
+            serializer_class = import_string(serializer_class)
+        return serializer_class(**dict({'read_only': True}, **kwargs))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected, expand = self.get_field_options()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+
+        for name, children in expand.items():
+            # items.product 展开 product 本身，items.product.images 只展开 product 下的 images
+            if '' in children and name in expandable:
+                fields[name] = self.build_expanded_field(name)
+
+        if selected is not None:
+            for name in list(fields):
+                if name not in selected:
+                    del fields[name]
+
+        # 将点号后的部分传给嵌套的序列化器
+        for name, field in fields.items():
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, DynamicFieldsMixin):
+                child_fields = selected.get(name) if selected else None
+                # 只列出字段本身时输出其全部子字段
+                nested._requested_fields = None if not child_fields or '' in child_fields else child_fields
+                nested._requested_expand = expand.get(name, set()) - {''}
+        return fields
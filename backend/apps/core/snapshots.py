@@ -0,0 +1,87 @@
+"""
+按进程写入的 JSON 快照文件
+
+uWSGI 多进程部署时，各 worker 将自己的统计写入 <目录>/worker-<编号>.json，
+读取方合并目录下所有快照得到与具体进程无关的数据。文件按 worker 编号而不是进程号命名：
+worker 重启（max-requests、harakiri）后沿用同一个文件，文件数量不超过 worker 数量，
+也不会因为进程号被复用而覆盖其他 worker 的数据。不在 uWSGI 中运行时（runserver、管理命令）按进程号命名。
+
+文件内容为 {"pid": 写入进程的进程号, "data": 数据}。
+"""
+import json
+import os
+
+try:
+    import uwsgi
+except ImportError:  # 不在 uWSGI 中运行
+    uwsgi = None
+
+
+def worker_id():
+    """当前 uWSGI worker 的编号（从 1 开始），不在 uWSGI worker 中时返回 None"""
+    if uwsgi is None:
+        return None
+    return uwsgi.worker_id() or None
+
+
+def _snapshot_path(directory):
+    number = worker_id()
+    name = f'worker-{number}' if number is not None else str(os.getpid())
+    return os.path.join(directory, f'{name}.json')
+
+
+def write_snapshot(directory, data):
+    """写入当前进程的快照，先写临时文件再改名，读取方不会读到写了一半的文件"""
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'pid': os.getpid(), 'data': data}, f)
+    os.replace(tmp_path, path)
+
+
+def read_own_snapshot(directory):
+    """读取当前 worker 编号（或进程号）对应的快照，worker 重启后用于接续之前的累计值"""
+    try:
+        with open(_snapshot_path(directory), encoding='utf-8') as f:
+            return json.load(f)['data']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def read_snapshots(directory, expire_before=None):
+    """
+    读取目录下所有快照，返回 [(写入进程的进程号, 数据), ...]
+
+    expire_before 为时间戳，修改时间早于它的快照（对应早已退出的进程）会被删除
+    """
+    result = []
+    if not os.path.isdir(directory):
+        return result
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            if expire_before is not None and os.path.getmtime(path) < expire_before:
+                os.remove(path)
+                continue
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            result.append((snapshot['pid'], snapshot['data']))
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    return result
+
+
+def process_alive(pid):
+    """进程是否仍在运行（仅对本机进程有效）"""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,210 @@
+"""
+Snowflake 风格的唯一编号生成器
+
+64 位编号结构（高位到低位）:
+    41 位毫秒时间戳（相对 EPOCH） | 5 位机器号 | 5 位进程号 | 12 位序列号
+
+编号按时间递增，同一进程内单调递增，写入唯一索引时始终追加在末尾，
+避免随机编号带来的 InnoDB 页分裂。
+
+配置 settings.SNOWFLAKE:
+    MACHINE_ID  机器号（0-31），未配置时读取环境变量 SNOWFLAKE_MACHINE_ID，都没有时拒绝生成编号；
+                多机部署时每台机器必须不同
+    LEASE_IDS   非 uWSGI 进程租用的进程号范围（含两端），uWSGI worker 编号须小于该范围
+    LEASE_TTL   租约有效期（秒），进程运行期间在过半时续期
+
+进程号在 uWSGI worker 中取 worker 编号。管理命令等其他进程从 LEASE_IDS 中租用一个进程号：
+在共享缓存中 add 键 snowflake:lease:<机器号>:<进程号>，同一台机器上同时运行的进程不会取得相同的进程号，
+进程退出时释放。
+"""
+import atexit
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from . import snapshots
+
+# 2025-01-01 00:00:00 UTC
+EPOCH = 1735689600000
+
+MACHINE_ID_BITS = 5
+PROCESS_ID_BITS = 5
+WORKER_ID_BITS = MACHINE_ID_BITS + PROCESS_ID_BITS
+SEQUENCE_BITS = 12
+
+MAX_MACHINE_ID = (1 << MACHINE_ID_BITS) - 1
+MAX_PROCESS_ID = (1 << PROCESS_ID_BITS) - 1
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+DEFAULTS = {
+    'MACHINE_ID': None,
+    'LEASE_IDS': (16, MAX_PROCESS_ID),
+    'LEASE_TTL': 3600,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'SNOWFLAKE', {})}
+
+
+def _current_millis():
+    return int(time.time() * 1000)
+
+
+class SnowflakeGenerator:
+    """线程安全的编号生成器"""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker id 必须在 0-{MAX_WORKER_ID} 之间')
+        self.worker_id = worker_id
+        self.last_timestamp = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            timestamp = _current_millis()
+            if timestamp < self.last_timestamp:
+                # 时钟回拨时沿用上次的时间戳，保证单调递增
+                timestamp = self.last_timestamp
+
+            if timestamp == self.last_timestamp:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    # 同一毫秒内序列号用尽，等待下一毫秒
+                    while timestamp <= self.last_timestamp:
+                        timestamp = _current_millis()
+            else:
+                self.sequence = 0
+
+            self.last_timestamp = timestamp
+            return (
+                ((timestamp - EPOCH) << (WORKER_ID_BITS + SEQUENCE_BITS))
+                | (self.worker_id << SEQUENCE_BITS)
+                | self.sequence
+            )
+
+
+def machine_id():
+    value = config()['MACHINE_ID']
+    if value is None:
+        value = os.environ.get('SNOWFLAKE_MACHINE_ID')
+    if value is None:
+        raise ImproperlyConfigured('未配置 SNOWFLAKE["MACHINE_ID"]，多机部署时每台机器须配置不同的机器号')
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ImproperlyConfigured(f'SNOWFLAKE["MACHINE_ID"] 不是整数: {value!r}')
+    if not 0 <= value <= MAX_MACHINE_ID:
+        raise ImproperlyConfigured(f'SNOWFLAKE["MACHINE_ID"] 必须在 0-{MAX_MACHINE_ID} 之间')
+    return value
+
+
+class ProcessIdLease:
+    """非 uWSGI 进程从 LEASE_IDS 中租用的进程号"""
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.process_id = None
+        self.acquired_at = None
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def _key(self, process_id):
+        return f'snowflake:lease:{self.machine}:{process_id}'
+
+    def acquire(self):
+        options = config()
+        low, high = options['LEASE_IDS']
+        for process_id in range(low, high + 1):
+            if cache.add(self._key(process_id), self.owner, options['LEASE_TTL']):
+                self.process_id = process_id
+                self.acquired_at = time.monotonic()
+                return process_id
+        raise RuntimeError(f'机器 {self.machine} 上没有可租用的 snowflake 进程号（{low}-{high}）')
+
+    def renew(self):
+        """
+        租约过半时续期，返回租约是否仍然有效
+
+        超过有效期才调用时（例如进程被挂起），或续期时发现键已过期、被淘汰或属于其他进程，
+        租约可能已被其他进程取得，返回 False，由调用方重新租用
+        """
+        if self.process_id is None:
+            return False
+        ttl = config()['LEASE_TTL']
+        elapsed = time.monotonic() - self.acquired_at
+        if elapsed >= ttl:
+            return False
+        if elapsed >= ttl / 2:
+            key = self._key(self.process_id)
+            if cache.get(key) != self.owner or not cache.touch(key, ttl):
+                self.process_id = None
+                return False
+            self.acquired_at = time.monotonic()
+        return True
+
+    def release(self):
+        # 租约未过期时仍由当前进程持有，可以直接删除
+        if self.process_id is not None and time.monotonic() - self.acquired_at < config()['LEASE_TTL']:
+            cache.delete(self._key(self.process_id))
+        self.process_id = None
+
+
+_generator = None
+_generator_pid = None
+_lease = None
+_generator_lock = threading.Lock()
+
+
+def _create_generator():
+    """创建当前进程的生成器，返回 (生成器, 租约)，uWSGI worker 不需要租约"""
+    machine = machine_id()
+    number = snapshots.worker_id()
+    if number is not None:
+        if number >= config()['LEASE_IDS'][0]:
+            raise ImproperlyConfigured(f'uWSGI worker 编号 {number} 与 SNOWFLAKE["LEASE_IDS"] 重叠')
+        return SnowflakeGenerator((machine << PROCESS_ID_BITS) | number), None
+    lease = ProcessIdLease(machine)
+    process_id = lease.acquire()
+    return SnowflakeGenerator((machine << PROCESS_ID_BITS) | process_id), lease
+
+
+def _release_lease():
+    if _lease is not None and _generator_pid == os.getpid():
+        _lease.release()
+
+
+atexit.register(_release_lease)
+
+
+def get_generator():
+    """
+    获取当前进程的生成器
+
+    uWSGI 等预派生模型会在 fork 后复用父进程内存，这里按进程号重新创建，
+    避免多个 worker 共用同一个 worker id 和序列号；租用的进程号失效时重新租用
+    """
+    global _generator, _generator_pid, _lease
+    pid = os.getpid()
+    if _generator is None or _generator_pid != pid or (_lease is not None and not _lease.renew()):
+        with _generator_lock:
+            if _generator is None or _generator_pid != pid or (_lease is not None and not _lease.renew()):
+                _generator, _lease = _create_generator()
+                _generator_pid = pid
+    return _generator
+
+
+def next_id():
+    return get_generator().next_id()
+
+
+def generate_no(prefix=''):
+    """生成带业务前缀的编号，例如 ORDER123456789012345678"""
+    return f'{prefix}{next_id()}'
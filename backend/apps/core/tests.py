@@ -0,0 +1,239 @@
+import os
+import re
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from apps.core import metrics, profiling, snapshots, snowflake
+from apps.core.middleware import MetricsMiddleware
+from apps.orders.models import Order
+from apps.products.models import Category, Product
+from apps.users.models import User
+
+
+class GenerateMockDataTest(TestCase):
+    """测试数据生成：可以在已有数据上重复执行"""
+
+    def generate(self):
+        call_command(
+            'generate_mock_data', '--users', 3, '--products', 4, '--orders', 5, '--skip-search-index',
+            stdout=StringIO()
+        )
+
+    def test_run_twice(self):
+        self.generate()
+        self.generate()
+        self.assertEqual(User.objects.filter(username__startswith='test_user_').count(), 6)
+        self.assertEqual(Order.objects.count(), 10)
+
+
+@override_settings(CACHE_TTL={})
+class KeysetPaginationTest(TestCase):
+    """游标分页：空页面不生成游标"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        category = Category.objects.create(name='手机')
+        Product.objects.bulk_create([
+            Product(category=category, name=f'手机{i}', description='', price=100, stock=10) for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_reverse_page(self):
+        second = self.client.get('/products/products/', {'page_size': 2})
+        second = self.client.get(second.data['next'])
+        previous_url = second.data['previous']
+        # 前一页的商品都已删除
+        Product.objects.filter(id__in=[
+            item['id'] for item in self.client.get('/products/products/', {'page_size': 2}).data['results']
+        ]).delete()
+        response = self.client.get(previous_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['results'], response.data['next'], response.data['previous']), ([], None, None)
+        )
+
+
+class RequestProfilingTest(TestCase):
+    """请求性能统计：视图耗时和渲染耗时"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        cls.product = Product.objects.create(
+            category=Category.objects.create(name='手机'), name='手机', description='', price=100, stock=10
+        )
+
+    def test_view_and_render_timing(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(
+            CACHE_TTL={}, REQUEST_PROFILING={'DIR': directory.name, 'SERVER_TIMING': True, 'FLUSH_INTERVAL': 0}
+        ), mock.patch.object(profiling, 'worker_id', return_value=1), \
+                mock.patch.object(profiling, 'recorder', profiling.StatsRecorder()):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            response = client.get(f'/products/products/{self.product.id}/')
+            timing = dict(re.findall(r'(\w+);(?:desc="[^"]*";)?dur=([\d.]+)', response['Server-Timing']))
+            self.assertEqual(set(timing), {'db', 'view', 'serializer', 'render', 'total'})
+            self.assertGreater(float(timing['serializer']), 0)
+            self.assertLessEqual(float(timing['serializer']), float(timing['view']))
+            self.assertLessEqual(float(timing['view']) + float(timing['render']), float(timing['total']))
+
+            out = StringIO()
+            call_command('dump_request_stats', '--json', stdout=out)
+            self.assertIn('"view": "ProductViewSet.retrieve"', out.getvalue())
+            self.assertIn('"serializer_ms": ', out.getvalue())
+        # 不修改 DRF 的序列化器
+        self.assertEqual(BaseSerializer.data.fget.__module__, 'rest_framework.serializers')
+
+
+class MetricsTest(TestCase):
+    """Prometheus 指标：只在 uWSGI worker 中记录，worker 重启后计数器不回退"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS={'DIR': self.directory, 'FLUSH_INTERVAL': 0})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def restart_worker(self, number):
+        """模拟 uWSGI 启动编号为 number 的 worker"""
+        patcher = mock.patch.object(snapshots, 'worker_id', return_value=number)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        registry_patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        registry_patcher.start()
+        self.addCleanup(registry_patcher.stop)
+
+    def test_not_recorded_outside_uwsgi(self):
+        metrics.inc('orders_created_total')
+        self.client.get('/metrics')
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_worker_restart_keeps_counters(self):
+        with mock.patch.object(metrics, 'worker_id', return_value=1):
+            self.restart_worker(1)
+            metrics.inc('orders_created_total', value=3)
+            metrics.set_gauge('db_connections_open', 1, {'alias': 'default'})
+            self.restart_worker(2)
+            metrics.inc('orders_created_total')
+            # worker 1 重启，新进程的计数从之前的快照继续累计
+            self.restart_worker(1)
+            metrics.inc('orders_created_total')
+            body = metrics.render()
+
+        self.assertEqual(sorted(os.listdir(self.directory)), ['worker-1.json', 'worker-2.json'])
+        self.assertIn('orders_created_total 5\n', body)
+        # 上一个进程的仪表盘不保留
+        self.assertNotIn('db_connections_open{', body)
+
+    def test_connections_summed_across_threads(self):
+        middleware = MetricsMiddleware(lambda request: None)
+        connection = mock.Mock(alias='default', connection=object())
+        with mock.patch.object(metrics, 'worker_id', return_value=1), \
+                mock.patch.object(connections, 'all', return_value=[connection]):
+            self.restart_worker(1)
+            for thread_id in (1, 2):
+                with mock.patch('threading.get_ident', return_value=thread_id):
+                    middleware.record_connections()
+            self.assertIn('db_connections_open{alias="default"} 2\n', metrics.render())
+            # 一个线程的连接关闭后只减去该线程的连接
+            connection.connection = None
+            with mock.patch('threading.get_ident', return_value=2):
+                middleware.record_connections()
+            self.assertIn('db_connections_open{alias="default"} 1\n', metrics.render())
+
+    def test_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+
+@override_settings(SNOWFLAKE={'MACHINE_ID': 3, 'LEASE_IDS': (16, 17), 'LEASE_TTL': 60})
+class SnowflakeTest(TestCase):
+    """编号生成器：机器号必须配置，非 uWSGI 进程租用进程号"""
+
+    def setUp(self):
+        cache.clear()
+
+    def lease(self):
+        lease = snowflake.ProcessIdLease(snowflake.machine_id())
+        self.addCleanup(lease.release)
+        return lease
+
+    def test_machine_id_required(self):
+        # 项目配置不带默认值，未设置环境变量时 MACHINE_ID 为 None，拒绝生成编号
+        with override_settings(SNOWFLAKE={'MACHINE_ID': None}):
+            with mock.patch.dict(os.environ, clear=True), self.assertRaises(ImproperlyConfigured):
+                snowflake.machine_id()
+            with mock.patch.dict(os.environ, {'SNOWFLAKE_MACHINE_ID': 'host-1'}), \
+                    self.assertRaises(ImproperlyConfigured):
+                snowflake.machine_id()
+        with override_settings(SNOWFLAKE={}), mock.patch.dict(os.environ, {'SNOWFLAKE_MACHINE_ID': '5'}):
+            self.assertEqual(snowflake.machine_id(), 5)
+        with override_settings(SNOWFLAKE={'MACHINE_ID': 32}), self.assertRaises(ImproperlyConfigured):
+            snowflake.machine_id()
+
+    def test_process_id_lease(self):
+        first, second = self.lease(), self.lease()
+        self.assertEqual([first.acquire(), second.acquire()], [16, 17])
+        with self.assertRaises(RuntimeError):
+            self.lease().acquire()
+        # 释放后可以再次租用
+        first.release()
+        self.assertEqual(self.lease().acquire(), 16)
+
+    def test_expired_lease_reacquired(self):
+        with mock.patch.object(snowflake, '_generator', None), mock.patch.object(snowflake, '_lease', None):
+            generator = snowflake.get_generator()
+            self.assertEqual(generator.worker_id, (3 << snowflake.PROCESS_ID_BITS) | 16)
+            self.assertIs(snowflake.get_generator(), generator)
+            # 进程挂起超过有效期后租约可能已被其他进程取得，重新租用
+            snowflake._lease.acquired_at -= 60
+            self.assertEqual(snowflake.get_generator().worker_id, (3 << snowflake.PROCESS_ID_BITS) | 17)
+
+    def test_lost_lease_not_renewed(self):
+        lease = self.lease()
+        lease.acquire()
+        lease.acquired_at -= 40
+        # 租约键被淘汰后由其他进程取得，续期失败，不能继续使用同一个进程号
+        cache.delete('snowflake:lease:3:16')
+        self.assertTrue(cache.add('snowflake:lease:3:16', 'other:1'))
+        self.assertFalse(lease.renew())
+        self.assertEqual(cache.get('snowflake:lease:3:16'), 'other:1')
+        # 键已不存在时同样失败
+        other = self.lease()
+        other.acquire()
+        other.acquired_at -= 40
+        cache.delete('snowflake:lease:3:17')
+        self.assertFalse(other.renew())
+
+    def test_lease_renewed(self):
+        lease = self.lease()
+        lease.acquire()
+        lease.acquired_at -= 40
+        self.assertTrue(lease.renew())
+        self.assertLess(time.monotonic() - lease.acquired_at, 1)
+
+    def test_uwsgi_worker_id(self):
+        with mock.patch.object(snapshots, 'worker_id', return_value=2):
+            generator, lease = snowflake._create_generator()
+        self.assertEqual(generator.worker_id, (3 << snowflake.PROCESS_ID_BITS) | 2)
+        self.assertIsNone(lease)
+        with mock.patch.object(snapshots, 'worker_id', return_value=16), self.assertRaises(ImproperlyConfigured):
+            snowflake._create_generator()
@@ -0,0 +1,11 @@
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics
+
+
+def metrics_view(request):
+    """Prometheus 抓取接口"""
+    allowed_ips = metrics.config()['ALLOWED_IPS']
+    if allowed_ips and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -3,15 +3,18 @@ from .models import Coupon, UserCoupon
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ['name', 'type', 'amount', 'min_amount', 'start_time', 'end_time', 'status']
+    list_display = ['name', 'type', 'amount', 'min_amount', 'start_time', 'end_time', 'total_quantity', 'claimed_count', 'status']
     list_filter = ['type', 'status', 'start_time', 'end_time']
     search_fields = ['name']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['claimed_count', 'created_at', 'updated_at']
     
     fieldsets = (
         ('基本信息', {
             'fields': ('name', 'type', 'amount', 'min_amount')
         }),
+        ('发放设置', {
+            'fields': ('total_quantity', 'per_user_limit', 'claimed_count')
+        }),
         ('时间设置', {
             'fields': ('start_time', 'end_time')
         }),
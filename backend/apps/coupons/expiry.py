@@ -0,0 +1,76 @@
+"""
+优惠券到期处理
+
+按有效期批量更新 Coupon.status 和 UserCoupon.status，由 expire_coupons 命令定期执行：
+
+    未开始 -> 进行中    start_time 已到的优惠券
+    进行中 -> 已结束    end_time 已到的优惠券，先将其未使用的用户优惠券改为已过期
+
+到期的优惠券通过 (status, end_time) 索引查找，用户优惠券按 batch_size 分批 UPDATE，每批单独提交，
+避免长事务和大范围锁。结束前通过有效期检查、结束后才写入的领取记录
+在 RECHECK_WINDOW 秒内的后续执行中补充处理。
+
+列表接口按有效期筛选（见 CouponQuerySet.with_status），不依赖这里更新的状态，两次执行之间不会返回失效的优惠券。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Coupon, UserCoupon
+
+DEFAULTS = {
+    'RECHECK_WINDOW': 3600,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'COUPON_EXPIRY', {})}
+
+
+def _expire_user_coupons(coupon_ids, batch_size):
+    expired = 0
+    while True:
+        user_coupon_ids = list(
+            UserCoupon.objects.filter(coupon_id__in=coupon_ids, status=UserCoupon.UNUSED)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not user_coupon_ids:
+            return expired
+        # 带状态条件，与下单使用优惠券并发时不会覆盖已使用
+        expired += UserCoupon.objects.filter(id__in=user_coupon_ids, status=UserCoupon.UNUSED).update(
+            status=UserCoupon.EXPIRED
+        )
+
+
+def expire(batch_size=1000, now=None):
+    """按有效期更新优惠券状态，返回 (开始的优惠券数, 结束的优惠券数, 过期的用户优惠券数)"""
+    now = now or timezone.now()
+    started = Coupon.objects.filter(
+        status=Coupon.NOT_STARTED, start_time__lte=now, end_time__gt=now
+    ).update(status=Coupon.ONGOING, updated_at=now)
+
+    ended = expired = 0
+    while True:
+        coupon_ids = list(
+            Coupon.objects.filter(status__in=Coupon.OPEN_STATUSES, end_time__lte=now)
+            .order_by('end_time').values_list('id', flat=True)[:batch_size]
+        )
+        if not coupon_ids:
+            break
+        # 先处理用户优惠券再结束优惠券，中途失败时下次执行仍能找到这批优惠券
+        expired += _expire_user_coupons(coupon_ids, batch_size)
+        ended += Coupon.objects.filter(id__in=coupon_ids, status__in=Coupon.OPEN_STATUSES).update(
+            status=Coupon.ENDED, updated_at=now
+        )
+
+    recent = list(
+        Coupon.objects.filter(
+            status=Coupon.ENDED,
+            end_time__gt=now - timedelta(seconds=config()['RECHECK_WINDOW']),
+            end_time__lte=now
+        ).values_list('id', flat=True)
+    )
+    if recent:
+        expired += _expire_user_coupons(recent, batch_size)
+    return started, ended, expired
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from apps.coupons import expiry
+
+
+class Command(BaseCommand):
+    help = '按有效期更新优惠券状态，将结束的优惠券中未使用的用户优惠券标记为已过期'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='持续运行，按间隔定期更新')
+        parser.add_argument('--interval', type=float, default=60, help='更新间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每条 UPDATE 最多更新的记录数量')
+
+    def handle(self, *args, **options):
+        while True:
+            started, ended, expired = expiry.expire(options['batch_size'])
+            if started or ended or expired:
+                self.stdout.write(f'开始 {started} 个优惠券，结束 {ended} 个优惠券，过期 {expired} 张用户优惠券')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('优惠券状态更新完成'))
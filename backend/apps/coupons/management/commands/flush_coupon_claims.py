@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from apps.coupons.quota import get_quota_counter
+
+
+class Command(BaseCommand):
+    help = '按领取记录批量更新优惠券的已领取数量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='持续运行，按间隔定期更新')
+        parser.add_argument('--interval', type=float, default=1, help='更新间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批更新的优惠券数量')
+
+    def handle(self, *args, **options):
+        counter = get_quota_counter()
+        while True:
+            total = 0
+            while True:
+                count = counter.flush(batch_size=options['batch_size'])
+                total += count
+                if count < options['batch_size']:
+                    break
+            if total:
+                self.stdout.write(f'已更新 {total} 张优惠券的领取数量')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('领取数量更新完成'))
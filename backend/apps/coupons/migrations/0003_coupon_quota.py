@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0002_alter_coupon_options_alter_usercoupon_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='usercoupon',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='claimed_count',
+            field=models.IntegerField(default=0, verbose_name='已领取数量'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='per_user_limit',
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(0)], verbose_name='每人限领（0为不限）'),
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='total_quantity',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='发行总量（0为不限量）'),
+        ),
+        migrations.AddIndex(
+            model_name='usercoupon',
+            index=models.Index(fields=['user', 'coupon'], name='user_coupon_user_id_bd108f_idx'),
+        ),
+    ]
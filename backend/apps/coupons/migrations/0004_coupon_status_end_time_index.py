@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0003_coupon_quota'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coupon',
+            index=models.Index(fields=['status', 'end_time'], name='coupons_status_c05068_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def number_claims(apps, schema_editor):
+    """已有的领取记录按领取顺序编号，同一用户领取同一优惠券多次的记录依次为 1, 2, ..."""
+    UserCoupon = apps.get_model('coupons', 'UserCoupon')
+    repeated = (
+        UserCoupon.objects.order_by()
+        .values('user_id', 'coupon_id')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('user_id', 'coupon_id')
+    )
+    for user_id, coupon_id in list(repeated):
+        ids = UserCoupon.objects.filter(user_id=user_id, coupon_id=coupon_id).order_by('id').values_list('id', flat=True)
+        for claim_no, user_coupon_id in enumerate(list(ids)[1:], start=2):
+            UserCoupon.objects.filter(id=user_coupon_id).update(claim_no=claim_no)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('coupons', '0004_coupon_status_end_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercoupon',
+            name='claim_no',
+            field=models.PositiveIntegerField(default=1, verbose_name='领取序号'),
+        ),
+        migrations.RunPython(number_claims, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='usercoupon',
+            unique_together={('user', 'coupon', 'claim_no')},
+        ),
+        # 唯一约束以 (user, coupon) 开头，可以替代原有的索引
+        migrations.RemoveIndex(
+            model_name='usercoupon',
+            name='user_coupon_user_id_bd108f_idx',
+        ),
+    ]
@@ -1,7 +1,25 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db.models import Q
 from django.utils import timezone
+from apps.core.dirty_fields import DirtyFieldsMixin
+
+class CouponQuerySet(models.QuerySet):
+    def with_status(self, status, now=None):
+        """
+        按有效期筛选状态，不依赖可能尚未被 expire_coupons 更新的 status 字段
+
+        status 为 已结束 的优惠券（到期或被手动结束）不会出现在未开始、进行中的结果中
+        """
+        now = now or timezone.now()
+        if status == Coupon.NOT_STARTED:
+            return self.filter(status__in=Coupon.OPEN_STATUSES, start_time__gt=now)
+        if status == Coupon.ONGOING:
+            return self.filter(status__in=Coupon.OPEN_STATUSES, start_time__lte=now, end_time__gt=now)
+        if status == Coupon.ENDED:
+            return self.filter(Q(status=Coupon.ENDED) | Q(end_time__lte=now))
+        return self.none()
 
 class Coupon(models.Model):
     """优惠券"""
@@ -10,10 +28,16 @@ class Coupon(models.Model):
         (2, '折扣券'),
     )
 
+    NOT_STARTED = 0
+    ONGOING = 1
+    ENDED = 2
+    OPEN_STATUSES = (NOT_STARTED, ONGOING)
+
+    # status 由 expire_coupons 按有效期定期更新，读取时以 current_status 为准
     STATUS_CHOICES = (
-        (0, '未开始'),
-        (1, '进行中'),
-        (2, '已结束'),
+        (NOT_STARTED, '未开始'),
+        (ONGOING, '进行中'),
+        (ENDED, '已结束'),
     )
 
     name = models.CharField(max_length=100, verbose_name='优惠券名称')
@@ -33,51 +57,107 @@ class Coupon(models.Model):
     start_time = models.DateTimeField(verbose_name='开始时间')
     end_time = models.DateTimeField(verbose_name='结束时间')
     status = models.IntegerField(choices=STATUS_CHOICES, default=1, verbose_name='状态')
+    total_quantity = models.IntegerField(default=0, validators=[MinValueValidator(0)], verbose_name='发行总量（0为不限量）')
+    per_user_limit = models.IntegerField(default=1, validators=[MinValueValidator(0)], verbose_name='每人限领（0为不限）')
+    claimed_count = models.IntegerField(default=0, verbose_name='已领取数量')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
+    objects = CouponQuerySet.as_manager()
+
     class Meta:
         db_table = 'coupons'
         verbose_name = '优惠券'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'end_time']),  # 扫描到期的优惠券、按有效期筛选
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def current_status(self):
+        """按有效期计算的状态"""
+        now = timezone.now()
+        if self.status == self.ENDED or self.end_time <= now:
+            return self.ENDED
+        if self.start_time > now:
+            return self.NOT_STARTED
+        return self.ONGOING
+
+    def get_current_status_display(self):
+        return dict(self.STATUS_CHOICES)[self.current_status]
+
     def save(self, *args, **kwargs):
         if self.type == 2 and (self.amount <= 0 or self.amount >= 10):
             raise ValueError('折扣券折扣率必须在0-10之间')
         super().save(*args, **kwargs)
 
-class UserCoupon(models.Model):
+class UserCouponQuerySet(models.QuerySet):
+    def with_status(self, status, now=None):
+        """按优惠券有效期筛选状态，优惠券结束后未使用的视为已过期"""
+        now = now or timezone.now()
+        coupon_open = Q(coupon__status__in=Coupon.OPEN_STATUSES, coupon__end_time__gt=now)
+        if status == UserCoupon.UNUSED:
+            return self.filter(coupon_open, status=UserCoupon.UNUSED)
+        if status == UserCoupon.USED:
+            return self.filter(status=UserCoupon.USED)
+        if status == UserCoupon.EXPIRED:
+            return self.filter(Q(status=UserCoupon.EXPIRED) | Q(status=UserCoupon.UNUSED) & ~coupon_open)
+        return self.none()
+
+class UserCoupon(DirtyFieldsMixin, models.Model):
     """用户优惠券"""
+    UNUSED = 0
+    USED = 1
+    EXPIRED = 2
+
+    # 已过期由 expire_coupons 定期更新，读取时以 current_status 为准
     STATUS_CHOICES = (
-        (0, '未使用'),
-        (1, '已使用'),
-        (2, '已过期'),
+        (UNUSED, '未使用'),
+        (USED, '已使用'),
+        (EXPIRED, '已过期'),
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name='用户')
     coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, verbose_name='优惠券')
     status = models.IntegerField(choices=STATUS_CHOICES, default=0, verbose_name='使用状态')
+    claim_no = models.PositiveIntegerField(default=1, verbose_name='领取序号')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='领取时间')
     used_at = models.DateTimeField(null=True, blank=True, verbose_name='使用时间')
 
+    objects = UserCouponQuerySet.as_manager()
+
     class Meta:
         db_table = 'user_coupons'
         verbose_name = '用户优惠券'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
-        unique_together = ['user', 'coupon']  # 确保用户不会重复领取同一张优惠券
+        # 每人限领数量由领取计数器控制（见 quota.py），同一用户的多次领取按领取序号区分，
+        # 计数器与数据库不一致时由唯一约束拒绝重复的序号
+        unique_together = ['user', 'coupon', 'claim_no']
 
     def __str__(self):
         return f'{self.user.username} - {self.coupon.name}'
 
+    @property
+    def current_status(self):
+        """按优惠券有效期计算的状态"""
+        if self.status == self.UNUSED and self.coupon.current_status == Coupon.ENDED:
+            return self.EXPIRED
+        return self.status
+
+    def get_current_status_display(self):
+        return dict(self.STATUS_CHOICES)[self.current_status]
+
     def use(self):
         """使用优惠券"""
-        if self.status != 0:
+        if self.current_status == self.EXPIRED:
+            raise ValueError('优惠券已过期')
+        if self.status != self.UNUSED:
             raise ValueError('优惠券状态不正确')
-        self.status = 1
+        self.status = self.USED
         self.used_at = timezone.now()
         self.save()
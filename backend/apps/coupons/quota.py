@@ -0,0 +1,256 @@
+"""
+优惠券领取配额
+
+领取时先在计数器中原子地预占配额（发行总量 + 每人限领），再同步写入 UserCoupon，
+写入失败时归还预占的配额。计数器负责并发领取时的配额检查，数据库只执行插入，
+不再承担加锁；UserCoupon 以 (用户, 优惠券, 领取序号) 唯一，计数器与数据库不一致时
+由唯一约束拒绝超出限领数量的记录。Coupon.claimed_count 由 flush_coupon_claims 命令批量更新，
+避免热门优惠券的同一行被每次领取更新。
+
+通过 settings.COUPON_QUOTA['BACKEND'] 选择:
+    apps.coupons.quota.RedisQuotaCounter  Redis + Lua 脚本，领取过的优惠券记入待更新集合，
+                                          由 flush_coupon_claims 命令更新领取数量
+    apps.coupons.quota.LocalQuotaCounter  进程内计数器，领取后立即更新领取数量，仅适用于单进程开发环境
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import Coupon, UserCoupon
+
+logger = logging.getLogger(__name__)
+
+# 预占结果
+RESERVED = 'reserved'
+SOLD_OUT = 'sold_out'
+USER_LIMIT = 'user_limit'
+# 计数器与数据库不一致，重新加载后仍未能领取，可稍后重试
+CONFLICT = 'conflict'
+
+# 计数器与数据库不一致时，重新加载计数器后重试的次数
+CONFLICT_RETRIES = 1
+
+
+def update_claimed_counts(coupon_ids):
+    """按 UserCoupon 重新统计优惠券的领取数量"""
+    if not coupon_ids:
+        return
+    claimed = (
+        UserCoupon.objects.filter(coupon=OuterRef('pk'))
+        .order_by()
+        .values('coupon')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Coupon.objects.filter(id__in=coupon_ids).update(claimed_count=Coalesce(Subquery(claimed), 0))
+
+
+def load_claimed_counts(coupon):
+    """从数据库读取 (总领取数, {用户ID: 领取数})"""
+    per_user = dict(
+        UserCoupon.objects.filter(coupon=coupon)
+        .order_by()
+        .values('user_id')
+        .annotate(count=Count('id'))
+        .values_list('user_id', 'count')
+    )
+    return sum(per_user.values()), per_user
+
+
+class BaseQuotaCounter:
+    def __init__(self, **options):
+        self.options = options
+
+    def reserve(self, coupon, user_id):
+        """
+        预占一张优惠券，返回 (结果, 领取序号)
+
+        结果为 RESERVED / SOLD_OUT / USER_LIMIT，领取序号为该用户领取这张优惠券的第几张，未预占时为 None
+        """
+        raise NotImplementedError
+
+    def release(self, coupon, user_id):
+        """归还预占的配额"""
+        raise NotImplementedError
+
+    def claimed(self, coupon):
+        """领取记录写入后调用"""
+
+    def claim(self, coupon, user_id):
+        """预占配额并写入领取记录，返回 RESERVED / SOLD_OUT / USER_LIMIT / CONFLICT"""
+        for _ in range(CONFLICT_RETRIES + 1):
+            result, claim_no = self.reserve(coupon, user_id)
+            if result != RESERVED:
+                return result
+            try:
+                with transaction.atomic():
+                    UserCoupon.objects.create(coupon=coupon, user_id=user_id, claim_no=claim_no)
+            except IntegrityError:
+                # 该序号的领取记录已存在，说明计数器落后于数据库（例如计数器丢失后重新加载时仍有领取在写入），
+                # 丢弃计数器，从数据库重新加载后按实际的领取数量重试
+                logger.warning('优惠券 %s 的领取计数与数据库不一致，重新加载', coupon.id)
+                self.reset(coupon.id)
+                continue
+            except Exception:
+                self.release(coupon, user_id)
+                raise
+            self.claimed(coupon)
+            return RESERVED
+        return CONFLICT
+
+    def flush(self, batch_size=1000):
+        """更新有新领取记录的优惠券的领取数量，返回更新的优惠券数量"""
+        return 0
+
+    def reset(self, coupon_id):
+        """丢弃计数器，下次领取时从数据库重新加载"""
+
+
+class LocalQuotaCounter(BaseQuotaCounter):
+    """进程内计数器"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.lock = threading.Lock()
+        self.claimed_counts = {}
+        self.per_user = {}
+
+    def reserve(self, coupon, user_id):
+        with self.lock:
+            if coupon.id not in self.claimed_counts:
+                self.claimed_counts[coupon.id], per_user = load_claimed_counts(coupon)
+                self.per_user[coupon.id] = defaultdict(int, per_user)
+
+            user_claimed = self.per_user[coupon.id]
+            if coupon.per_user_limit and user_claimed[user_id] >= coupon.per_user_limit:
+                return USER_LIMIT, None
+            if coupon.total_quantity and self.claimed_counts[coupon.id] >= coupon.total_quantity:
+                return SOLD_OUT, None
+            self.claimed_counts[coupon.id] += 1
+            user_claimed[user_id] += 1
+            return RESERVED, user_claimed[user_id]
+
+    def release(self, coupon, user_id):
+        with self.lock:
+            if coupon.id in self.claimed_counts:
+                self.claimed_counts[coupon.id] -= 1
+                self.per_user[coupon.id][user_id] -= 1
+
+    def claimed(self, coupon):
+        update_claimed_counts([coupon.id])
+
+    def reset(self, coupon_id):
+        with self.lock:
+            self.claimed_counts.pop(coupon_id, None)
+            self.per_user.pop(coupon_id, None)
+
+
+class RedisQuotaCounter(BaseQuotaCounter):
+    """
+    Redis 计数器
+
+    coupon:<ID>:claimed  已领取总数
+    coupon:<ID>:users    hash，用户ID -> 领取数
+    coupon:claimed       待更新领取数量的优惠券ID集合
+    """
+    CLAIMED_KEY = 'coupon:claimed'
+
+    # 检查配额、扣减计数并记录待更新的优惠券在同一脚本中完成，保证原子性，返回用户的领取序号
+    RESERVE_SCRIPT = """
+    local total = tonumber(ARGV[1])
+    local per_user = tonumber(ARGV[2])
+    local user_claimed = tonumber(redis.call('HGET', KEYS[2], ARGV[3]) or '0')
+    if per_user > 0 and user_claimed >= per_user then
+        return -2
+    end
+    local claimed = tonumber(redis.call('GET', KEYS[1]) or '0')
+    if total > 0 and claimed >= total then
+        return -1
+    end
+    redis.call('INCR', KEYS[1])
+    redis.call('SADD', KEYS[3], ARGV[4])
+    return redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+    """
+
+    # 计数器已被丢弃（reset）时不再扣减，避免出现负数
+    RELEASE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('DECR', KEYS[1])
+        redis.call('HINCRBY', KEYS[2], ARGV[1], -1)
+    end
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        import redis
+        self.client = redis.Redis.from_url(options.get('REDIS_URL', 'redis://127.0.0.1:6379/3'))
+        self.reserve_script = self.client.register_script(self.RESERVE_SCRIPT)
+        self.release_script = self.client.register_script(self.RELEASE_SCRIPT)
+
+    @staticmethod
+    def _claimed_key(coupon_id):
+        return f'coupon:{coupon_id}:claimed'
+
+    @staticmethod
+    def _users_key(coupon_id):
+        return f'coupon:{coupon_id}:users'
+
+    def _load(self, coupon):
+        """计数器不存在时（首次领取或 Redis 数据丢失）从数据库加载"""
+        if self.client.exists(self._claimed_key(coupon.id)):
+            return
+        claimed, per_user = load_claimed_counts(coupon)
+        pipe = self.client.pipeline()
+        for user_id, count in per_user.items():
+            pipe.hsetnx(self._users_key(coupon.id), user_id, count)
+        pipe.setnx(self._claimed_key(coupon.id), claimed)
+        pipe.execute()
+
+    def reserve(self, coupon, user_id):
+        self._load(coupon)
+        result = self.reserve_script(
+            keys=[self._claimed_key(coupon.id), self._users_key(coupon.id), self.CLAIMED_KEY],
+            args=[coupon.total_quantity, coupon.per_user_limit, user_id, coupon.id]
+        )
+        if result == -2:
+            return USER_LIMIT, None
+        if result == -1:
+            return SOLD_OUT, None
+        return RESERVED, result
+
+    def release(self, coupon, user_id):
+        self.release_script(keys=[self._claimed_key(coupon.id), self._users_key(coupon.id)], args=[user_id])
+
+    def flush(self, batch_size=1000):
+        coupon_ids = [int(coupon_id) for coupon_id in self.client.spop(self.CLAIMED_KEY, batch_size) or []]
+        if not coupon_ids:
+            return 0
+        try:
+            update_claimed_counts(coupon_ids)
+        except Exception:
+            # 更新失败时放回集合，等待下次重试
+            self.client.sadd(self.CLAIMED_KEY, *coupon_ids)
+            raise
+        return len(coupon_ids)
+
+    def reset(self, coupon_id):
+        self.client.delete(self._claimed_key(coupon_id), self._users_key(coupon_id))
+
+
+_counter = None
+
+
+def get_quota_counter():
+    """获取配置的领取计数器"""
+    global _counter
+    if _counter is None:
+        config = dict(getattr(settings, 'COUPON_QUOTA', {}))
+        backend = config.pop('BACKEND', 'apps.coupons.quota.LocalQuotaCounter')
+        _counter = import_string(backend)(**config)
+    return _counter
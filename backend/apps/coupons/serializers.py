@@ -1,22 +1,30 @@
 from rest_framework import serializers
 from .models import Coupon, UserCoupon
+from apps.core.profiling import ProfiledSerializerMixin
 
-class CouponSerializer(serializers.ModelSerializer):
+class CouponSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     type_display = serializers.CharField(source='get_type_display', read_only=True)
-    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    status_display = serializers.CharField(source='get_current_status_display', read_only=True)
 
     class Meta:
         model = Coupon
         fields = [
             'id', 'name', 'type', 'type_display', 'amount', 'min_amount',
             'start_time', 'end_time', 'status', 'status_display',
+            'total_quantity', 'per_user_limit', 'claimed_count',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['claimed_count', 'created_at', 'updated_at']
 
-class UserCouponSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        # 返回按有效期计算的状态
+        data = super().to_representation(instance)
+        data['status'] = instance.current_status
+        return data
+
+class UserCouponSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     coupon = CouponSerializer(read_only=True)
-    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    status_display = serializers.CharField(source='get_current_status_display', read_only=True)
 
     class Meta:
         model = UserCoupon
@@ -26,12 +34,17 @@ class UserCouponSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'used_at']
 
-class CouponCreateSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['status'] = instance.current_status
+        return data
+
+class CouponCreateSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Coupon
         fields = [
             'name', 'type', 'amount', 'min_amount',
-            'start_time', 'end_time'
+            'start_time', 'end_time', 'total_quantity', 'per_user_limit'
         ]
 
     def validate(self, attrs):
@@ -1,3 +1,137 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from . import quota
+from .models import Coupon, UserCoupon
+
+
+class CouponExpiryTest(TestCase):
+    """优惠券按有效期的状态：列表筛选和定期批量更新"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        now = timezone.now()
+        cls.active = Coupon.objects.create(
+            name='进行中', type=1, amount=10, min_amount=100,
+            start_time=now - timedelta(days=1), end_time=now + timedelta(days=1)
+        )
+        # 已到期但状态尚未更新
+        cls.ended = Coupon.objects.create(
+            name='已到期', type=1, amount=10, min_amount=100,
+            start_time=now - timedelta(days=2), end_time=now - timedelta(minutes=10)
+        )
+        # 已到开始时间但状态仍为未开始
+        cls.upcoming = Coupon.objects.create(
+            name='刚开始', type=1, amount=10, min_amount=100, status=Coupon.NOT_STARTED,
+            start_time=now - timedelta(minutes=1), end_time=now + timedelta(days=1)
+        )
+        cls.usable = UserCoupon.objects.create(user=cls.user, coupon=cls.active)
+        cls.stale = UserCoupon.objects.create(user=cls.user, coupon=cls.ended)
+        cls.used = UserCoupon.objects.create(user=cls.user, coupon=cls.ended, status=UserCoupon.USED, claim_no=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def list_ids(self, url, status):
+        return {item['id'] for item in self.client.get(url, {'status': status}).data['results']}
+
+    def test_list_by_time_window(self):
+        self.assertEqual(self.list_ids('/coupons/user-coupons/', 0), {self.usable.id})
+        self.assertEqual(self.list_ids('/coupons/user-coupons/', 2), {self.stale.id})
+        self.assertEqual(self.list_ids('/coupons/coupons/', 1), {self.active.id, self.upcoming.id})
+        self.assertEqual(self.list_ids('/coupons/coupons/', 2), {self.ended.id})
+
+        response = self.client.get(f'/coupons/user-coupons/{self.stale.id}/')
+        self.assertEqual((response.data['status'], response.data['status_display']), (2, '已过期'))
+        self.assertEqual(self.client.post(f'/coupons/user-coupons/{self.stale.id}/use/').data['detail'], '优惠券已过期')
+
+    def test_expire_coupons(self):
+        call_command('expire_coupons', stdout=StringIO())
+        self.assertEqual(
+            dict(Coupon.objects.values_list('id', 'status')),
+            {self.active.id: Coupon.ONGOING, self.ended.id: Coupon.ENDED, self.upcoming.id: Coupon.ONGOING}
+        )
+        self.assertEqual(
+            dict(UserCoupon.objects.values_list('id', 'status')),
+            {self.usable.id: UserCoupon.UNUSED, self.stale.id: UserCoupon.EXPIRED, self.used.id: UserCoupon.USED}
+        )
+
+        # 优惠券结束后才落库的领取记录在后续执行中补充处理
+        late = UserCoupon.objects.create(user=self.user, coupon=self.ended, claim_no=3)
+        call_command('expire_coupons', stdout=StringIO())
+        late.refresh_from_db()
+        self.assertEqual(late.status, UserCoupon.EXPIRED)
+
+
+@override_settings(COUPON_QUOTA={'BACKEND': 'apps.coupons.quota.LocalQuotaCounter'})
+class CouponClaimTest(TestCase):
+    """领取优惠券：预占配额后同步写入领取记录"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.coupon = Coupon.objects.create(
+            name='限量', type=1, amount=10, min_amount=100, total_quantity=3, per_user_limit=2,
+            start_time=now - timedelta(days=1), end_time=now + timedelta(days=1)
+        )
+        cls.users = [User.objects.create_user(f'buyer{i}', f'buyer{i}@example.com', 'test123456') for i in range(3)]
+
+    def setUp(self):
+        patcher = mock.patch.object(quota, '_counter', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def claim(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(f'/coupons/coupons/{self.coupon.id}/claim/').data['detail']
+
+    def claim_numbers(self, user):
+        return list(UserCoupon.objects.filter(user=user).order_by('claim_no').values_list('claim_no', flat=True))
+
+    def test_claim_limits(self):
+        first, second, third = self.users
+        self.assertEqual([self.claim(first), self.claim(first), self.claim(first)], ['领取成功', '领取成功', '您已领取过该消费券'])
+        self.assertEqual(self.claim_numbers(first), [1, 2])
+        self.assertEqual(self.claim(second), '领取成功')
+        self.assertEqual(self.claim(third), '消费券已领完')
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.claimed_count, 3)
+
+    def test_failed_write_releases_quota(self):
+        user = self.users[0]
+        with mock.patch.object(UserCoupon.objects, 'create', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                quota.get_quota_counter().claim(self.coupon, user.id)
+        self.assertEqual([self.claim(user), self.claim(user)], ['领取成功', '领取成功'])
+        self.assertEqual(self.claim_numbers(user), [1, 2])
+
+    def test_stale_counter_reloaded(self):
+        user = self.users[0]
+        self.assertEqual(self.claim(self.users[1]), '领取成功')
+        # 计数器加载后数据库中出现了它不知道的领取记录，重新加载后按实际数量领取第 2 张
+        UserCoupon.objects.create(user=user, coupon=self.coupon, claim_no=1)
+        with self.assertLogs('apps.coupons.quota', 'WARNING'):
+            self.assertEqual(self.claim(user), '领取成功')
+        self.assertEqual(self.claim_numbers(user), [1, 2])
+        self.assertEqual(self.claim(user), '您已领取过该消费券')
+
+    def test_conflict_after_retry(self):
+        counter = quota.get_quota_counter()
+        # 重新加载后序号仍然冲突（例如同一用户的其他领取正在写入）时返回可重试的结果
+        with mock.patch.object(counter, 'reserve', return_value=(quota.RESERVED, 1)):
+            UserCoupon.objects.create(user=self.users[0], coupon=self.coupon, claim_no=1)
+            with self.assertLogs('apps.coupons.quota', 'WARNING'):
+                client = APIClient()
+                client.force_authenticate(self.users[0])
+                response = client.post(f'/coupons/coupons/{self.coupon.id}/claim/')
+        self.assertEqual(response.status_code, 409)
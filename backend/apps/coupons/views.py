@@ -7,6 +7,9 @@ from django.utils import timezone
 from django.db import transaction
 from .models import Coupon, UserCoupon
 from .serializers import CouponSerializer, UserCouponSerializer, CouponCreateSerializer
+from . import quota
+from .quota import get_quota_counter
+from apps.core import metrics
 
 # Create your views here.
 
@@ -31,7 +34,8 @@ class CouponViewSet(viewsets.ModelViewSet):
         queryset = Coupon.objects.all()
         status = self.request.query_params.get('status', None)
         if status is not None:
-            queryset = queryset.filter(status=status)
+            # 按有效期筛选，不依赖定期更新的 status 字段
+            queryset = queryset.with_status(int(status) if status.isdigit() else None)
         return queryset
 
     @action(detail=True, methods=['post'])
@@ -41,27 +45,36 @@ class CouponViewSet(viewsets.ModelViewSet):
         now = timezone.now()
 
         # 检查消费券是否可用
-        if coupon.status != 1:
+        if coupon.status == Coupon.ENDED:
             return Response(
                 {'detail': '消费券不可用'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if now < coupon.start_time or now > coupon.end_time:
+        if now < coupon.start_time or now >= coupon.end_time:
             return Response(
                 {'detail': '消费券不在有效期内'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 检查用户是否已领取
-        if UserCoupon.objects.filter(user=request.user, coupon=coupon).exists():
+        # 原子地预占配额（发行总量和每人限领）后写入领取记录
+        result = get_quota_counter().claim(coupon, request.user.id)
+        metrics.inc('coupons_claimed_total', {'result': result})
+        if result == quota.USER_LIMIT:
             return Response(
                 {'detail': '您已领取过该消费券'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        # 创建用户消费券
-        UserCoupon.objects.create(user=request.user, coupon=coupon)
+        if result == quota.SOLD_OUT:
+            return Response(
+                {'detail': '消费券已领完'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if result == quota.CONFLICT:
+            return Response(
+                {'detail': '领取人数较多，请稍后重试'},
+                status=status.HTTP_409_CONFLICT
+            )
         return Response({'detail': '领取成功'})
 
 class UserCouponViewSet(viewsets.ReadOnlyModelViewSet):
@@ -73,7 +86,8 @@ class UserCouponViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = UserCoupon.objects.filter(user=self.request.user)
         status = self.request.query_params.get('status', None)
         if status is not None:
-            queryset = queryset.filter(status=status)
+            # 按优惠券有效期筛选，未使用列表不会返回已结束的优惠券
+            queryset = queryset.with_status(int(status) if status.isdigit() else None)
         return queryset.select_related('coupon')
 
     @action(detail=True, methods=['post'])
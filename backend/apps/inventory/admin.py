@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import StockReservation
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    """库存预占管理（只读，状态由下单、支付、取消和过期扫描维护）"""
+    list_display = ('order', 'product', 'quantity', 'status', 'expires_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('order__order_no', 'product__name')
+    raw_id_fields = ('order', 'product')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
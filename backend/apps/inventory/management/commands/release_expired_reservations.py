@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.inventory import reservations
+
+
+class Command(BaseCommand):
+    help = '释放超时未支付的库存预占（可作为常驻进程运行，也可由定时任务调用 --once）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='释放当前所有过期预占后退出')
+        parser.add_argument('--interval', type=float, default=30, help='扫描间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=500, help='每个事务最多释放的预占数量')
+        parser.add_argument('--reconcile', action='store_true', help='扫描前按预占记录校正商品的预占库存计数')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            count = reservations.reconcile()
+            self.stdout.write(f'已校正 {count} 个商品的预占库存')
+
+        while True:
+            released = 0
+            while True:
+                count = reservations.release_expired(options['batch_size'])
+                released += count
+                if count < options['batch_size']:
+                    break
+            if released:
+                self.stdout.write(f'已释放 {released} 个过期的库存预占')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
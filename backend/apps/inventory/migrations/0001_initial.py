@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0006_order_keyset_index'),
+        ('products', '0008_product_reserved_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='数量')),
+                ('status', models.CharField(choices=[('held', '预占中'), ('committed', '已扣减'), ('released', '已释放')], default='held', max_length=20, verbose_name='状态')),
+                ('expires_at', models.DateTimeField(verbose_name='过期时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='orders.order', verbose_name='订单')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='products.product', verbose_name='商品')),
+            ],
+            options={
+                'verbose_name': '库存预占',
+                'verbose_name_plural': '库存预占',
+                'db_table': 'stock_reservations',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='stock_reser_status_da6fe9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:05
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+
+def reserve_pending_orders(apps, schema_editor):
+    """
+    此前下单时直接扣减库存、增加销量，待付款订单的库存转为预占：
+    stock、reserved_stock 各加回数量，销量减去数量，之后按新流程在支付时扣减
+    """
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    StockReservation = apps.get_model('inventory', 'StockReservation')
+
+    ttl = getattr(settings, 'INVENTORY', {}).get('RESERVATION_TTL', 30 * 60)
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    pending_orders = Order.objects.filter(status=0).values_list('id', flat=True)
+    quantities = defaultdict(int)
+    reservations = []
+    for order_id, product_id, quantity in OrderItem.objects.filter(
+        order_id__in=pending_orders
+    ).values_list('order_id', 'product_id', 'quantity').iterator():
+        quantities[product_id] += quantity
+        reservations.append(StockReservation(
+            order_id=order_id, product_id=product_id, quantity=quantity, expires_at=expires_at
+        ))
+    StockReservation.objects.bulk_create(reservations, batch_size=1000)
+    for product_id, quantity in quantities.items():
+        Product.objects.filter(id=product_id).update(
+            stock=F('stock') + quantity,
+            reserved_stock=F('reserved_stock') + quantity,
+            sales=F('sales') - quantity
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(reserve_pending_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import models
+from apps.orders.models import Order
+from apps.products.models import Product
+
+
+class StockReservation(models.Model):
+    """
+    库存预占
+
+    下单时预占库存（Product.reserved_stock 增加），支付成功后转为实际扣减（stock、reserved_stock 同时减少），
+    取消订单或超时未支付时释放（reserved_stock 减少）
+    """
+    STATUS_CHOICES = (
+        ('held', '预占中'),
+        ('committed', '已扣减'),
+        ('released', '已释放'),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations', verbose_name='订单')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='reservations', verbose_name='商品')
+    quantity = models.IntegerField(verbose_name='数量')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held', verbose_name='状态')
+    expires_at = models.DateTimeField(verbose_name='过期时间')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'stock_reservations'
+        verbose_name = '库存预占'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),  # 扫描过期的预占
+        ]
+
+    def __str__(self):
+        return f'{self.order.order_no} - {self.product.name} x {self.quantity}'
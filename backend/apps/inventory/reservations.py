@@ -0,0 +1,201 @@
+"""
+库存预占
+
+商品的可售库存为 stock - reserved_stock。计数的每次变更都是一条带条件的 UPDATE，由数据库保证原子性：
+预占时要求 stock - reserved_stock >= 数量，并发下单不会超卖；一个订单涉及的多个商品在同一条 UPDATE 中处理，
+查询次数与商品数量无关。
+
+    下单          reserve()          reserved_stock += n，创建预占记录，RESERVATION_TTL 秒后过期
+    发起支付      renew()            延长预占，已过期释放的重新预占
+    支付成功      commit_orders()    stock -= n，reserved_stock -= n，sales += n
+    取消、过期    release_orders()   reserved_stock -= n
+
+过期的预占由 release_expired_reservations 命令定期释放。
+reconcile() 按预占记录重新计算 reserved_stock，用于修复手工改库等原因造成的计数偏差。
+
+这里的计数变更不使商品缓存失效，商品接口命中缓存时会读取库存和销量的当前值（见 ProductViewSet.cache_volatile_fields）。
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.products.models import Product
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'RESERVATION_TTL': 30 * 60,
+}
+
+HELD = 'held'
+COMMITTED = 'committed'
+RELEASED = 'released'
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'INVENTORY', {})}
+
+
+class InsufficientStock(ValueError):
+    """可售库存不足"""
+
+
+def _available(quantity):
+    return Q(stock__gte=F('reserved_stock') + quantity)
+
+
+def _adjust(quantities, condition=None, **fields):
+    """
+    单条 UPDATE 按商品调整计数，返回更新的行数
+
+    quantities 为 {商品ID: 数量}；fields 为 {字段: 方向}，例如 reserved_stock=1 表示 reserved_stock += 数量；
+    condition(数量) 返回每个商品需要满足的条件，不满足的商品不会被更新
+    """
+    match = Q()
+    for product_id, quantity in quantities.items():
+        product_match = Q(id=product_id)
+        if condition is not None:
+            product_match &= condition(quantity)
+        match |= product_match
+    return Product.objects.filter(match).update(**{
+        field: Case(
+            *[When(id=product_id, then=F(field) + sign * quantity) for product_id, quantity in quantities.items()],
+            default=F(field)
+        )
+        for field, sign in fields.items()
+    })
+
+
+def _quantities(reservations):
+    quantities = defaultdict(int)
+    for reservation in reservations:
+        quantities[reservation.product_id] += reservation.quantity
+    return quantities
+
+
+def reserve(order, quantities):
+    """
+    为订单预占库存，须在事务中调用
+
+    任一商品可售库存不足时抛出 InsufficientStock，由调用方回滚事务，不会留下部分预占
+    """
+    updated = _adjust(quantities, _available, reserved_stock=1)
+    if updated != len(quantities):
+        raise InsufficientStock('商品库存不足')
+    expires_at = timezone.now() + timedelta(seconds=config()['RESERVATION_TTL'])
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+
+
+def renew(order):
+    """
+    发起支付前延长订单的预占
+
+    预占已过期释放的，可售库存足够时重新预占，否则抛出 InsufficientStock
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        reservations = list(
+            StockReservation.objects.select_for_update().filter(order=order, status__in=[HELD, RELEASED])
+        )
+        released = _quantities(reservation for reservation in reservations if reservation.status == RELEASED)
+        if released:
+            if _adjust(released, _available, reserved_stock=1) != len(released):
+                raise InsufficientStock('商品库存不足')
+        StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(
+            status=HELD,
+            expires_at=now + timedelta(seconds=config()['RESERVATION_TTL']),
+            updated_at=now
+        )
+
+
+def commit_orders(order_ids):
+    """
+    支付成功后将一批订单的预占转为实际扣减，须在事务中调用
+
+    预占在支付完成前已过期释放时仍然扣减（货款已收），扣减后可售库存为负的商品记录错误日志，需人工处理
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update().filter(order_id__in=order_ids, status__in=[HELD, RELEASED])
+    )
+    if not reservations:
+        return
+    held = _quantities(reservation for reservation in reservations if reservation.status == HELD)
+    released = _quantities(reservation for reservation in reservations if reservation.status == RELEASED)
+    if held:
+        _adjust(held, stock=-1, reserved_stock=-1, sales=1)
+    if released:
+        _adjust(released, stock=-1, sales=1)
+        for product_id in Product.objects.filter(
+            id__in=released, stock__lt=F('reserved_stock')
+        ).values_list('id', flat=True):
+            logger.error('商品 %s 的库存预占已过期，支付完成后超卖，订单ID: %s', product_id, order_ids)
+    StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(
+        status=COMMITTED,
+        updated_at=timezone.now()
+    )
+
+
+def _release(queryset):
+    with transaction.atomic():
+        reservations = list(queryset.select_for_update())
+        if not reservations:
+            return 0
+        _adjust(_quantities(reservations), reserved_stock=-1)
+        StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(
+            status=RELEASED,
+            updated_at=timezone.now()
+        )
+    return len(reservations)
+
+
+def release_orders(order_ids):
+    """取消一批订单时释放预占，返回释放的预占数量"""
+    return _release(StockReservation.objects.filter(order_id__in=order_ids, status=HELD))
+
+
+def release_expired(batch_size=500):
+    """
+    释放一批已过期的预占，返回释放的数量
+
+    多个进程同时执行时跳过已被其他进程锁定的记录
+    """
+    with transaction.atomic():
+        reservation_ids = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(status=HELD, expires_at__lte=timezone.now())
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        return _release(StockReservation.objects.filter(id__in=reservation_ids, status=HELD))
+
+
+def reconcile():
+    """按预占中的记录重新计算 reserved_stock，返回修正的商品数量"""
+    expected = Coalesce(
+        Subquery(
+            StockReservation.objects.filter(product=OuterRef('pk'), status=HELD)
+            .values('product')
+            .annotate(total=Sum('quantity'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+    product_ids = list(
+        Product.objects.annotate(expected=expected)
+        .exclude(reserved_stock=F('expected'))
+        .values_list('id', flat=True)
+    )
+    if product_ids:
+        Product.objects.filter(id__in=product_ids).update(reserved_stock=expected)
+    return len(product_ids)
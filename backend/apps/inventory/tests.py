@@ -0,0 +1,95 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.cart.storage import get_cart_storage
+from apps.orders.models import Order
+from apps.orders.payments import sign
+from apps.products.models import Category, Product
+from apps.users.models import User, UserAddress
+from .models import StockReservation
+
+
+class StockReservationTest(TestCase):
+    """库存预占：下单预占、支付扣减、取消和过期释放"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        cls.address = UserAddress.objects.create(
+            user=cls.user, receiver='张三', phone='13800000000',
+            province='北京市', city='北京市', district='朝阳区', address='某街道 1 号'
+        )
+        category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(category=category, name='手机', description='', price=100, stock=5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_order(self, quantity):
+        get_cart_storage().add_item(self.user, self.product.id, quantity)
+        return self.client.post('/orders/orders/', {
+            'address_id': self.address.id,
+            'items': [{'id': self.product.id, 'quantity': quantity}],
+        }, format='json')
+
+    def assertStock(self, stock, reserved, sales=0):
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.stock, self.product.reserved_stock, self.product.sales), (stock, reserved, sales)
+        )
+
+    def test_reserve_and_commit_on_payment(self):
+        response = self.create_order(3)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertStock(5, 3)
+
+        order_id = response.data['id']
+        payment_no = self.client.post(f'/orders/orders/{order_id}/pay/', format='json').data['payment_no']
+        APIClient().post('/orders/orders/payment_callback/', {
+            'payment_no': payment_no, 'status': 'success', 'signature': sign(payment_no, 'success'),
+        }, format='json')
+        self.assertStock(2, 0, sales=3)
+        self.assertEqual(StockReservation.objects.get(order_id=order_id).status, 'committed')
+
+    def test_reject_when_reserved_by_others(self):
+        get_cart_storage().add_item(self.user, self.product.id, 3)
+        # 加入购物车后被其他订单预占，可售库存只剩 2 件
+        Product.objects.update(reserved_stock=3)
+        response = self.client.post('/orders/orders/', {
+            'address_id': self.address.id,
+            'items': [{'id': self.product.id, 'quantity': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertStock(5, 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_on_cancel(self):
+        order_id = self.create_order(2).data['id']
+        self.assertEqual(self.client.post(f'/orders/orders/{order_id}/cancel/').status_code, 200)
+        self.assertStock(5, 0)
+        self.assertEqual(self.client.post(f'/orders/orders/{order_id}/cancel/').status_code, 400)
+        self.assertStock(5, 0)
+
+    def test_release_expired_and_renew_on_pay(self):
+        order_id = self.create_order(4).data['id']
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('release_expired_reservations', '--once', stdout=StringIO())
+        self.assertStock(5, 0)
+        self.assertEqual(Order.objects.get(id=order_id).status, 0)
+
+        # 过期后发起支付时重新预占
+        self.assertEqual(self.client.post(f'/orders/orders/{order_id}/pay/', format='json').status_code, 202)
+        self.assertStock(5, 4)
+        self.assertEqual(StockReservation.objects.get(order_id=order_id).status, 'held')
+
+    def test_reconcile(self):
+        self.create_order(2)
+        Product.objects.update(reserved_stock=0)
+        call_command('release_expired_reservations', '--once', '--reconcile', stdout=StringIO())
+        self.assertStock(5, 2)
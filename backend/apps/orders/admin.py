@@ -1,7 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.urls import path, reverse
-from .models import Order, OrderItem
+from .models import Order, OrderItem, Payment
+from . import transitions
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -11,10 +12,12 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('order_no', 'user', 'total_amount', 'get_status_display', 'payment_method', 'created_at', 'get_actions')
+    list_display = ('order_no', 'user', 'total_amount', 'get_status_display', 'payment_method', 'created_at', 'order_actions')
     list_filter = ('status', 'payment_method', 'created_at')
     search_fields = ('order_no', 'user__username', 'shipping_name', 'shipping_phone')
-    readonly_fields = ('order_no', 'created_at', 'updated_at', 'get_status_display')
+    # 状态只能通过操作按钮和批量操作按状态机变更
+    readonly_fields = ('order_no', 'status', 'created_at', 'updated_at', 'get_status_display')
+    actions = ['ship_orders', 'confirm_receive_orders', 'cancel_orders']
     inlines = [OrderItemInline]
     ordering = ('-created_at',)
     
@@ -28,27 +31,43 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
-    def get_actions(self, obj):
-        # 如果是请求对象，返回空字符串
-        if hasattr(obj, 'method'):
-            return ''
-            
-        # 如果是订单对象
-        if not obj:
-            return ''
-            
-        if obj.status == 0:  # 待付款
+    def order_actions(self, obj):
+        if obj.status == Order.PENDING_PAYMENT:
             return format_html(
                 '<a class="button" style="background-color: #dc3545; color: white; padding: 5px 10px; border-radius: 3px; text-decoration: none;" href="{}">取消订单</a>',
                 reverse('admin:admin-cancel-order', args=[obj.id])
             )
-        elif obj.status == 1:  # 待发货
+        elif obj.status == Order.PENDING_SHIPMENT:
             return format_html(
                 '<a class="button" style="background-color: #28a745; color: white; padding: 5px 10px; border-radius: 3px; text-decoration: none;" href="{}">发货</a>',
                 reverse('admin:admin-ship-order', args=[obj.id])
             )
         return '-'
-    get_actions.short_description = '操作'
+    order_actions.short_description = '操作'
+
+    def _bulk_transition(self, request, queryset, name):
+        results = transitions.bulk_transition(name, queryset.values_list('id', flat=True))
+        succeeded = sum(error is None for error in results.values())
+        failed = len(results) - succeeded
+        label = transitions.TRANSITIONS[name].label
+        if failed:
+            self.message_user(
+                request, f'{label}成功 {succeeded} 个订单，{failed} 个订单状态不允许{label}', messages.WARNING
+            )
+        else:
+            self.message_user(request, f'{label}成功 {succeeded} 个订单', messages.SUCCESS)
+
+    def ship_orders(self, request, queryset):
+        self._bulk_transition(request, queryset, 'ship')
+    ship_orders.short_description = '发货选中的订单'
+
+    def confirm_receive_orders(self, request, queryset):
+        self._bulk_transition(request, queryset, 'confirm_receive')
+    confirm_receive_orders.short_description = '确认收货选中的订单'
+
+    def cancel_orders(self, request, queryset):
+        self._bulk_transition(request, queryset, 'cancel')
+    cancel_orders.short_description = '取消选中的订单'
 
     def get_urls(self):
         from django.urls import path
@@ -66,4 +85,12 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('order__order_no', 'product_name')
     readonly_fields = ('product_name', 'product_image', 'price', 'total_price', 'created_at')
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ('payment_no', 'order', 'payment_method', 'amount', 'status', 'paid_at', 'created_at')
+    list_filter = ('status', 'payment_method', 'created_at')
+    search_fields = ('payment_no', 'order__order_no')
+    readonly_fields = ('payment_no', 'order', 'amount', 'paid_at', 'created_at', 'updated_at')
+    ordering = ('-created_at',)
@@ -0,0 +1,47 @@
+"""
+超时未支付订单的自动取消
+
+下单超过 ORDERS['UNPAID_TIMEOUT'] 秒仍未支付，且没有未过期的库存预占的订单会被取消。
+发起支付时会延长预占（见 reservations.renew），支付中的订单不会在网关回调前被取消。
+取消通过订单状态机的 cancel 转换完成：释放库存预占、退回优惠券，均为按批的集合更新。
+
+扫描使用 (status, created_at) 索引，按下单时间顺序每批处理 batch_size 个订单，
+由 cancel_unpaid_orders 命令定期执行。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.inventory.models import StockReservation
+from apps.inventory.reservations import HELD
+from .models import Order
+from .transitions import bulk_transition
+
+DEFAULTS = {
+    'UNPAID_TIMEOUT': 30 * 60,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'ORDERS', {})}
+
+
+def expired_unpaid_orders(now=None):
+    """超时未支付、可以取消的订单"""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=config()['UNPAID_TIMEOUT'])
+    held = StockReservation.objects.filter(order=OuterRef('pk'), status=HELD, expires_at__gt=now)
+    return Order.objects.filter(
+        status=Order.PENDING_PAYMENT, created_at__lte=cutoff
+    ).exclude(Exists(held)).order_by('created_at')
+
+
+def cancel_unpaid(batch_size=500):
+    """取消一批超时未支付的订单，返回 (扫描的订单数, 取消的订单数)"""
+    order_ids = list(expired_unpaid_orders().values_list('id', flat=True)[:batch_size])
+    if not order_ids:
+        return 0, 0
+    results = bulk_transition('cancel', order_ids)
+    return len(order_ids), sum(error is None for error in results.values())
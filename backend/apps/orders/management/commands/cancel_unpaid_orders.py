@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.orders import expiry
+
+
+class Command(BaseCommand):
+    help = '取消超时未支付的订单并释放库存预占、退回优惠券（可作为常驻进程运行，也可由定时任务调用 --once）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='取消当前所有超时订单后退出')
+        parser.add_argument('--interval', type=float, default=60, help='扫描间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=500, help='每个事务最多取消的订单数量')
+
+    def handle(self, *args, **options):
+        while True:
+            cancelled = 0
+            while True:
+                scanned, count = expiry.cancel_unpaid(options['batch_size'])
+                cancelled += count
+                # 扫描到的订单可能刚被支付，取消数少于扫描数时仍继续下一批
+                if scanned < options['batch_size']:
+                    break
+            if cancelled:
+                self.stdout.write(f'已取消 {cancelled} 个超时未支付的订单')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
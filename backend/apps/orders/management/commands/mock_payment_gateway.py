@@ -0,0 +1,80 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib import request as urllib_request
+from urllib.error import URLError
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.orders.models import Payment
+from apps.orders.payments import gateway_settings, sign
+
+
+class Command(BaseCommand):
+    help = '本地模拟支付网关：扫描待支付记录，延迟后通过回调接口异步完成支付'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只处理一轮后退出')
+        parser.add_argument('--interval', type=float, default=0.5, help='扫描间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=100, help='每轮最多处理的支付数量')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='模拟支付失败的概率（0-1）')
+        parser.add_argument('--workers', type=int, default=4, help='并发回调线程数')
+
+    def handle(self, *args, **options):
+        config = gateway_settings()
+        self.callback_url = config['CALLBACK_URL']
+        self.delay = config.get('DELAY', 1)
+        self.failure_rate = options['failure_rate']
+        # 已回调但尚未确认的支付，避免同一笔支付被重复回调
+        self.in_flight = {}
+
+        self.stdout.write(f'模拟支付网关已启动，回调地址: {self.callback_url}')
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                payment_nos = self.poll(options['batch_size'])
+                for payment_no in payment_nos:
+                    executor.submit(self.notify, payment_no)
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+    def poll(self, batch_size):
+        """获取已到达模拟支付耗时的待支付记录"""
+        now = time.monotonic()
+        # 超过 30 秒仍未确认的回调允许重试
+        self.in_flight = {no: sent for no, sent in self.in_flight.items() if now - sent < 30}
+
+        ready_before = timezone.now() - timedelta(seconds=self.delay)
+        payment_nos = [
+            payment_no for payment_no in Payment.objects.filter(
+                status='pending',
+                created_at__lte=ready_before
+            ).order_by('created_at').values_list('payment_no', flat=True)[:batch_size]
+            if payment_no not in self.in_flight
+        ]
+        for payment_no in payment_nos:
+            self.in_flight[payment_no] = now
+        return payment_nos
+
+    def notify(self, payment_no):
+        """调用回调接口"""
+        payment_status = 'failed' if random.random() < self.failure_rate else 'success'
+        body = json.dumps({
+            'payment_no': payment_no,
+            'status': payment_status,
+            'signature': sign(payment_no, payment_status),
+        }).encode('utf-8')
+        req = urllib_request.Request(
+            self.callback_url,
+            data=body,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib_request.urlopen(req, timeout=10) as response:
+                self.stdout.write(f'回调完成: {payment_no} -> {payment_status} ({response.status})')
+        except URLError as e:
+            self.stderr.write(f'回调失败: {payment_no} - {e}')
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_coupon_order_discount_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_no', models.CharField(max_length=50, unique=True, verbose_name='支付流水号')),
+                ('payment_method', models.CharField(choices=[('alipay', '支付宝'), ('wechat', '微信')], default='alipay', max_length=20, verbose_name='支付方式')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='支付金额')),
+                ('status', models.CharField(choices=[('pending', '待支付'), ('success', '支付成功'), ('failed', '支付失败')], default='pending', max_length=20, verbose_name='支付状态')),
+                ('paid_at', models.DateTimeField(blank=True, null=True, verbose_name='支付时间')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='orders.order', verbose_name='订单')),
+            ],
+            options={
+                'verbose_name': '支付记录',
+                'verbose_name_plural': '支付记录',
+                'db_table': 'payments',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='payments_status_426d4f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_payment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='orders_orde_user_id_779e40_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='orders_orde_status_25e057_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_status_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', '待支付'), ('success', '支付成功'), ('failed', '支付失败'), ('refund_pending', '待退款')], default='pending', max_length=20, verbose_name='支付状态'),
+        ),
+    ]
@@ -1,16 +1,24 @@
 from django.db import models
 from django.conf import settings
+from apps.core.dirty_fields import DirtyFieldsMixin
 from apps.products.models import Product
 from apps.users.models import UserAddress
 from apps.coupons.models import Coupon, UserCoupon
 
-class Order(models.Model):
+class Order(DirtyFieldsMixin, models.Model):
+    PENDING_PAYMENT = 0
+    PENDING_SHIPMENT = 1
+    PENDING_RECEIPT = 2
+    COMPLETED = 3
+    CANCELLED = 4
+
+    # 状态只能通过 apps.orders.transitions 中的状态转换修改
     STATUS_CHOICES = (
-        (0, '待付款'),
-        (1, '待发货'),
-        (2, '待收货'),
-        (3, '已完成'),
-        (4, '已取消'),
+        (PENDING_PAYMENT, '待付款'),
+        (PENDING_SHIPMENT, '待发货'),
+        (PENDING_RECEIPT, '待收货'),
+        (COMPLETED, '已完成'),
+        (CANCELLED, '已取消'),
     )
 
     PAYMENT_METHOD_CHOICES = (
@@ -44,6 +52,10 @@ class Order(models.Model):
         verbose_name = '订单'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),  # 用户订单列表键集分页
+            models.Index(fields=['status', 'created_at']),  # 扫描超时未支付的订单
+        ]
 
     def __str__(self):
         return f'{self.order_no} - {self.get_status_display()}'
@@ -68,4 +80,34 @@ class OrderItem(models.Model):
 
     def save(self, *args, **kwargs):
         self.total_price = self.price * self.quantity
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs) 
+
+class Payment(models.Model):
+    """支付记录"""
+    STATUS_CHOICES = (
+        ('pending', '待支付'),
+        ('success', '支付成功'),
+        ('failed', '支付失败'),
+        ('refund_pending', '待退款'),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payments', verbose_name='订单')
+    payment_no = models.CharField(max_length=50, unique=True, verbose_name='支付流水号')
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES, default='alipay', verbose_name='支付方式')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='支付金额')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='支付状态')
+    paid_at = models.DateTimeField(null=True, blank=True, verbose_name='支付时间')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'payments'
+        verbose_name = '支付记录'
+        verbose_name_plural = verbose_name
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.payment_no} - {self.get_status_display()}'
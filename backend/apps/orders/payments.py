@@ -0,0 +1,98 @@
+"""
+订单支付
+
+支付分为两步：
+1. 发起支付：创建待支付记录后立即返回，不占用请求进程等待支付结果；
+2. 支付回调：支付网关（本地为 mock_payment_gateway 命令）异步完成支付后回调，
+   更新支付记录和订单状态。客户端轮询查询支付结果，查询立即返回，不在请求进程中等待。
+
+支付成功回调到达时订单已不是待付款（例如已被超时取消）的，款项已经扣除但订单无法完成，
+支付记录标记为待退款并记录错误日志，由人工或退款流程处理。
+"""
+import hashlib
+import hmac
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core import metrics
+from apps.core.snowflake import generate_no
+from .models import Order, Payment
+from .transitions import bulk_transition
+
+logger = logging.getLogger(__name__)
+
+
+def gateway_settings():
+    return getattr(settings, 'PAYMENT_GATEWAY', {})
+
+
+def sign(payment_no, payment_status):
+    """计算回调签名"""
+    secret = gateway_settings().get('SECRET', settings.SECRET_KEY)
+    message = f'{payment_no}:{payment_status}'.encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(payment_no, payment_status, signature):
+    return hmac.compare_digest(sign(payment_no, payment_status), signature or '')
+
+
+def create_payment(order, payment_method):
+    """
+    发起支付，返回待支付记录
+
+    同一订单已有待支付记录时直接复用，避免重复发起
+    """
+    with transaction.atomic():
+        Order.objects.select_for_update().filter(pk=order.pk).first()
+        payment = order.payments.filter(status='pending').first()
+        if payment:
+            return payment
+        return Payment.objects.create(
+            order=order,
+            payment_no=generate_no('PAY'),
+            payment_method=payment_method,
+            amount=order.final_amount
+        )
+
+
+def complete_payment(payment_no, success):
+    """
+    处理支付回调，重复回调时保持幂等
+
+    支付成功时扣减订单预占的库存；订单在支付完成前已被取消等情况下，支付记录标记为待退款
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().get(payment_no=payment_no)
+        if payment.status != 'pending':
+            return payment
+
+        if success:
+            # 订单转为待发货，同时将库存预占转为实际扣减
+            error = bulk_transition('pay', [payment.order_id], values={
+                payment.order_id: {'payment_method': payment.payment_method}
+            })[payment.order_id]
+            if error:
+                payment.status = 'refund_pending'
+                logger.error(
+                    '支付成功但订单无法完成，需要退款: payment_no=%s order_id=%s reason=%s',
+                    payment_no, payment.order_id, error
+                )
+            else:
+                payment.status = 'success'
+            payment.paid_at = now
+        else:
+            payment.status = 'failed'
+
+        payment.save(update_fields=['status', 'paid_at', 'updated_at'])
+
+    final_status = payment.status
+    transaction.on_commit(
+        lambda: metrics.inc('payments_completed_total', {'status': final_status})
+    )
+    return payment
+
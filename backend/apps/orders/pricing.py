@@ -0,0 +1,67 @@
+"""
+订单金额计算
+
+下单（OrderViewSet.create）和结算试算（OrderViewSet.quote）共用这里的计算，两处得到的金额一致：
+
+    商品总额 = Σ 单价 × 数量
+    优惠金额 = 满减券：面额；折扣券：商品总额 × (1 - 折扣 / 10)；未达到使用门槛时为 0，不超过商品总额
+    实付金额 = 商品总额 + 运费 - 优惠金额
+
+CouponIndex 将用户的未使用优惠券按使用门槛 min_amount 排序，试算时二分找出满足门槛的部分，
+一次遍历计算每张券的优惠金额并排序。
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+SHIPPING_FEE = Decimal('10.00')  # 固定运费
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+Quote = namedtuple('Quote', ['total_amount', 'shipping_fee', 'discount_amount', 'final_amount'])
+
+
+def items_total(prices, quantities):
+    """商品总额，prices 和 quantities 均以商品ID为键"""
+    return sum((prices[product_id] * quantity for product_id, quantity in quantities.items()), ZERO)
+
+
+def coupon_discount(coupon, total_amount):
+    """优惠券对商品总额的优惠金额，未达到使用门槛时为 0"""
+    if total_amount < coupon.min_amount:
+        return ZERO
+    if coupon.type == 1:  # 满减券
+        discount = coupon.amount
+    elif coupon.type == 2:  # 折扣券
+        discount = total_amount * (1 - coupon.amount / 10)
+    else:
+        return ZERO
+    return min(discount, total_amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def quote(total_amount, coupon=None):
+    """按商品总额和优惠券计算订单金额"""
+    discount_amount = coupon_discount(coupon, total_amount) if coupon else ZERO
+    return Quote(total_amount, SHIPPING_FEE, discount_amount, total_amount + SHIPPING_FEE - discount_amount)
+
+
+class CouponIndex:
+    """按使用门槛排序的用户优惠券，用于试算时找出最优惠的券"""
+
+    def __init__(self, user_coupons):
+        self.user_coupons = sorted(user_coupons, key=lambda user_coupon: user_coupon.coupon.min_amount)
+        self.thresholds = [user_coupon.coupon.min_amount for user_coupon in self.user_coupons]
+
+    def rank(self, total_amount):
+        """
+        返回 (可用, 不可用)
+
+        可用为 [(用户优惠券, Quote)]，按优惠金额从高到低排列，相同时先到期的在前；
+        不可用为未达到使用门槛的用户优惠券，按门槛从低到高排列
+        """
+        split = bisect_right(self.thresholds, total_amount)
+        available = sorted(
+            ((user_coupon, quote(total_amount, user_coupon.coupon)) for user_coupon in self.user_coupons[:split]),
+            key=lambda item: (-item[1].discount_amount, item[0].coupon.end_time)
+        )
+        return available, self.user_coupons[split:]
@@ -1,11 +1,14 @@
 from rest_framework import serializers
-from .models import Order, OrderItem
-from apps.products.serializers import ProductSerializer
+from .models import Order, OrderItem, Payment
+from apps.core.profiling import ProfiledSerializerMixin
+from apps.core.serializers import DynamicFieldsMixin
+from apps.products.serializers import ProductBriefSerializer
 from apps.users.models import UserAddress
 from apps.coupons.models import UserCoupon
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class OrderItemSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """订单商品，商品默认只输出摘要，?expand=items.product 输出完整商品信息"""
+    product = ProductBriefSerializer(read_only=True)
     product_name = serializers.CharField(read_only=True)
     product_image = serializers.CharField(read_only=True)
     price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -15,9 +18,13 @@ class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'product_name', 'product_image', 'price', 'quantity', 'total_price']
+        expandable_fields = {
+            'product': ('apps.products.serializers.ProductSerializer', {}),
+        }
 
-class OrderCreateSerializer(serializers.ModelSerializer):
+class OrderCreateSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     address_id = serializers.IntegerField(required=True)
+    coupon_id = serializers.IntegerField(required=False, allow_null=True)  # 用户优惠券ID
     
     class Meta:
         model = Order
@@ -40,18 +47,17 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         # 验证优惠券
         if attrs.get('coupon_id'):
             try:
-                user_coupon = UserCoupon.objects.get(
+                user_coupon = UserCoupon.objects.with_status(UserCoupon.UNUSED).select_related('coupon').get(
                     id=attrs['coupon_id'],
-                    user=self.context['request'].user,
-                    status=0  # 未使用
+                    user=self.context['request'].user
                 )
                 attrs['coupon'] = user_coupon.coupon
             except UserCoupon.DoesNotExist:
-                raise serializers.ValidationError('优惠券不存在或已使用')
+                raise serializers.ValidationError('优惠券不存在、已使用或已过期')
                 
         return attrs
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
@@ -60,11 +66,50 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'id', 'order_no', 'total_amount', 'status', 'status_display',
+            'id', 'order_no', 'total_amount', 'shipping_fee', 'discount_amount', 'final_amount',
+            'status', 'status_display',
             'shipping_address', 'shipping_name', 'shipping_phone',
             'shipping_province', 'shipping_city', 'shipping_district',
             'shipping_address_detail', 'shipping_no', 'payment_method',
             'payment_method_display', 'created_at', 'updated_at', 'items'
         ]
-        read_only_fields = ['order_no', 'total_amount', 'status', 'payment_method',
-                          'created_at', 'updated_at'] 
\ No newline at end of file
+        read_only_fields = ['order_no', 'total_amount', 'shipping_fee', 'discount_amount', 'final_amount',
+                          'status', 'payment_method', 'created_at', 'updated_at'] 
+
+class OrderListSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """订单列表序列化器，不包含收货信息，?expand=shipping 时输出"""
+    items = OrderItemSerializer(many=True, read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_no', 'total_amount', 'discount_amount', 'final_amount',
+            'status', 'status_display', 'payment_method', 'payment_method_display',
+            'created_at', 'items'
+        ]
+        expandable_fields = {
+            'shipping': ('apps.orders.serializers.ShippingSerializer', {'source': '*'}),
+        }
+
+class ShippingSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    """订单收货信息"""
+    class Meta:
+        model = Order
+        fields = [
+            'shipping_name', 'shipping_phone', 'shipping_province', 'shipping_city',
+            'shipping_district', 'shipping_address_detail', 'shipping_no'
+        ]
+
+class PaymentSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
+
+    class Meta:
+        model = Payment
+        fields = [
+            'payment_no', 'order', 'payment_method', 'payment_method_display',
+            'amount', 'status', 'status_display', 'paid_at', 'created_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,302 @@
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.cart.storage import get_cart_storage
+from apps.core.idempotency import _cache_key
+from apps.coupons.models import Coupon, UserCoupon
+from apps.inventory.models import StockReservation
+from apps.products.models import Category, Product
+from apps.users.models import User, UserAddress
+from . import payments
+from .models import Order, Payment
+
+
+class IdempotencyKeyTest(TestCase):
+    """Idempotency-Key：重复的下单和支付请求只执行一次"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        cls.address = UserAddress.objects.create(
+            user=cls.user, receiver='张三', phone='13800000000',
+            province='北京市', city='北京市', district='朝阳区', address='某街道 1 号'
+        )
+        category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(category=category, name='手机', description='', price=100, stock=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_cart_storage().add_item(self.user, self.product.id, 1)
+
+    def create_order(self, key, quantity=1):
+        return self.client.post('/orders/orders/', {
+            'address_id': self.address.id,
+            'items': [{'id': self.product.id, 'quantity': quantity}],
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_create(self):
+        first = self.create_order('key-1')
+        self.assertEqual(first.status_code, 201, first.data)
+        second = self.create_order('key-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+        # 同一 key 用于参数不同的请求
+        self.assertEqual(self.create_order('key-1', quantity=2).status_code, 422)
+
+    def test_replay_pay(self):
+        order_id = self.create_order('key-1').data['id']
+        first = self.client.post(f'/orders/orders/{order_id}/pay/', format='json', HTTP_IDEMPOTENCY_KEY='key-2')
+        self.assertEqual(first.status_code, 202, first.data)
+        second = self.client.post(f'/orders/orders/{order_id}/pay/', format='json', HTTP_IDEMPOTENCY_KEY='key-2')
+        self.assertEqual(second.data['payment_no'], first.data['payment_no'])
+        self.assertEqual(Payment.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY={'WAIT': 0})
+    def test_conflict_while_in_flight(self):
+        # 另一个携带相同 key 的请求正在处理
+        request = SimpleNamespace(path='/orders/orders/', user=self.user)
+        cache.add(f'{_cache_key(request, "key-1")}:lock', 'other', 60)
+        self.assertEqual(self.create_order('key-1').status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_store_failure_keeps_response(self):
+        # 响应保存失败不影响已经创建的订单
+        with mock.patch.object(cache, 'set', side_effect=ConnectionError), self.assertLogs('apps.core.idempotency'):
+            response = self.create_order('key-1')
+        self.assertEqual(response.status_code, 201)
+        request = SimpleNamespace(path='/orders/orders/', user=self.user)
+        self.assertIsNone(cache.get(f'{_cache_key(request, "key-1")}:lock'))
+
+    @override_settings(IDEMPOTENCY={'LOCK_TIMEOUT': 0})
+    def test_keep_lock_after_timeout(self):
+        # 超过 LOCK_TIMEOUT 后锁可能已被其他请求获取，不删除
+        with mock.patch.object(cache, 'delete') as delete:
+            self.create_order('key-1')
+        delete.assert_not_called()
+
+
+class OrderTransitionTest(TestCase):
+    """订单状态机：单个和批量状态转换"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        cls.admin = User.objects.create_user('staff', 'staff@example.com', 'test123456', is_staff=True)
+        cls.address = UserAddress.objects.create(
+            user=cls.user, receiver='张三', phone='13800000000',
+            province='北京市', city='北京市', district='朝阳区', address='某街道 1 号'
+        )
+        category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(category=category, name='手机', description='', price=100, stock=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_order(self):
+        get_cart_storage().add_item(self.user, self.product.id, 1)
+        # 执行提交后回调，从购物车中移除已下单的商品
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/orders/orders/', {
+                'address_id': self.address.id,
+                'items': [{'id': self.product.id, 'quantity': 1}],
+            }, format='json')
+        return response.data['id']
+
+    def bulk(self, action, orders):
+        self.client.force_authenticate(self.admin)
+        return self.client.post('/orders/orders/bulk_transition/', {'action': action, 'orders': orders}, format='json')
+
+    def test_bulk_ship(self):
+        order_ids = [self.create_order() for _ in range(4)]
+        Order.objects.filter(id__in=order_ids[:3]).update(status=Order.PENDING_SHIPMENT)
+
+        with self.assertNumQueries(4):  # 锁定订单行 + 一条 UPDATE，以及事务的保存点
+            response = self.bulk('ship', [
+                {'id': order_ids[0], 'shipping_no': 'SF001'},
+                {'id': order_ids[1], 'shipping_no': 'SF002'},
+                {'id': order_ids[2]},
+                {'id': order_ids[3], 'shipping_no': 'SF004'},
+                {'id': 0, 'shipping_no': 'SF000'},
+            ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 3))
+        self.assertEqual(
+            [result['detail'] for result in response.data['results']],
+            [None, None, '请提供物流单号', '订单状态不正确', '订单不存在']
+        )
+        self.assertEqual(
+            list(Order.objects.filter(id__in=order_ids).order_by('id').values_list('status', 'shipping_no')),
+            [(2, 'SF001'), (2, 'SF002'), (1, None), (0, None)]
+        )
+
+    def test_bulk_cancel_releases_reservations(self):
+        order_ids = [self.create_order() for _ in range(3)]
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 3)
+
+        response = self.bulk('cancel', [{'id': order_id} for order_id in order_ids])
+        self.assertEqual(response.data['succeeded'], 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 0)
+        self.assertEqual(self.bulk('cancel', [{'id': order_ids[0]}]).data['failed'], 1)
+
+    def test_bulk_requires_staff(self):
+        order_id = self.create_order()
+        response = self.client.post(
+            '/orders/orders/bulk_transition/', {'action': 'cancel', 'orders': [{'id': order_id}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.bulk('pay', [{'id': order_id}]).status_code, 400)
+
+
+class CancelUnpaidOrdersTest(TestCase):
+    """超时未支付订单的自动取消"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        cls.address = UserAddress.objects.create(
+            user=cls.user, receiver='张三', phone='13800000000',
+            province='北京市', city='北京市', district='朝阳区', address='某街道 1 号'
+        )
+        category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(category=category, name='手机', description='', price=100, stock=10)
+        cls.coupon = Coupon.objects.create(
+            name='满100减10', type=1, amount=10, min_amount=100,
+            start_time=timezone.now(), end_time=timezone.now() + timedelta(days=1)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_order(self):
+        get_cart_storage().add_item(self.user, self.product.id, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/orders/orders/', {
+                'address_id': self.address.id,
+                'items': [{'id': self.product.id, 'quantity': 1}],
+            }, format='json')
+        return response.data['id']
+
+    def test_cancel_unpaid(self):
+        expired, paying, recent = [self.create_order() for _ in range(3)]
+        user_coupon = UserCoupon.objects.create(user=self.user, coupon=self.coupon, status=1, used_at=timezone.now())
+        Order.objects.filter(id=expired).update(user_coupon=user_coupon)
+        past = timezone.now() - timedelta(hours=1)
+        Order.objects.filter(id__in=[expired, paying]).update(created_at=past)
+        StockReservation.objects.filter(order_id__in=[expired, paying]).update(expires_at=past)
+        # 发起支付时延长预占，支付中的订单不取消
+        self.client.post(f'/orders/orders/{paying}/pay/', format='json')
+
+        call_command('cancel_unpaid_orders', '--once', stdout=StringIO())
+        self.assertEqual(
+            dict(Order.objects.values_list('id', 'status')),
+            {expired: Order.CANCELLED, paying: Order.PENDING_PAYMENT, recent: Order.PENDING_PAYMENT}
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 2)
+        user_coupon.refresh_from_db()
+        self.assertEqual((user_coupon.status, user_coupon.used_at), (0, None))
+
+    def test_paid_after_cancel_needs_refund(self):
+        order_id = self.create_order()
+        payment_no = self.client.post(f'/orders/orders/{order_id}/pay/', format='json').data['payment_no']
+        Order.objects.filter(id=order_id).update(status=Order.CANCELLED)
+
+        # 订单取消后支付网关仍回调支付成功，款项需要退回
+        with self.assertLogs('apps.orders.payments', 'ERROR'):
+            payments.complete_payment(payment_no, True)
+        payment = Payment.objects.get(payment_no=payment_no)
+        self.assertEqual(payment.status, 'refund_pending')
+        self.assertIsNotNone(payment.paid_at)
+        self.assertEqual(Order.objects.get(id=order_id).status, Order.CANCELLED)
+        response = self.client.get(f'/orders/orders/{order_id}/payment_status/')
+        self.assertEqual(response.data['status'], 'refund_pending')
+
+
+class CheckoutQuoteTest(TestCase):
+    """结算试算：优惠券排序，金额与下单一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'test123456')
+        cls.address = UserAddress.objects.create(
+            user=cls.user, receiver='张三', phone='13800000000',
+            province='北京市', city='北京市', district='朝阳区', address='某街道 1 号'
+        )
+        category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(category=category, name='手机', description='', price='99.90', stock=10)
+        now = timezone.now()
+
+        def coupon(name, type, amount, min_amount, **kwargs):
+            return UserCoupon.objects.create(user=cls.user, coupon=Coupon.objects.create(
+                name=name, type=type, amount=amount, min_amount=min_amount,
+                start_time=now - timedelta(days=1), end_time=now + timedelta(days=1), **kwargs
+            ))
+
+        cls.cash = coupon('满100减15', 1, 15, 100)
+        cls.discount = coupon('9折', 2, 9, 0)
+        cls.threshold = coupon('满500减100', 1, 100, 500)
+        cls.ended = coupon('已结束', 1, 50, 0, status=Coupon.ENDED)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.items = [{'id': self.product.id, 'quantity': 2}]
+
+    def test_rank_and_create_with_best_coupon(self):
+        with self.assertNumQueries(2):
+            response = self.client.post('/orders/orders/quote/', {'items': self.items}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        # 商品总额 199.80：满100减15 优惠 15.00，9折优惠 19.98，满500减100 未达门槛，已结束的券不返回
+        self.assertEqual(response.data['best_coupon_id'], self.discount.id)
+        self.assertEqual(
+            [(item['id'], item['available'], str(item['discount_amount'])) for item in response.data['coupons']],
+            [(self.discount.id, True, '19.98'), (self.cash.id, True, '15.00'), (self.threshold.id, False, '0.00')]
+        )
+        self.assertEqual(str(response.data['coupons'][2]['shortfall']), '300.20')
+
+        get_cart_storage().add_item(self.user, self.product.id, 2)
+        order = self.client.post('/orders/orders/', {
+            'address_id': self.address.id, 'items': self.items, 'coupon_id': self.discount.id,
+        }, format='json')
+        self.assertEqual(order.status_code, 201, order.data)
+        self.assertEqual(order.data['final_amount'], str(response.data['coupons'][0]['final_amount']))
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.status, UserCoupon.USED)
+
+    def test_reject_malformed_items(self):
+        get_cart_storage().add_item(self.user, self.product.id, 2)
+        for items in [
+            [], 'items', [{'quantity': 1}], [{'id': 'abc', 'quantity': 1}], [{'id': self.product.id}],
+            [{'id': self.product.id, 'quantity': 'two'}], [{'id': self.product.id, 'quantity': 0}],
+            [{'id': self.product.id, 'quantity': -1}], [self.product.id],
+        ]:
+            for url in ['/orders/orders/', '/orders/orders/quote/']:
+                response = self.client.post(url, {'address_id': self.address.id, 'items': items}, format='json')
+                self.assertEqual(response.status_code, 400, (url, items))
+        self.assertFalse(Order.objects.exists())
+
+    def test_reject_coupon_below_threshold(self):
+        get_cart_storage().add_item(self.user, self.product.id, 2)
+        response = self.client.post('/orders/orders/', {
+            'address_id': self.address.id, 'items': self.items, 'coupon_id': self.threshold.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.threshold.refresh_from_db()
+        self.assertEqual(self.threshold.status, UserCoupon.UNUSED)
@@ -0,0 +1,105 @@
+"""
+订单状态机
+
+订单状态只能通过 TRANSITIONS 中定义的转换变更：
+
+    pay               待付款 -> 待发货   支付回调，库存预占转为实际扣减
+    ship              待发货 -> 待收货
+    confirm_receive   待收货 -> 已完成
+    cancel            待付款 -> 已取消   释放库存预占，退回使用的优惠券
+
+bulk_transition() 对一批订单执行同一个转换：按 id 顺序锁定订单行后，处于源状态的订单由一条
+UPDATE ... WHERE status = 源状态 完成转换，查询次数与订单数量无关，并返回每个订单的结果。
+与支付回调、取消等并发时只有一方生效。
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from apps.coupons.models import UserCoupon
+from apps.inventory import reservations
+from .models import Order
+
+# on_apply(订单ID列表) 在同一事务中处理转换的附带操作
+Transition = namedtuple('Transition', ['source', 'target', 'label', 'on_apply'])
+
+
+def _cancelled(order_ids):
+    reservations.release_orders(order_ids)
+    UserCoupon.objects.filter(
+        id__in=Order.objects.filter(id__in=order_ids, user_coupon__isnull=False).values('user_coupon_id'),
+        status=1  # 已使用
+    ).update(status=0, used_at=None)
+
+
+TRANSITIONS = {
+    'pay': Transition(Order.PENDING_PAYMENT, Order.PENDING_SHIPMENT, '支付', reservations.commit_orders),
+    'ship': Transition(Order.PENDING_SHIPMENT, Order.PENDING_RECEIPT, '发货', None),
+    'confirm_receive': Transition(Order.PENDING_RECEIPT, Order.COMPLETED, '确认收货', None),
+    'cancel': Transition(Order.PENDING_PAYMENT, Order.CANCELLED, '取消', _cancelled),
+}
+
+# 批量接口允许的转换，支付只能由支付回调完成
+BULK_ACTIONS = ('ship', 'confirm_receive', 'cancel')
+BULK_LIMIT = 1000
+
+
+def allowed(order, name):
+    """订单当前状态是否允许执行转换"""
+    return order.status == TRANSITIONS[name].source
+
+
+def bulk_transition(name, order_ids, queryset=None, values=None):
+    """
+    对一批订单执行转换，返回 {订单ID: 失败原因}，成功的订单为 None
+
+    queryset 限定可操作的订单范围，默认为全部订单；
+    values 为 {订单ID: {字段: 值}}，与状态在同一条 UPDATE 中写入，例如发货时的物流单号
+    """
+    transition = TRANSITIONS[name]
+    order_ids = list(dict.fromkeys(order_ids))
+    values = values or {}
+    if queryset is None:
+        queryset = Order.objects.all()
+
+    with transaction.atomic():
+        statuses = dict(
+            queryset.select_for_update().filter(id__in=order_ids).order_by('id').values_list('id', 'status')
+        )
+        applied = [order_id for order_id in order_ids if statuses.get(order_id) == transition.source]
+        if applied:
+            fields = {field for order_id in applied for field in values.get(order_id, {})}
+            Order.objects.filter(id__in=applied, status=transition.source).update(
+                status=transition.target,
+                updated_at=timezone.now(),
+                **{
+                    field: Case(
+                        *[
+                            When(id=order_id, then=Value(values[order_id][field]))
+                            for order_id in applied if field in values.get(order_id, {})
+                        ],
+                        default=F(field)
+                    )
+                    for field in fields
+                }
+            )
+            if transition.on_apply is not None:
+                transition.on_apply(applied)
+
+    applied = set(applied)
+    return {
+        order_id: None if order_id in applied else ('订单状态不正确' if order_id in statuses else '订单不存在')
+        for order_id in order_ids
+    }
+
+
+def transition(order, name, **values):
+    """对单个订单执行转换，成功时同步更新 order 实例，返回是否成功"""
+    if bulk_transition(name, [order.pk], values={order.pk: values})[order.pk] is not None:
+        return False
+    order.status = TRANSITIONS[name].target
+    for field, value in values.items():
+        setattr(order, field, value)
+    return True
@@ -1,27 +1,54 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.utils import timezone
 from django.db import transaction
-from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderCreateSerializer
-from apps.cart.models import Cart, CartItem
+from .models import Order, OrderItem, Payment
+from .serializers import OrderSerializer, OrderListSerializer, OrderCreateSerializer, PaymentSerializer
+from . import payments, pricing, transitions
+from apps.cart.storage import get_cart_storage
 from apps.products.models import Product
+from apps.coupons.models import UserCoupon
+from apps.coupons.serializers import CouponSerializer
+from apps.inventory import reservations
+from apps.core import metrics
+from apps.core.eager_loading import eager_load
+from apps.core.idempotency import idempotent
+from apps.core.pagination import KeysetPagination
+from apps.core.snowflake import generate_no
 from django.contrib import admin
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.urls import reverse
-import time
-import random
+
+def parse_quantities(items):
+    """
+    解析下单、试算请求中的 [{"id": 商品ID, "quantity": 数量}, ...]，返回 {商品ID: 数量}
+
+    格式不正确或数量小于 1 时抛出 ValueError
+    """
+    if not items:
+        raise ValueError('订单商品不能为空')
+    try:
+        quantities = {int(item['id']): int(item['quantity']) for item in items}
+    except (TypeError, KeyError, ValueError):
+        raise ValueError('订单商品格式不正确')
+    if min(quantities.values()) < 1:
+        raise ValueError('商品数量必须大于 0')
+    return quantities
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """获取用户的订单列表，支持按订单号搜索"""
-        queryset = Order.objects.filter(user=self.request.user)
+        queryset = eager_load(
+            Order.objects.filter(user=self.request.user), self.get_serializer_class(), self.request
+        )
         order_no = self.request.query_params.get('order_no', None)
         if order_no:
             queryset = queryset.filter(order_no=order_no)
@@ -30,146 +57,215 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create':
             return OrderCreateSerializer
+        if self.action == 'list':
+            return OrderListSerializer
         return OrderSerializer
 
+    @idempotent
     def create(self, request, *args, **kwargs):
-        """创建订单"""
+        """创建订单，支持 Idempotency-Key"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         # 获取要购买的商品信息列表，每个商品包含id和quantity
-        order_items = request.data.get('items', [])
-        if not order_items:
+        try:
+            quantities = parse_quantities(request.data.get('items'))
+        except ValueError as e:
             return Response(
-                {'detail': '订单商品不能为空'},
+                {'detail': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 从购物车中获取商品信息
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart_items = cart.items.filter(product_id__in=[item['id'] for item in order_items])
-            
-            if not cart_items:
-                return Response(
-                    {'detail': '购物车中没有选中的商品'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        except Cart.DoesNotExist:
+        # 从购物车存储中获取商品信息
+        cart_items = {
+            line.product_id: line
+            for line in get_cart_storage().get_cart(request.user).items
+            if line.product_id in quantities
+        }
+        if not cart_items:
             return Response(
-                {'detail': '购物车为空'},
+                {'detail': '购物车中没有选中的商品'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 验证购物车中的商品数量是否与订单一致
-        for item in order_items:
-            try:
-                cart_item = cart_items.filter(product_id=item['id']).first()
-                if not cart_item:
-                    raise ValueError(f'商品ID {item["id"]} 不在购物车中')
-                    
-                if cart_item.quantity != item['quantity']:
-                    return Response(
-                        {'detail': f'商品 {cart_item.product.name} 数量不匹配'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            except CartItem.DoesNotExist:
+        # 验证订单商品是否都在购物车中
+        for product_id in quantities:
+            if product_id not in cart_items:
                 return Response(
-                    {'detail': f'商品ID {item["id"]} 不在购物车中'},
+                    {'detail': f'商品ID {product_id} 不在购物车中'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        # 计算订单金额
-        total_amount = sum(item.product.price * item.quantity for item in cart_items)
-        shipping_fee = 10  # 固定运费
-        discount_amount = 0
+        try:
+            with transaction.atomic():
+                order = self._create_order(request.user, serializer.validated_data, quantities, cart_items)
+        except ValueError as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        metrics.inc('orders_created_total')
+
+        # 重新加载订单，预取订单项及商品，避免序列化时逐行查询
+        order = eager_load(Order.objects.all(), OrderSerializer).get(pk=order.pk)
+        return Response(
+            OrderSerializer(order).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def _create_order(self, user, validated_data, quantities, cart_items):
+        """
+        在事务中创建订单，查询次数与购物车商品数量无关
 
-        # 计算优惠券折扣
-        if serializer.validated_data.get('coupon'):
-            coupon = serializer.validated_data['coupon']
-            if total_amount >= coupon.min_amount:
-                if coupon.type == 1:  # 满减券
-                    discount_amount = coupon.amount
-                elif coupon.type == 2:  # 折扣券
-                    discount_amount = total_amount * (1 - coupon.amount / 10)
+        商品行按 id 顺序加锁，避免并发下单同一批商品时死锁；
+        库存预占使用带可售库存条件的单条 UPDATE，不会超卖。
+        """
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update().filter(id__in=quantities).order_by('id')
+        }
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                raise ValueError(f'商品ID {product_id} 不存在')
+            # 验证购物车中的商品数量是否与订单一致
+            if cart_items[product_id].quantity != quantity:
+                raise ValueError(f'商品 {product.name} 数量不匹配')
+            if product.available_stock < quantity:
+                raise ValueError(f'商品 {product.name} 库存不足')
 
-        final_amount = total_amount + shipping_fee - discount_amount
+        # 计算订单金额（使用加锁后读取的最新价格），与结算试算共用 pricing 模块
+        total_amount = pricing.items_total(
+            {product_id: product.price for product_id, product in products.items()}, quantities
+        )
+        coupon = validated_data.get('coupon')
+        if coupon and total_amount < coupon.min_amount:
+            raise ValueError('订单金额未达到优惠券的使用门槛')
+        amounts = pricing.quote(total_amount, coupon)
 
         # 创建订单
-        with transaction.atomic():
-            # 创建订单
-            order = Order.objects.create(
-                user=request.user,
-                order_no=f'ORDER{int(time.time())}{random.randint(1000, 9999)}',
-                total_amount=total_amount,
-                shipping_fee=shipping_fee,
-                discount_amount=discount_amount,
-                final_amount=final_amount,
-                payment_method=serializer.validated_data.get('payment_method', 'alipay'),
-                remark=serializer.validated_data.get('remark', ''),
-                shipping_name=serializer.validated_data['shipping_name'],
-                shipping_phone=serializer.validated_data['shipping_phone'],
-                shipping_province=serializer.validated_data['shipping_province'],
-                shipping_city=serializer.validated_data['shipping_city'],
-                shipping_district=serializer.validated_data['shipping_district'],
-                shipping_address_detail=serializer.validated_data['shipping_address_detail'],
-                shipping_address_id=serializer.validated_data['address_id'],
-                coupon=serializer.validated_data.get('coupon'),
-                user_coupon_id=serializer.validated_data.get('coupon_id')
+        order = Order.objects.create(
+            user=user,
+            order_no=generate_no('ORDER'),
+            total_amount=amounts.total_amount,
+            shipping_fee=amounts.shipping_fee,
+            discount_amount=amounts.discount_amount,
+            final_amount=amounts.final_amount,
+            payment_method=validated_data.get('payment_method', 'alipay'),
+            remark=validated_data.get('remark', ''),
+            shipping_name=validated_data['shipping_name'],
+            shipping_phone=validated_data['shipping_phone'],
+            shipping_province=validated_data['shipping_province'],
+            shipping_city=validated_data['shipping_city'],
+            shipping_district=validated_data['shipping_district'],
+            shipping_address_detail=validated_data['shipping_address_detail'],
+            shipping_address_id=validated_data['address_id'],
+            coupon=coupon,
+            user_coupon_id=validated_data.get('coupon_id')
+        )
+
+        # 批量创建订单项（主图取商品的冗余字段，不查询图片表）
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=products[product_id],
+                product_name=products[product_id].name,
+                product_image=products[product_id].main_image_url or '',
+                price=products[product_id].price,
+                quantity=quantity,
+                total_price=products[product_id].price * quantity
             )
+            for product_id, quantity in quantities.items()
+        ])
 
-            # 创建订单项并更新库存
-            for item in order_items:
-                cart_item = cart_items.filter(product_id=item['id']).first()
-                if not cart_item:
-                    raise ValueError(f'商品ID {item["id"]} 不在购物车中')
-                    
-                product = cart_item.product
-                if product.stock < item['quantity']:
-                    raise ValueError(f'商品 {product.name} 库存不足')
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    product_name=product.name,
-                    product_image=product.images.first().image_url if product.images.exists() else '',
-                    price=product.price,
-                    quantity=item['quantity'],
-                    total_price=product.price * item['quantity']
-                )
+        # 预占库存（单条带可售库存条件的 UPDATE），支付成功后才实际扣减
+        reservations.reserve(order, quantities)
+
+        # 订单提交后从购物车中删除已购买的商品
+        product_ids = list(quantities)
+        transaction.on_commit(lambda: get_cart_storage().remove_products(user, product_ids))
 
-                # 更新商品库存
-                product.stock -= item['quantity']
-                product.sales += item['quantity']
-                product.save()
+        # 如果使用了优惠券，标记为已使用
+        if coupon:
+            used = UserCoupon.objects.filter(
+                id=validated_data['coupon_id'],
+                user=user,
+                status=0  # 未使用
+            ).update(status=1, used_at=timezone.now())
+            if not used:
+                raise ValueError('优惠券状态不正确')
 
-            # 从购物车中删除已购买的商品
-            cart_items.delete()
+        return order
 
-            # 如果使用了优惠券，标记为已使用
-            if serializer.validated_data.get('coupon'):
-                user_coupon = UserCoupon.objects.get(
-                    id=serializer.validated_data['coupon_id'],
-                    user=request.user
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """
+        结算试算：按商品当前价格计算订单金额，并返回用户未使用的优惠券按优惠金额从高到低的排列
+
+        请求体：{"items": [{"id": 商品ID, "quantity": 数量}, ...]}，与下单相同
+        """
+        try:
+            quantities = parse_quantities(request.data.get('items'))
+        except ValueError as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        prices = dict(Product.objects.filter(id__in=quantities).values_list('id', 'price'))
+        for product_id in quantities:
+            if product_id not in prices:
+                return Response(
+                    {'detail': f'商品ID {product_id} 不存在'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                user_coupon.use()
 
-        return Response(
-            OrderSerializer(order).data,
-            status=status.HTTP_201_CREATED
+        total_amount = pricing.items_total(prices, quantities)
+        amounts = pricing.quote(total_amount)
+        index = pricing.CouponIndex(
+            UserCoupon.objects.with_status(UserCoupon.UNUSED).filter(user=request.user).select_related('coupon')
         )
+        available, unavailable = index.rank(total_amount)
+        coupons = [
+            {
+                'id': user_coupon.id,
+                'coupon': CouponSerializer(user_coupon.coupon).data,
+                'available': True,
+                'discount_amount': coupon_amounts.discount_amount,
+                'final_amount': coupon_amounts.final_amount,
+                'shortfall': pricing.ZERO,
+            }
+            for user_coupon, coupon_amounts in available
+        ] + [
+            {
+                'id': user_coupon.id,
+                'coupon': CouponSerializer(user_coupon.coupon).data,
+                'available': False,
+                'discount_amount': pricing.ZERO,
+                'final_amount': amounts.final_amount,
+                'shortfall': user_coupon.coupon.min_amount - total_amount,  # 距使用门槛还差的金额
+            }
+            for user_coupon in unavailable
+        ]
+        return Response({
+            'total_amount': amounts.total_amount,
+            'shipping_fee': amounts.shipping_fee,
+            'final_amount': amounts.final_amount,
+            'best_coupon_id': available[0][0].id if available else None,
+            'coupons': coupons,
+        })
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def pay(self, request, pk=None):
-        """支付订单"""
+        """发起支付，立即返回待支付记录，支付结果由网关异步回调，支持 Idempotency-Key"""
         order = self.get_object()
-        if order.status != 0:  # 待付款
+        if not transitions.allowed(order, 'pay'):
             return Response(
                 {'detail': '订单状态不正确'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 模拟支付过程
         payment_method = request.data.get('payment_method', 'alipay')
         if payment_method not in ['alipay', 'wechat']:
             return Response(
@@ -177,76 +273,160 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 模拟支付延迟
-        time.sleep(1)
-        
-        # 生成支付流水号
-        payment_no = f'PAY{int(time.time())}{random.randint(1000, 9999)}'
-        
-        # 更新订单状态
-        order.status = 1  # 待发货
-        order.payment_no = payment_no
-        order.payment_time = timezone.now()
-        order.save()
+        # 延长库存预占，避免支付过程中预占过期被释放
+        try:
+            reservations.renew(order)
+        except reservations.InsufficientStock as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response({
-            'detail': '支付成功',
-            'payment_no': payment_no,
-            'payment_time': order.payment_time,
-            'payment_method': payment_method,
-            'amount': order.final_amount
-        })
+        payment = payments.create_payment(order, payment_method)
+        return Response(
+            PaymentSerializer(payment).data,
+            status=status.HTTP_202_ACCEPTED
+        )
 
-    @action(detail=True, methods=['post'])
-    def ship(self, request, pk=None):
-        """发货"""
+    @action(detail=True, methods=['get'])
+    def payment_status(self, request, pk=None):
+        """查询支付状态，立即返回当前结果，由客户端轮询"""
         order = self.get_object()
-        if order.status != 1:  # 待发货
+        payment = order.payments.order_by('-created_at').first()
+        if not payment:
             return Response(
-                {'detail': '订单状态不正确'},
+                {'detail': '订单尚未发起支付'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(PaymentSerializer(payment).data)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[AllowAny],
+        authentication_classes=[]
+    )
+    def payment_callback(self, request):
+        """支付网关回调"""
+        payment_no = request.data.get('payment_no')
+        payment_status = request.data.get('status')
+        if payment_status not in ['success', 'failed'] or not payments.verify_signature(
+            payment_no, payment_status, request.data.get('signature')
+        ):
+            return Response(
+                {'detail': '签名校验失败'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
+
+        try:
+            payment = payments.complete_payment(payment_no, payment_status == 'success')
+        except Payment.DoesNotExist:
+            return Response(
+                {'detail': '支付记录不存在'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(PaymentSerializer(payment).data)
+
+    @action(detail=True, methods=['post'])
+    def ship(self, request, pk=None):
+        """发货"""
+        order = self.get_object()
         shipping_no = request.data.get('shipping_no')
         if not shipping_no:
             return Response(
                 {'detail': '请提供物流单号'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        order.shipping_no = shipping_no
-        order.status = 2  # 待收货
-        order.save()
+
+        if not transitions.transition(order, 'ship', shipping_no=shipping_no):
+            return Response(
+                {'detail': '订单状态不正确'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response({'detail': '发货成功'})
 
     @action(detail=True, methods=['post'])
     def confirm_receive(self, request, pk=None):
         """确认收货"""
         order = self.get_object()
-        if order.status != 2:  # 待收货
+        if not transitions.transition(order, 'confirm_receive'):
             return Response(
                 {'detail': '订单状态不正确'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        order.status = 3  # 已完成
-        order.save()
         return Response({'detail': '确认收货成功'})
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """取消订单"""
         order = self.get_object()
-        if order.status != 0:  # 待付款
+        if not transitions.transition(order, 'cancel'):
             return Response(
                 {'detail': '订单状态不正确'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        order.status = 4  # 已取消
-        order.save()
         return Response({'detail': '取消订单成功'})
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_transition(self, request):
+        """
+        批量变更订单状态（管理员），例如仓库批量发货
+
+        请求体：{"action": "ship", "orders": [{"id": 1, "shipping_no": "SF001"}, ...]}，
+        action 为 ship、confirm_receive 或 cancel，发货时每个订单须提供物流单号。
+        每个订单单独返回结果，部分订单失败不影响其他订单。
+        """
+        name = request.data.get('action')
+        if name not in transitions.BULK_ACTIONS:
+            return Response(
+                {'detail': '不支持的操作'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items = request.data.get('orders')
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'detail': '请提供订单列表'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > transitions.BULK_LIMIT:
+            return Response(
+                {'detail': f'每次最多处理 {transitions.BULK_LIMIT} 个订单'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = {}
+        values = {}
+        try:
+            for item in items:
+                order_id = int(item['id'])
+                if name == 'ship':
+                    if not item.get('shipping_no'):
+                        results[order_id] = '请提供物流单号'
+                        continue
+                    values[order_id] = {'shipping_no': str(item['shipping_no'])}
+                else:
+                    values[order_id] = {}
+                results[order_id] = None
+        except (TypeError, KeyError, ValueError):
+            return Response(
+                {'detail': '订单列表格式不正确'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if values:
+            results.update(transitions.bulk_transition(name, list(values), values=values))
+        succeeded = sum(error is None for error in results.values())
+        return Response({
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': [
+                {'id': order_id, 'success': error is None, 'detail': error}
+                for order_id, error in results.items()
+            ],
+        })
+
     @action(detail=True, methods=['get'])
     def shipping_info(self, request, pk=None):
         """获取物流信息"""
@@ -266,9 +446,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 @admin.site.admin_view
 def admin_cancel_order(request, order_id):
     order = get_object_or_404(Order, id=order_id)
-    if order.status == 0:  # 待付款
-        order.status = 4  # 已取消
-        order.save()
+    if transitions.transition(order, 'cancel'):
         messages.success(request, f'订单 {order.order_no} 已取消')
     else:
         messages.error(request, f'订单 {order.order_no} 状态不允许取消')
@@ -277,9 +455,7 @@ def admin_cancel_order(request, order_id):
 @admin.site.admin_view
 def admin_ship_order(request, order_id):
     order = get_object_or_404(Order, id=order_id)
-    if order.status == 1:  # 待发货
-        order.status = 2  # 待收货
-        order.save()
+    if transitions.transition(order, 'ship'):
         messages.success(request, f'订单 {order.order_no} 已发货')
     else:
         messages.error(request, f'订单 {order.order_no} 状态不允许发货')
@@ -7,7 +7,7 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'parent', 'level', 'is_active', 'created_at']
     list_filter = ['is_active', 'level']
     search_fields = ['name']
-    ordering = ['level', 'id']
+    ordering = ['path']
 
 class ProductImageInline(admin.TabularInline):
     """商品图片内联"""
@@ -23,7 +23,7 @@ class ProductSpecificationInline(admin.TabularInline):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """商品管理"""
-    list_display = ('name', 'price', 'stock', 'category', 'is_active', 'created_at')
+    list_display = ('name', 'price', 'stock', 'reserved_stock', 'category', 'is_active', 'created_at')
     list_filter = ('category', 'is_active', 'created_at')
     search_fields = ('name', 'description')
     readonly_fields = ('created_at', 'updated_at')
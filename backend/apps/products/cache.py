@@ -0,0 +1,144 @@
+"""
+商品目录读缓存
+
+列表/详情接口的响应按 "命名空间 + 版本号 + 规范化查询参数" 缓存，
+数据变更时通过递增命名空间版本号使旧缓存整体失效，避免逐个删除 key。
+
+库存、销量等随下单和支付频繁变化的字段（cache_volatile_fields）不依赖缓存失效：
+命中缓存时按响应中的对象ID查询一次这些字段的当前值并覆盖，库存变化不需要使整个命名空间失效。
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from apps.core import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'catalog'
+
+# 命名空间
+PRODUCT = 'product'
+CATEGORY = 'category'
+SPECIFICATION = 'specification'
+
+
+def _version_key(namespace):
+    return f'{CACHE_PREFIX}:{namespace}:version'
+
+
+def get_version(namespace):
+    """获取命名空间当前版本号"""
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), 1, timeout=None)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+
+def bump_version(*namespaces):
+    """递增命名空间版本号，使该命名空间下的所有缓存失效"""
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            # key 不存在（首次写入或已被淘汰）
+            cache.set(_version_key(namespace), 2, timeout=None)
+        except Exception:
+            logger.exception('递增缓存版本失败: %s', namespace)
+
+
+def normalize_query_params(query_params):
+    """将查询参数规范化为稳定的字符串，参数顺序不同视为同一请求"""
+    items = []
+    for key in sorted(query_params.keys()):
+        for value in sorted(query_params.getlist(key)):
+            items.append(f'{key}={value}')
+    return '&'.join(items)
+
+
+def build_cache_key(namespace, action, query_params, pk=None):
+    """构造响应缓存 key"""
+    digest = hashlib.md5(normalize_query_params(query_params).encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{namespace}:v{get_version(namespace)}:{action}:{pk or "-"}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    为 ViewSet 的 list/retrieve 提供读穿透缓存
+
+    子类需设置:
+        cache_namespace: 缓存命名空间
+        cache_ttl_list / cache_ttl_detail: settings.CACHE_TTL 中的配置项名称
+
+    可选:
+        cache_volatile_fields: 命中缓存时读取当前值的字段，需同时实现 get_volatile_values(ids)，
+            返回 {对象ID: {字段: 值}}
+    """
+    cache_namespace = None
+    cache_ttl_list = None
+    cache_ttl_detail = None
+    cache_volatile_fields = ()
+
+    def _get_cache_ttl(self, name):
+        return settings.CACHE_TTL.get(name) if name else None
+
+    def get_volatile_values(self, ids):
+        raise NotImplementedError
+
+    def _refresh_volatile(self, data):
+        """用当前值覆盖缓存响应中的易变字段，只覆盖响应中包含的字段（稀疏字段集可能不包含）"""
+        items = data.get('results', [data]) if isinstance(data, dict) else data
+        items = [
+            item for item in items if 'id' in item and any(field in item for field in self.cache_volatile_fields)
+        ]
+        if not items:
+            return data
+        values = self.get_volatile_values([item['id'] for item in items])
+        for item in items:
+            current = values.get(item['id'], {})
+            for field in self.cache_volatile_fields:
+                if field in item and field in current:
+                    item[field] = current[field]
+        return data
+
+    def _cached_response(self, ttl_name, object_id, handler, request, *args, **kwargs):
+        ttl = self._get_cache_ttl(ttl_name)
+        if not ttl or not self.cache_namespace:
+            return handler(request, *args, **kwargs)
+
+        try:
+            key = build_cache_key(self.cache_namespace, self.action, request.query_params, object_id)
+            data = cache.get(key)
+        except Exception:
+            logger.exception('读取商品缓存失败')
+            return handler(request, *args, **kwargs)
+
+        if data is not None:
+            metrics.inc('product_cache_requests_total', {'result': 'hit'})
+            if self.cache_volatile_fields:
+                data = self._refresh_volatile(data)
+            return Response(data)
+
+        metrics.inc('product_cache_requests_total', {'result': 'miss'})
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(key, response.data, ttl)
+            except Exception:
+                logger.exception('写入商品缓存失败')
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            self.cache_ttl_list, None, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            self.cache_ttl_detail, kwargs.get(self.lookup_url_kwarg or self.lookup_field), super().retrieve,
+            request, *args, **kwargs
+        )
@@ -0,0 +1,64 @@
+"""
+分类树缓存
+
+整棵分类树按 path 排序后一次查询构建，序列化为 JSON 字符串缓存，key 中带有分类命名空间的版本号；
+分类变更时版本号递增（signals.invalidate_category_cache），旧的树自然失效。
+接口直接返回缓存的 JSON，不再经过序列化器，并使用内容摘要作为 ETag。
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cache as catalog_cache
+from .models import Category
+
+logger = logging.getLogger(__name__)
+
+
+def build_tree():
+    """返回根分类列表，每个节点的 children 为子分类列表，同级按名称排序"""
+    nodes = {}
+    roots = []
+    # 按 path 排序保证父分类先于子分类出现
+    for category in Category.objects.order_by('path'):
+        node = {
+            'id': category.id,
+            'name': category.name,
+            'level': category.level,
+            'path': category.path,
+            'is_active': category.is_active,
+            'children': [],
+        }
+        nodes[category.id] = node
+        parent = nodes.get(category.parent_id)
+        (parent['children'] if parent else roots).append(node)
+
+    for node in [*nodes.values(), {'children': roots}]:
+        node['children'].sort(key=lambda child: child['name'])
+    return roots
+
+
+def get_tree_json():
+    """返回 (etag, 分类树 JSON 字符串)"""
+    ttl = settings.CACHE_TTL.get('CATEGORY_TREE')
+    key = catalog_cache.build_cache_key(catalog_cache.CATEGORY, 'tree', {})
+    if ttl:
+        try:
+            cached = cache.get(key)
+        except Exception:
+            logger.exception('读取分类树缓存失败')
+            cached = None
+        if cached is not None:
+            return cached
+
+    blob = json.dumps(build_tree(), ensure_ascii=False, separators=(',', ':'))
+    result = (f'"{hashlib.md5(blob.encode("utf-8")).hexdigest()}"', blob)
+    if ttl:
+        try:
+            cache.set(key, result, ttl)
+        except Exception:
+            logger.exception('写入分类树缓存失败')
+    return result
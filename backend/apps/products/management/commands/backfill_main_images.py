@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = '按商品图片表回填商品的冗余主图地址 main_image_url'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批更新的商品 id 范围')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        self.stdout.write('开始回填商品主图...')
+        count = 0
+        # 按 id 区间分批更新，避免单条 UPDATE 长时间锁住整张商品表
+        for start in range(0, max_id + 1, batch_size):
+            count += Product.sync_main_image_url(
+                Product.objects.filter(id__gte=start, id__lt=start + batch_size)
+            )
+        self.stdout.write(self.style.SUCCESS(f'主图回填完成，共更新 {count} 个商品'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_alter_category_options_alter_product_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_3be21c_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='main_image_url',
+            field=models.URLField(blank=True, editable=False, null=True, verbose_name='主图链接'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    """按层级自上而下计算已有分类的 path 和 level"""
+    Category = apps.get_model('products', 'Category')
+    categories = {category.id: category for category in Category.objects.all()}
+    paths = {}
+
+    def resolve(category):
+        if category.id not in paths:
+            parent = categories.get(category.parent_id)
+            prefix, level = resolve(parent) if parent else ('', 0)
+            paths[category.id] = (f'{prefix}{category.id:010d}/', level + 1)
+        return paths[category.id]
+
+    for category in categories.values():
+        category.path, category.level = resolve(category)
+    Category.objects.bulk_update(categories.values(), ['path', 'level'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_main_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='分类路径'),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
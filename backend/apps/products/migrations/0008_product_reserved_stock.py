@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_stock',
+            field=models.IntegerField(default=0, editable=False, verbose_name='预占库存'),
+        ),
+    ]
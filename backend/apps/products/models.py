@@ -1,11 +1,26 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.translation import gettext_lazy as _
 
+from apps.core.dirty_fields import DirtyFieldsMixin
+
 class Category(models.Model):
-    """商品分类"""
+    """
+    商品分类
+
+    除 parent 外还以物化路径 path 存储树结构：path 为根到当前节点各分类 id（定长补零）
+    以 / 连接，例如 0000000001/0000000005/。子树内所有分类的 path 都以该节点的 path 开头，
+    查询子树只需对 path 索引做一次范围扫描（见 subtree_q）。path 和 level 在 save 中维护。
+    """
+    PATH_STEP = 10
+    PATH_SEPARATOR = '/'
+
     name = models.CharField(_('分类名称'), max_length=100)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children', verbose_name=_('父分类'))
     level = models.IntegerField(_('分类层级'), default=1)
+    path = models.CharField(_('分类路径'), max_length=255, default='', db_index=True, editable=False)
     is_active = models.BooleanField(_('是否激活'), default=True)
     created_at = models.DateTimeField(_('创建时间'), auto_now_add=True)
     updated_at = models.DateTimeField(_('更新时间'), auto_now=True)
@@ -18,13 +33,62 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def subtree_q(cls, path, field='path'):
+        """
+        path 对应子树（包括节点本身）的查询条件，field 为 path 字段的查找路径，
+        例如查询子树下的商品时为 category__path
+
+        使用范围条件而不是 LIKE，末尾的 / 加一为 0，正好是子树之后的第一个值
+        """
+        upper = path[:-1] + chr(ord(cls.PATH_SEPARATOR) + 1)
+        return models.Q(**{f'{field}__gte': path, f'{field}__lt': upper})
+
+    def is_ancestor_of(self, other):
+        """是否为 other 的祖先或 other 本身"""
+        return bool(self.path) and other.path.startswith(self.path)
+
+    def clean(self):
+        if self.parent and self.pk and self.is_ancestor_of(self.parent):
+            raise ValidationError({'parent': _('不能将分类移动到自身或其子分类下')})
+
+    def build_path(self):
+        own = f'{self.pk:0{self.PATH_STEP}d}{self.PATH_SEPARATOR}'
+        return (self.parent.path if self.parent else '') + own
+
     def save(self, *args, **kwargs):
-        if self.parent:
-            self.level = self.parent.level + 1
-        super().save(*args, **kwargs)
+        with transaction.atomic(using=kwargs.get('using') or self._state.db):
+            old = Category.objects.filter(pk=self.pk).values('path', 'level').first() if self.pk else None
+            old_path, old_level = (old['path'], old['level']) if old else ('', self.level)
+            # 供 post_save 信号判断分类是否移动（见 search.signals），避免信号中再查询一次
+            self._previous_path = old_path
+            if self.parent:
+                if old_path and self.parent.path.startswith(old_path):
+                    raise ValueError('不能将分类移动到自身或其子分类下')
+                self.level = self.parent.level + 1
+            else:
+                self.level = 1
+            if self.pk:
+                self.path = self.build_path()
+            super().save(*args, **kwargs)
+
+            # 新建分类保存后才有 id，此时再写入 path
+            new_path = self.build_path()
+            if new_path != old_path:
+                Category.objects.filter(pk=self.pk).update(path=new_path)
+                if old_path:
+                    # 移动分类时一次更新整棵子树的路径和层级
+                    Category.objects.filter(self.subtree_q(old_path)).exclude(pk=self.pk).update(
+                        path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                        level=F('level') + (self.level - old_level),
+                    )
+            self.path = new_path
 
-class Product(models.Model):
+class Product(DirtyFieldsMixin, models.Model):
     """商品"""
+    # reserved_stock 只由带条件的 UPDATE 增减，未跟踪修改的实例整行保存时也不写回，避免覆盖并发的预占
+    excluded_from_full_save = ('reserved_stock',)
+
     STATUS_CHOICES = [
         ('draft', _('草稿')),
         ('published', _('已发布')),
@@ -36,9 +100,13 @@ class Product(models.Model):
     description = models.TextField(_('商品描述'))
     price = models.DecimalField(_('商品价格'), max_digits=10, decimal_places=2)
     stock = models.IntegerField(_('库存数量'), default=0)
+    # 已下单未支付的预占数量，由 apps.inventory.reservations 维护，可售库存为 stock - reserved_stock
+    reserved_stock = models.IntegerField(_('预占库存'), default=0, editable=False)
     sales = models.IntegerField(_('销量'), default=0)
     status = models.CharField(_('商品状态'), max_length=20, choices=STATUS_CHOICES, default='draft')
     is_active = models.BooleanField(_('是否上架'), default=True)
+    # 冗余的主图地址，由 ProductImage 的保存、删除同步（见 signals.sync_product_main_image）
+    main_image_url = models.URLField(_('主图链接'), null=True, blank=True, editable=False)
     created_at = models.DateTimeField(_('创建时间'), auto_now_add=True)
     updated_at = models.DateTimeField(_('更新时间'), auto_now=True)
 
@@ -46,10 +114,31 @@ class Product(models.Model):
         verbose_name = _('商品')
         verbose_name_plural = _('商品')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),  # 商品列表键集分页
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def available_stock(self):
+        return self.stock - self.reserved_stock
+
+    @classmethod
+    def sync_main_image_url(cls, queryset=None):
+        """
+        按图片表重新计算 main_image_url，单条 UPDATE ... SET main_image_url = (子查询)
+        主图优先，没有主图时使用最早上传的图片，没有图片时为 NULL
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.update(main_image_url=Subquery(
+            ProductImage.objects.filter(product=OuterRef('pk'))
+            .order_by('-is_main', 'created_at', 'id')
+            .values('image_url')[:1]
+        ))
+
 class ProductImage(models.Model):
     """商品图片"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', verbose_name=_('商品'))
@@ -1,30 +1,39 @@
 from rest_framework import serializers
+from apps.core.profiling import ProfiledSerializerMixin
+from apps.core.serializers import DynamicFieldsMixin
 from .models import Category, Product, ProductImage, ProductSpecification
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """商品分类序列化器"""
     class Meta:
         model = Category
-        fields = ['id', 'name', 'parent', 'level', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['level', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'parent', 'level', 'path', 'is_active', 'created_at', 'updated_at']
+        read_only_fields = ['level', 'path', 'created_at', 'updated_at']
 
-class ProductImageSerializer(serializers.ModelSerializer):
+    def validate_parent(self, value):
+        if value and self.instance and self.instance.is_ancestor_of(value):
+            raise serializers.ValidationError('不能将分类移动到自身或其子分类下')
+        return value
+
+class ProductImageSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """商品图片序列化器"""
     class Meta:
         model = ProductImage
         fields = ['id', 'image_url', 'is_main', 'created_at']
         read_only_fields = ['created_at']
 
-class ProductSpecificationSerializer(serializers.ModelSerializer):
+class ProductSpecificationSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """商品规格序列化器"""
     class Meta:
         model = ProductSpecification
         fields = ['id', 'name', 'value', 'created_at']
         read_only_fields = ['created_at']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """商品序列化器"""
     category_name = serializers.CharField(source='category.name', read_only=True)
+    main_image = serializers.CharField(source='main_image_url', read_only=True)
+    available_stock = serializers.IntegerField(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     specifications = ProductSpecificationSerializer(many=True, read_only=True)
     image_urls = serializers.ListField(
@@ -37,13 +46,43 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'category', 'category_name', 'name', 'description',
-            'price', 'stock', 'sales', 'status', 'is_active',
-            'created_at', 'updated_at', 'images', 'specifications',
+            'price', 'stock', 'available_stock', 'sales', 'status', 'is_active',
+            'created_at', 'updated_at', 'main_image', 'images', 'specifications',
             'image_urls'
         ]
         read_only_fields = ['sales', 'created_at', 'updated_at']
 
-class ProductCreateSerializer(serializers.ModelSerializer):
+class ProductListSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """商品列表序列化器，只包含列表页展示的字段，图片只输出主图地址"""
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    main_image = serializers.CharField(source='main_image_url', read_only=True)
+    available_stock = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'category', 'category_name', 'name', 'price', 'stock', 'available_stock',
+            'sales', 'status', 'is_active', 'created_at', 'main_image'
+        ]
+        expandable_fields = {
+            'description': (serializers.CharField, {}),
+            'images': (ProductImageSerializer, {'many': True}),
+            'specifications': (ProductSpecificationSerializer, {'many': True}),
+        }
+
+class ProductBriefSerializer(ProfiledSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    """嵌套在订单等数据中的商品摘要"""
+    main_image = serializers.CharField(source='main_image_url', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'status', 'is_active', 'main_image']
+        expandable_fields = {
+            'images': (ProductImageSerializer, {'many': True}),
+            'specifications': (ProductSpecificationSerializer, {'many': True}),
+        }
+
+class ProductCreateSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     images = serializers.ListField(
         child=serializers.URLField(),
         required=False
@@ -66,12 +105,12 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         
         product = Product.objects.create(**validated_data)
         
-        # Create product images
-        for image_url in images_data:
+        # Create product images，第一张为主图
+        for index, image_url in enumerate(images_data):
             ProductImage.objects.create(
                 product=product,
                 image_url=image_url,
-                is_main=not ProductImage.objects.filter(product=product).exists()
+                is_main=index == 0
             )
         
         # Create product specifications
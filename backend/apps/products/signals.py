@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, ProductImage, ProductSpecification
+from . import cache as catalog_cache
+
+
+def _invalidate(*namespaces):
+    """事务提交后再使缓存失效，避免并发请求在提交前回填旧数据"""
+    transaction.on_commit(lambda: catalog_cache.bump_version(*namespaces))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """分类变更：商品响应中包含分类名称，一并失效"""
+    _invalidate(catalog_cache.CATEGORY, catalog_cache.PRODUCT)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """商品变更"""
+    _invalidate(catalog_cache.PRODUCT)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def sync_product_main_image(sender, instance, **kwargs):
+    """商品图片变更：同步商品的冗余主图地址"""
+    Product.sync_main_image_url(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_product_image_cache(sender, instance, **kwargs):
+    """商品图片变更：商品响应中嵌入了图片列表"""
+    _invalidate(catalog_cache.PRODUCT)
+
+
+@receiver([post_save, post_delete], sender=ProductSpecification)
+def invalidate_product_specification_cache(sender, instance, **kwargs):
+    """商品规格变更"""
+    _invalidate(catalog_cache.PRODUCT, catalog_cache.SPECIFICATION)
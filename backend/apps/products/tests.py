@@ -1,3 +1,377 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from apps.users.models import User
+from apps.search.suggest import rebuild_suggestions
+from . import cache as catalog_cache
+from .models import Category, Product, ProductImage, ProductSpecification
+
+
+@override_settings(CACHE_TTL={})
+class ProductListQueryCountTest(TestCase):
+    """商品列表查询数量回归测试"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        categories = [Category.objects.create(name=f'分类{i}') for i in range(3)]
+        for i in range(12):
+            product = Product.objects.create(
+                category=categories[i % 3],
+                name=f'商品{i}',
+                description='描述',
+                price=100 + i,
+                stock=10,
+            )
+            for j in range(2):
+                ProductImage.objects.create(product=product, image_url=f'https://example.com/{i}_{j}.jpg', is_main=j == 0)
+                ProductSpecification.objects.create(product=product, name=f'规格{j}', value='值')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_is_constant(self):
+        # 商品(含分类)，主图读取冗余字段，键集分页默认不执行 COUNT
+        with self.assertNumQueries(1):
+            response = self.client.get('/products/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+        first = response.data['results'][0]
+        self.assertNotIn('images', first)
+        self.assertNotIn('description', first)
+        self.assertTrue(first['main_image'].endswith('_0.jpg'))
+        self.assertTrue(first['category_name'])
+
+    def test_list_expand_query_count_is_constant(self):
+        # 商品(含分类) + 图片 + 规格
+        with self.assertNumQueries(3):
+            response = self.client.get('/products/products/?expand=images,specifications')
+        self.assertEqual(response.status_code, 200)
+        first = response.data['results'][0]
+        self.assertEqual(len(first['images']), 2)
+        self.assertEqual(len(first['specifications']), 2)
+
+    def test_list_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/products/products/?fields=id,name,price')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'price'})
+
+    def test_detail_query_count(self):
+        product = Product.objects.first()
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/products/products/{product.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['specifications']), 2)
+
+    def test_detail_fields(self):
+        product = Product.objects.first()
+        response = self.client.get(f'/products/products/{product.id}/?fields=id,specifications.name')
+        self.assertEqual(set(response.data), {'id', 'specifications'})
+        self.assertEqual(set(response.data['specifications'][0]), {'name'})
+
+
+class ProductMainImageTest(TestCase):
+    """商品冗余主图同步测试"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        category = Category.objects.create(name='分类')
+        cls.product = Product.objects.create(category=category, name='商品', description='描述', price=100)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def main_image_url(self):
+        self.product.refresh_from_db()
+        return self.product.main_image_url
+
+    def test_sync_on_image_changes(self):
+        first = ProductImage.objects.create(product=self.product, image_url='https://example.com/1.jpg')
+        self.assertEqual(self.main_image_url(), 'https://example.com/1.jpg')
+        second = ProductImage.objects.create(product=self.product, image_url='https://example.com/2.jpg', is_main=True)
+        self.assertEqual(self.main_image_url(), 'https://example.com/2.jpg')
+
+        response = self.client.post(f'/products/product-images/{first.id}/set_main/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.main_image_url(), 'https://example.com/1.jpg')
+        second.refresh_from_db()
+        self.assertFalse(second.is_main)
+
+        first.delete()
+        self.assertEqual(self.main_image_url(), 'https://example.com/2.jpg')
+        second.delete()
+        self.assertIsNone(self.main_image_url())
+
+    def test_backfill_command(self):
+        ProductImage.objects.bulk_create([
+            ProductImage(product=self.product, image_url='https://example.com/1.jpg', is_main=True),
+        ])
+        self.assertIsNone(self.main_image_url())
+        call_command('backfill_main_images', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.main_image_url(), 'https://example.com/1.jpg')
+
+
+class ProductSuggestTest(TestCase):
+    """搜索联想"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        cls.category = Category.objects.create(name='Phones')
+        cls.iphone = Product.objects.create(
+            category=cls.category, name='Apple iPhone 15', description='', price=5999, stock=10, sales=50
+        )
+        cls.ipad = Product.objects.create(
+            category=cls.category, name='Apple iPad Air', description='', price=4799, stock=10, sales=80
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'suggest.idx')
+        settings_override = override_settings(SEARCH_SUGGEST={'PATH': self.path})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        rebuild_suggestions()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def suggest(self, q):
+        with self.assertNumQueries(0):
+            response = self.client.get('/products/products/suggest/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [(item['type'], item['text']) for item in response.data['results']]
+
+    def test_prefix_and_word_start(self):
+        # 按销量排序
+        self.assertEqual(
+            self.suggest('APPLE i'), [('product', 'Apple iPad Air'), ('product', 'Apple iPhone 15')]
+        )
+        self.assertEqual(self.suggest('iph'), [('product', 'Apple iPhone 15')])
+        self.assertEqual(self.suggest('pho'), [('category', 'Phones')])
+        self.assertEqual(self.suggest('phone'), [('category', 'Phones')])
+        self.assertEqual(self.suggest('xyz'), [])
+        self.assertEqual(self.suggest(''), [])
+
+    def test_incremental_updates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                category=self.category, name='Apple Watch', description='', price=2999, stock=10, sales=100
+            )
+            self.iphone.name = 'Galaxy S24'
+            self.iphone.save()
+            self.ipad.is_active = False
+            self.ipad.save(update_fields=['is_active'])
+        self.assertEqual(self.suggest('apple'), [('product', 'Apple Watch')])
+        self.assertEqual(self.suggest('gal'), [('product', 'Galaxy S24')])
+
+        # 请求中只写增量，超过上限后由命令合并为新快照
+        with override_settings(SEARCH_SUGGEST={'PATH': self.path, 'DELTA_LIMIT': 0}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.ipad.is_active = True
+                self.ipad.save(update_fields=['is_active'])
+            self.assertTrue(os.path.exists(f'{self.path}.delta'))
+            call_command('rebuild_suggest_index', '--compact', stdout=StringIO())
+            self.assertFalse(os.path.exists(f'{self.path}.delta'))
+            self.assertEqual(
+                self.suggest('apple'), [('product', 'Apple Watch'), ('product', 'Apple iPad Air')]
+            )
+
+
+class ProductPartialSaveTest(TestCase):
+    """DirtyFieldsMixin：save() 只写入修改过的字段"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(
+            category=cls.category, name='手机', description='很长的描述', price=100, stock=10
+        )
+
+    def test_save_dirty_fields(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.is_active = False
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        self.assertIn('"is_active"', update)
+        self.assertIn('"updated_at"', update)
+        self.assertNotIn('"description"', update)
+        self.assertNotIn('"reserved_stock"', update)
+
+        # 没有修改时不执行 UPDATE
+        with self.assertNumQueries(0):
+            product.save()
+        product.refresh_from_db()
+        self.assertFalse(product.is_active)
+        self.assertEqual(product.get_dirty_fields(), [])
+
+    def test_untracked_full_save_keeps_reserved_stock(self):
+        product = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).update(reserved_stock=5)
+        # 模拟无法判断修改字段的实例，例如升级前序列化到缓存中的实例
+        del product._saved_values
+        product.name = '新名称'
+        with self.assertLogs('apps.core.dirty_fields', 'WARNING'), \
+                override_settings(DIRTY_FIELDS={'WARN_FULL_SAVE': True}):
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.reserved_stock), ('新名称', 5))
+
+
+class ProductCacheStockTest(TestCase):
+    """商品缓存：库存变化不使缓存失效，命中缓存时返回当前库存"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        category = Category.objects.create(name='手机')
+        cls.product = Product.objects.create(category=category, name='手机', description='', price=100, stock=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_hit_reads_current_stock(self):
+        url = f'/products/products/{self.product.id}/'
+        self.client.get(url)
+        self.client.get('/products/products/')
+        version = catalog_cache.get_version(catalog_cache.PRODUCT)
+
+        # 库存预占和支付扣减都是不触发信号的批量 UPDATE
+        Product.objects.filter(id=self.product.id).update(stock=8, reserved_stock=3, sales=2)
+
+        with self.assertNumQueries(1):  # 只查询库存和销量
+            detail = self.client.get(url)
+        self.assertEqual((detail.data['stock'], detail.data['available_stock'], detail.data['sales']), (8, 5, 2))
+        item = self.client.get('/products/products/').data['results'][0]
+        self.assertEqual((item['stock'], item['available_stock']), (8, 5))
+        self.assertEqual(catalog_cache.get_version(catalog_cache.PRODUCT), version)
+
+        # 稀疏字段集不包含库存时不查询
+        self.client.get(url, {'fields': 'id,name'})
+        with self.assertNumQueries(0):
+            self.assertNotIn('stock', self.client.get(url, {'fields': 'id,name'}).data)
+
+
+class CategoryTreeTest(TestCase):
+    """分类树：物化路径的维护、子树查询和整棵树接口"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def expected_path(*categories):
+        return ''.join(f'{category.id:010d}/' for category in categories)
+
+    def test_create(self):
+        root = Category.objects.create(name='电子')
+        child = Category.objects.create(name='手机', parent=root)
+        self.assertEqual((child.path, child.level), (self.expected_path(root, child), 2))
+        child.refresh_from_db()
+        self.assertEqual((child.path, child.level), (self.expected_path(root, child), 2))
+
+    def test_move_subtree(self):
+        electronics = Category.objects.create(name='电子')
+        books = Category.objects.create(name='图书')
+        phones = Category.objects.create(name='手机', parent=electronics)
+        smart = Category.objects.create(name='智能', parent=phones)
+        novels = Category.objects.create(name='小说', parent=books)
+
+        # 移到根下，整棵子树的路径和层级一起更新
+        phones.parent = None
+        phones.save()
+        smart.refresh_from_db()
+        self.assertEqual((smart.path, smart.level), (self.expected_path(phones, smart), 2))
+
+        phones.parent = novels
+        phones.save()
+        smart.refresh_from_db()
+        self.assertEqual((phones.path, phones.level), (self.expected_path(books, novels, phones), 3))
+        self.assertEqual((smart.path, smart.level), (self.expected_path(books, novels, phones, smart), 4))
+        electronics.refresh_from_db()
+        self.assertEqual((electronics.path, electronics.level), (self.expected_path(electronics), 1))
+
+    def test_move_loads_old_path_once(self):
+        books = Category.objects.create(name='图书')
+        phones = Category.objects.create(name='手机')
+        Category.objects.create(name='智能', parent=phones)
+
+        phones.parent = books
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('apps.search.facets.index_category') as index_category, \
+                self.captureOnCommitCallbacks(execute=True):
+            phones.save()
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'products_category' in query['sql']
+        ]
+        self.assertEqual(len(selects), 1, selects)
+        # 移动后按新路径重建子树下商品的筛选维度
+        index_category.assert_called_once_with(self.expected_path(books, phones))
+
+        with mock.patch('apps.search.facets.index_category') as index_category, \
+                self.captureOnCommitCallbacks(execute=True):
+            phones.save()
+        index_category.assert_not_called()
+
+    def test_reject_move_into_own_subtree(self):
+        root = Category.objects.create(name='电子')
+        child = Category.objects.create(name='手机', parent=root)
+        root.parent = child
+        with self.assertRaises(ValueError):
+            root.save()
+        root.refresh_from_db()
+        self.assertEqual((root.parent_id, root.path, root.level), (None, self.expected_path(root), 1))
+
+        response = self.client.patch(f'/products/categories/{root.id}/', {'parent': child.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_subtree_boundaries(self):
+        # id 1 是 id 10 的字符串前缀，分类 1 的子树不能包含分类 10 及其子分类
+        first = Category.objects.create(id=1, name='一')
+        tenth = Category.objects.create(id=10, name='十')
+        first_child = Category.objects.create(name='一的子分类', parent=first)
+        Category.objects.create(name='十的子分类', parent=tenth)
+        self.assertEqual(
+            set(Category.objects.filter(Category.subtree_q(first.path)).values_list('id', flat=True)),
+            {first.id, first_child.id}
+        )
+        self.assertEqual(Category.objects.filter(Category.subtree_q(tenth.path)).count(), 2)
+
+    @override_settings(CACHE_TTL={'CATEGORY_TREE': 60})
+    def test_tree_etag(self):
+        root = Category.objects.create(name='电子')
+        Category.objects.create(name='手机', parent=root)
+        response = self.client.get('/products/categories/tree/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['children'][0]['name'], '手机')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/products/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='电脑', parent=root)
+        response = self.client.get('/products/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -1,12 +1,22 @@
+from django.db import transaction
+from django.http import HttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
 from rest_framework.permissions import IsAuthenticated
 from .models import Category, Product, ProductImage, ProductSpecification
+from . import cache as catalog_cache
+from . import category_tree
+from .cache import CachedResponseMixin
+from apps.core.eager_loading import eager_load
+from apps.core.pagination import KeysetPagination
+from apps.search import facets as product_facets
+from apps.search import suggest as search_suggest
+from apps.search.index import search_queryset
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
+    ProductListSerializer,
     ProductCreateSerializer,
     ProductImageSerializer,
     ProductSpecificationSerializer
@@ -14,7 +24,10 @@ from .serializers import (
 
 # Create your views here.
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = catalog_cache.CATEGORY
+    cache_ttl_list = 'CATEGORY_LIST'
+    cache_ttl_detail = 'CATEGORY_LIST'
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
@@ -26,22 +39,45 @@ class CategoryViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         return queryset
 
-class ProductViewSet(viewsets.ModelViewSet):
+    @action(detail=False)
+    def tree(self, request):
+        """整棵分类树，直接返回缓存的 JSON"""
+        etag, blob = category_tree.get_tree_json()
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(blob, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+class ProductViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = catalog_cache.PRODUCT
+    cache_ttl_list = 'PRODUCT_LIST'
+    cache_ttl_detail = 'PRODUCT_DETAIL'
+    # 库存预占、支付扣减只更新这些字段，不使商品缓存失效
+    cache_volatile_fields = ('stock', 'available_stock', 'sales')
     queryset = Product.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'create':
             return ProductCreateSerializer
+        if self.action == 'list':
+            return ProductListSerializer
         return ProductSerializer
 
     def get_queryset(self):
-        queryset = Product.objects.all()
-        
-        # Filter by category
+        queryset = eager_load(Product.objects.all(), self.get_serializer_class(), self.request)
+
+        # Filter by category，包括所有子分类下的商品（分类 path 的范围查询）
         category_id = self.request.query_params.get('category_id', None)
         if category_id:
-            queryset = queryset.filter(category_id=category_id)
+            paths = list(Category.objects.filter(pk=category_id).values_list('path', flat=True))
+            if paths:
+                queryset = queryset.filter(Category.subtree_q(paths[0], 'category__path'))
+            else:
+                queryset = queryset.none()
 
         # Filter by price range
         min_price = self.request.query_params.get('min_price', None)
@@ -62,21 +98,59 @@ class ProductViewSet(viewsets.ModelViewSet):
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
 
-        # Search by name or description
+        # Search by name or description (倒排索引)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search)
-            )
+            queryset = search_queryset(queryset, search)
 
-        # Order by
-        order_by = self.request.query_params.get('order_by', '-created_at')
+        # Order by，搜索时默认按相关度排序
+        order_by = self.request.query_params.get('order_by', None if search else '-created_at')
         if order_by:
             queryset = queryset.order_by(order_by)
 
         return queryset
 
+    def get_volatile_values(self, ids):
+        return {
+            product_id: {'stock': stock, 'available_stock': stock - reserved_stock, 'sales': sales}
+            for product_id, stock, reserved_stock, sales in Product.objects.filter(id__in=ids).values_list(
+                'id', 'stock', 'reserved_stock', 'sales'
+            )
+        }
+
+    @action(detail=False)
+    def facets(self, request):
+        """
+        分面筛选：返回筛选后的商品、各维度取值的商品数和价格直方图
+
+        ?category=3&price=100-200,200-500&spec.颜色=黑色,白色&status=published
+        ?facets=category,price,spec.颜色  指定需要计数的维度，默认为分类、状态和价格
+        """
+        filters = product_facets.parse_filters(request.query_params)
+        queryset = eager_load(
+            product_facets.filter_queryset(Product.objects.all(), filters), ProductListSerializer, request
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = ProductListSerializer(page, many=True, context=self.get_serializer_context())
+        response = self.get_paginated_response(serializer.data)
+        response.data['facets'], response.data['price_histogram'] = product_facets.facet_counts(
+            filters, product_facets.parse_facets(request.query_params, filters)
+        )
+        return response
+
+    @action(detail=False)
+    def suggest(self, request):
+        """
+        搜索联想：按前缀匹配商品名称、分类名称和中文名称的拼音首字母，不查询数据库
+
+        ?q=iph&limit=10
+        """
+        try:
+            limit = max(int(request.query_params.get('limit', 0)), 0)
+        except ValueError:
+            limit = 0
+        return Response({'results': search_suggest.suggest(request.query_params.get('q', ''), limit or None)})
+
     @action(detail=True, methods=['post'])
     def toggle_status(self, request, pk=None):
         product = self.get_object()
@@ -114,14 +188,20 @@ class ProductImageViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def set_main(self, request, pk=None):
         image = self.get_object()
-        # Set all other images of the same product to not main
-        ProductImage.objects.filter(product=image.product).update(is_main=False)
-        image.is_main = True
-        image.save()
+        with transaction.atomic():
+            # 只取消原主图，保存后由信号同步商品的 main_image_url
+            ProductImage.objects.filter(
+                product_id=image.product_id, is_main=True
+            ).exclude(pk=image.pk).update(is_main=False)
+            image.is_main = True
+            image.save(update_fields=['is_main'])
         serializer = self.get_serializer(image)
         return Response(serializer.data)
 
-class ProductSpecificationViewSet(viewsets.ModelViewSet):
+class ProductSpecificationViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = catalog_cache.SPECIFICATION
+    cache_ttl_list = 'PRODUCT_SPECIFICATIONS'
+    cache_ttl_detail = 'PRODUCT_SPECIFICATIONS'
     queryset = ProductSpecification.objects.all()
     serializer_class = ProductSpecificationSerializer
     permission_classes = [IsAuthenticated]
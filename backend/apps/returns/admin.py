@@ -3,6 +3,7 @@ from django.db import transaction
 from django.utils.html import format_html
 from .models import ReturnRequest, ReturnImage
 from apps.orders.models import Order, OrderItem
+from apps.core.snowflake import generate_no
 
 class ReturnImageInline(admin.TabularInline):
     model = ReturnImage
@@ -107,7 +108,7 @@ class ReturnRequestAdmin(admin.ModelAdmin):
                     # 创建新订单
                     new_order = Order.objects.create(
                         user=original_order.user,
-                        order_no=f"EX{original_order.order_no}",  # 添加EX前缀表示换货订单
+                        order_no=generate_no('EX'),  # 添加EX前缀表示换货订单
                         total_amount=new_total_amount,
                         discount_amount=new_discount_amount,
                         status=1,  # 待付款状态
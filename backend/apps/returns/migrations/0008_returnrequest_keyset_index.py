@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('returns', '0007_returnrequest_actual_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='returnrequest',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='returns_ret_user_id_8d5e8a_idx'),
+        ),
+    ]
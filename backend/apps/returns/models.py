@@ -1,9 +1,10 @@
 from django.db import models
 from django.conf import settings
+from apps.core.dirty_fields import DirtyFieldsMixin
 from apps.orders.models import Order
 from apps.products.models import Product
 
-class ReturnRequest(models.Model):
+class ReturnRequest(DirtyFieldsMixin, models.Model):
     """退换货申请"""
     TYPE_CHOICES = (
         (1, '退货'),
@@ -45,6 +46,9 @@ class ReturnRequest(models.Model):
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
         unique_together = ['order', 'product']  # 防止同一订单的同一商品重复申请
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),  # 退换货列表键集分页
+        ]
 
     def __str__(self):
         product_name = self.product.name if self.product else '整单'
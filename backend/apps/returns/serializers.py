@@ -3,15 +3,16 @@ from .models import ReturnRequest, ReturnImage
 from apps.orders.serializers import OrderSerializer
 from apps.orders.models import Order, OrderItem
 from apps.products.models import Product
+from apps.core.profiling import ProfiledSerializerMixin
 
-class ReturnImageSerializer(serializers.ModelSerializer):
+class ReturnImageSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """退换货图片序列化器"""
     class Meta:
         model = ReturnImage
         fields = ['id', 'image', 'created_at']
         read_only_fields = ['created_at']
 
-class ReturnRequestSerializer(serializers.ModelSerializer):
+class ReturnRequestSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """退换货申请序列化器"""
     images = ReturnImageSerializer(many=True, read_only=True)
     type_display = serializers.CharField(source='get_type_display', read_only=True)
@@ -39,7 +40,7 @@ class ReturnRequestSerializer(serializers.ModelSerializer):
             'discount_amount', 'actual_amount'
         ]
 
-class ReturnRequestCreateSerializer(serializers.ModelSerializer):
+class ReturnRequestCreateSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """退换货申请创建序列化器"""
     order_id = serializers.IntegerField(write_only=True)
     product_id = serializers.IntegerField(write_only=True)
@@ -133,7 +134,7 @@ class ReturnRequestCreateSerializer(serializers.ModelSerializer):
         
         return return_request
 
-class ReturnRequestDetailSerializer(serializers.ModelSerializer):
+class ReturnRequestDetailSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     order_number = serializers.CharField(source='order.order_number', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_image = serializers.ImageField(source='product.image', read_only=True)
@@ -152,7 +153,7 @@ class ReturnRequestDetailSerializer(serializers.ModelSerializer):
             'status', 'created_at', 'shipping_company', 'tracking_number'
         ]
 
-class ShippingInfoSerializer(serializers.Serializer):
+class ShippingInfoSerializer(ProfiledSerializerMixin, serializers.Serializer):
     shipping_company = serializers.ChoiceField(choices=[
         ('SF', '顺丰速运'),
         ('ZTO', '中通快递'),
@@ -161,7 +162,7 @@ class ShippingInfoSerializer(serializers.Serializer):
     ])
     tracking_number = serializers.CharField(max_length=50)
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     order_number = serializers.CharField(source='order_no')
     created_at = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S')
     status_display = serializers.CharField(source='get_status_display')
@@ -170,17 +171,9 @@ class OrderListSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id', 'order_number', 'created_at', 'status_display']
 
-class ProductListSerializer(serializers.ModelSerializer):
-    image_url = serializers.SerializerMethodField()
+class ProductListSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    image_url = serializers.CharField(source='main_image_url', read_only=True)
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'image_url', 'price']
-
-    def get_image_url(self, obj):
-        main_image = obj.images.filter(is_main=True).first()
-        if main_image:
-            return main_image.image_url
-        # 如果没有主图，返回第一张图片
-        first_image = obj.images.first()
-        return first_image.image_url if first_image else None 
\ No newline at end of file
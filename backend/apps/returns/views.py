@@ -14,7 +14,7 @@ from .serializers import (
 )
 from apps.orders.models import Order
 from apps.products.models import Product
-from rest_framework.pagination import PageNumberPagination
+from apps.core.pagination import KeysetPagination
 
 # Create your views here.
 
@@ -22,6 +22,7 @@ class ReturnRequestViewSet(viewsets.ModelViewSet):
     """退换货申请视图集"""
     serializer_class = ReturnRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         """根据不同的操作使用不同的序列化器"""
@@ -113,15 +114,10 @@ class ReturnRequestImageUploadView(viewsets.ViewSet):
             'status': 'success'
         })
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
 class OrderListViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderListSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = Order.objects.filter(
@@ -134,7 +130,7 @@ class OrderListViewSet(viewsets.ReadOnlyModelViewSet):
         if search:
             queryset = queryset.filter(order_no__icontains=search)
         
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
 
     @action(detail=True)
     def products(self, request, pk=None):
@@ -0,0 +1,19 @@
+from django.contrib import admin
+from .models import ProductFacet, SearchToken
+
+
+@admin.register(SearchToken)
+class SearchTokenAdmin(admin.ModelAdmin):
+    """搜索索引管理"""
+    list_display = ['term', 'product', 'weight']
+    search_fields = ['term']
+    raw_id_fields = ['product']
+
+
+@admin.register(ProductFacet)
+class ProductFacetAdmin(admin.ModelAdmin):
+    """商品筛选维度管理"""
+    list_display = ['facet', 'value', 'product']
+    list_filter = ['facet']
+    search_fields = ['value']
+    raw_id_fields = ['product']
@@ -0,0 +1,238 @@
+"""
+商品筛选维度的位图索引
+
+每个维度取值 (facet, value) 对应一个以商品 id 为下标的位图。筛选即位图求交（同一维度的多个取值先求并），
+某个取值的商品数为 筛选结果 & 该取值位图 的置位数。计算量只与取值个数有关，
+增加筛选条件只多一次位图运算，不会像 GROUP BY 那样随筛选条件成倍增加查询耗时。
+
+计算某个维度的计数时不包含该维度自身的筛选条件（多选筛选），例如选中"黑色"后"白色"仍显示可选数量。
+
+通过 settings.FACET_INDEX['BACKEND'] 选择:
+    apps.search.facet_index.RedisFacetIndex  Redis 位图（SETBIT / BITOP / BITCOUNT），多进程共享
+    apps.search.facet_index.LocalFacetIndex  进程内整数位图，首次使用时从数据库加载，
+                                             其他进程的变更不可见，仅适用于单进程开发环境
+"""
+import json
+import threading
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BaseFacetIndex:
+    def __init__(self, **options):
+        self.options = options
+
+    def update(self, added=(), removed=()):
+        """added / removed: [(商品ID, 维度, 取值), ...]"""
+        raise NotImplementedError
+
+    def load(self, memberships):
+        """清空索引后加载全部 (商品ID, 维度, 取值)"""
+        raise NotImplementedError
+
+    def count(self, filters, facets):
+        """
+        filters: {维度: [取值, ...]}；facets: 需要计数的维度
+        返回 {维度: {取值: 商品数}}，只包含商品数大于 0 的取值
+        """
+        raise NotImplementedError
+
+
+class LocalFacetIndex(BaseFacetIndex):
+    """进程内位图，使用 Python 整数的二进制位"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.lock = threading.Lock()
+        self.bitmaps = None
+
+    def _ensure_loaded(self):
+        if self.bitmaps is None:
+            from .models import ProductFacet
+            self.load(ProductFacet.objects.values_list('product_id', 'facet', 'value').iterator())
+
+    def update(self, added=(), removed=()):
+        with self.lock:
+            if self.bitmaps is None:
+                # 尚未加载，首次使用时会从数据库读到最新状态
+                return
+            for product_id, facet, value in added:
+                key = (facet, value)
+                self.bitmaps[key] = self.bitmaps.get(key, 0) | (1 << product_id)
+            for product_id, facet, value in removed:
+                key = (facet, value)
+                if key in self.bitmaps:
+                    self.bitmaps[key] &= ~(1 << product_id)
+
+    def load(self, memberships):
+        bitmaps = {}
+        for product_id, facet, value in memberships:
+            bitmaps[(facet, value)] = bitmaps.get((facet, value), 0) | (1 << product_id)
+        with self.lock:
+            self.bitmaps = bitmaps
+
+    def reset(self):
+        with self.lock:
+            self.bitmaps = None
+
+    @staticmethod
+    def _match(bitmaps, filters, exclude):
+        """除 exclude 维度外所有筛选条件的交集，没有筛选条件时返回 None（全部商品）"""
+        result = None
+        for facet, values in filters.items():
+            if facet == exclude:
+                continue
+            union = 0
+            for value in values:
+                union |= bitmaps.get((facet, value), 0)
+            result = union if result is None else result & union
+        return result
+
+    def count(self, filters, facets):
+        if self.bitmaps is None:
+            self._ensure_loaded()
+        with self.lock:
+            bitmaps = dict(self.bitmaps)
+
+        bases = {}
+        counts = {}
+        for (facet, value), bitmap in bitmaps.items():
+            if facet not in facets:
+                continue
+            if facet not in bases:
+                bases[facet] = self._match(bitmaps, filters, facet)
+            base = bases[facet]
+            count = (bitmap if base is None else bitmap & base).bit_count()
+            if count:
+                counts.setdefault(facet, {})[value] = count
+        return counts
+
+
+class RedisFacetIndex(BaseFacetIndex):
+    """
+    Redis 位图
+
+    facet:names           set，全部维度
+    facet:values:<维度>   set，维度的全部取值，计数时只读取需要计数的维度
+    facet:bm:<JSON>       维度取值 [维度, 取值] 的位图，第 N 位表示商品 N
+    facet:tmp:<随机串>:*  计数时的临时结果，计数结束后删除
+    """
+    NAMES_KEY = 'facet:names'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        import redis
+        self.client = redis.Redis.from_url(options.get('REDIS_URL', 'redis://127.0.0.1:6379/4'))
+
+    @staticmethod
+    def _member(facet, value):
+        return json.dumps([facet, value], ensure_ascii=False)
+
+    @staticmethod
+    def _bitmap_key(member):
+        return f'facet:bm:{member}'
+
+    @staticmethod
+    def _values_key(facet):
+        return f'facet:values:{facet}'
+
+    def update(self, added=(), removed=()):
+        pipe = self.client.pipeline(transaction=False)
+        for product_id, facet, value in added:
+            pipe.sadd(self.NAMES_KEY, facet)
+            pipe.sadd(self._values_key(facet), value)
+            pipe.setbit(self._bitmap_key(self._member(facet, value)), product_id, 1)
+        for product_id, facet, value in removed:
+            pipe.setbit(self._bitmap_key(self._member(facet, value)), product_id, 0)
+        pipe.execute()
+
+    def _values(self, facets):
+        """{维度: [取值, ...]}，一次往返读取"""
+        facets = list(facets)
+        pipe = self.client.pipeline(transaction=False)
+        for facet in facets:
+            pipe.smembers(self._values_key(facet))
+        return {
+            facet: [value.decode() for value in values]
+            for facet, values in zip(facets, pipe.execute())
+        }
+
+    def load(self, memberships, batch_size=10000):
+        facets = [facet.decode() for facet in self.client.smembers(self.NAMES_KEY)]
+        pipe = self.client.pipeline(transaction=False)
+        for facet, values in self._values(facets).items():
+            for value in values:
+                pipe.delete(self._bitmap_key(self._member(facet, value)))
+            pipe.delete(self._values_key(facet))
+        pipe.delete(self.NAMES_KEY)
+        pipe.execute()
+
+        batch = []
+        for membership in memberships:
+            batch.append(membership)
+            if len(batch) >= batch_size:
+                self.update(batch)
+                batch = []
+        self.update(batch)
+
+    def count(self, filters, facets):
+        members = [(facet, value) for facet, values in self._values(facets).items() for value in values]
+        prefix = f'facet:tmp:{uuid.uuid4().hex}'
+        pipe = self.client.pipeline(transaction=False)
+        temp_keys = []
+
+        # 每个有筛选条件的维度先求并
+        unions = {}
+        for facet, values in filters.items():
+            unions[facet] = f'{prefix}:or:{len(unions)}'
+            keys = [self._bitmap_key(self._member(facet, value)) for value in values]
+            pipe.bitop('OR', unions[facet], *keys)
+            temp_keys.append(unions[facet])
+
+        def base_key(exclude):
+            """除 exclude 维度外所有筛选条件的交集，没有筛选条件时返回 None"""
+            keys = [key for facet, key in unions.items() if facet != exclude]
+            if not keys:
+                return None
+            if len(keys) == 1:
+                return keys[0]
+            key = f'{prefix}:and:{exclude}'
+            if key not in temp_keys:
+                pipe.bitop('AND', key, *keys)
+                temp_keys.append(key)
+            return key
+
+        counted = []
+        count_key = f'{prefix}:count'
+        for facet, value in members:
+            base = base_key(facet)
+            if base is None:
+                pipe.bitcount(self._bitmap_key(self._member(facet, value)))
+            else:
+                pipe.bitop('AND', count_key, self._bitmap_key(self._member(facet, value)), base)
+                pipe.bitcount(count_key)
+            counted.append((facet, value, len(pipe.command_stack) - 1))
+        temp_keys.append(count_key)
+        pipe.delete(*temp_keys)
+        results = pipe.execute()
+
+        counts = {}
+        for facet, value, position in counted:
+            if results[position]:
+                counts.setdefault(facet, {})[value] = results[position]
+        return counts
+
+
+_index = None
+
+
+def get_facet_index():
+    """获取配置的筛选维度索引"""
+    global _index
+    if _index is None:
+        config = dict(getattr(settings, 'FACET_INDEX', {}))
+        backend = config.pop('BACKEND', 'apps.search.facet_index.LocalFacetIndex')
+        _index = import_string(backend)(**config)
+    return _index
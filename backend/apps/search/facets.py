@@ -0,0 +1,244 @@
+"""
+商品分面筛选
+
+每个上架商品属于若干维度取值:
+    category        所属分类及其所有上级分类的 id（选中上级分类时包含子分类下的商品）
+    status          商品状态
+    price           价格区间，例如 100-200、5000+，区间计数即价格直方图
+    spec.<规格名>    规格值，例如 spec.颜色=黑色
+
+归属关系保存在 ProductFacet 表中，商品、规格、分类变更时增量更新该表并同步位图索引（facet_index），
+每次请求的各取值商品数由位图运算得到，不对商品表执行 GROUP BY。
+
+增量更新时锁定商品行后再比较差异，同一商品的并发更新依次执行。位图索引在事务提交后同步，
+同步失败时记录日志并计入 facet_index_sync_failures_total：商品下次变更时会重新写入它的全部取值，
+未能移除的旧取值需执行 rebuild_facet_index 重建。
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from apps.core import metrics
+from apps.products.models import Category, Product, ProductSpecification
+from .facet_index import get_facet_index
+from .models import ProductFacet
+
+logger = logging.getLogger(__name__)
+
+CATEGORY = 'category'
+STATUS = 'status'
+PRICE = 'price'
+SPEC_PREFIX = 'spec.'
+
+# 未通过 ?facets= 指定时计数的维度，另外包含有筛选条件的维度
+DEFAULT_FACETS = (CATEGORY, STATUS, PRICE)
+
+# 价格区间的下限，最后一个区间没有上限
+PRICE_BUCKETS = [0, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# 查询参数中多个取值的分隔符
+VALUE_SEPARATOR = ','
+
+
+def price_bucket(price):
+    lower = PRICE_BUCKETS[0]
+    for bound in PRICE_BUCKETS[1:]:
+        if price < bound:
+            return f'{lower}-{bound}'
+        lower = bound
+    return f'{lower}+'
+
+
+def build_facets(product, specifications):
+    """计算商品的 {(维度, 取值)}，未上架的商品不参与筛选"""
+    if not product.is_active:
+        return set()
+    facets = {
+        (STATUS, product.status),
+        (PRICE, price_bucket(product.price)),
+    }
+    for part in product.category.path.split(Category.PATH_SEPARATOR):
+        if part:
+            facets.add((CATEGORY, str(int(part))))
+    for specification in specifications:
+        facets.add((f'{SPEC_PREFIX}{specification.name}'[:100], specification.value))
+    return facets
+
+
+def _sync_index(added, removed):
+    try:
+        get_facet_index().update(added, removed)
+    except Exception:
+        logger.exception(
+            '同步筛选维度位图索引失败: %s', sorted({product_id for product_id, _, _ in [*added, *removed]})
+        )
+        metrics.inc('facet_index_sync_failures_total')
+
+
+def index_products(product_ids):
+    """增量更新一批商品的筛选维度，未变化时不写库"""
+    product_ids = sorted(set(product_ids))
+    with transaction.atomic():
+        # 锁定商品行后再读取，并发更新同一商品时不会基于过期的读取重复插入
+        list(Product.objects.select_for_update().filter(id__in=product_ids).order_by('id').values_list('id'))
+        products = Product.objects.filter(id__in=product_ids).select_related('category')
+        specifications = defaultdict(list)
+        for specification in ProductSpecification.objects.filter(product_id__in=product_ids):
+            specifications[specification.product_id].append(specification)
+        expected = {
+            product.id: build_facets(product, specifications[product.id])
+            for product in products
+        }
+
+        existing = defaultdict(dict)
+        for row_id, product_id, facet, value in ProductFacet.objects.filter(
+            product_id__in=product_ids
+        ).values_list('id', 'product_id', 'facet', 'value'):
+            existing[product_id][(facet, value)] = row_id
+
+        added = []
+        synced = []
+        removed = []
+        removed_ids = []
+        for product_id in product_ids:
+            new = expected.get(product_id, set())
+            old = existing[product_id]
+            if new == set(old):
+                continue
+            added.extend((product_id, facet, value) for facet, value in new - set(old))
+            # 位图中写入商品的全部取值，之前同步失败未写入的取值随之补上
+            synced.extend((product_id, facet, value) for facet, value in new)
+            for key in set(old) - new:
+                removed.append((product_id, *key))
+                removed_ids.append(old[key])
+        if not synced and not removed:
+            return
+
+        ProductFacet.objects.filter(id__in=removed_ids).delete()
+        ProductFacet.objects.bulk_create([
+            ProductFacet(product_id=product_id, facet=facet, value=value)
+            for product_id, facet, value in added
+        ], ignore_conflicts=True)
+        transaction.on_commit(lambda: _sync_index(synced, removed))
+
+
+def index_product(product_id):
+    index_products([product_id])
+
+
+def index_category(path, batch_size=500):
+    """分类移动后更新子树下所有商品的分类维度"""
+    product_ids = list(
+        Product.objects.filter(Category.subtree_q(path, 'category__path')).values_list('id', flat=True)
+    )
+    for start in range(0, len(product_ids), batch_size):
+        index_products(product_ids[start:start + batch_size])
+
+
+def rebuild_facets(batch_size=500):
+    """
+    重建全部商品的筛选维度和位图索引，返回参与筛选的商品数量
+
+    按商品ID范围分批重建，每批在一个事务中删除该范围内的旧记录并写入新记录，重建期间筛选结果保持完整，
+    中途失败时已重建和未重建的范围都可用；批内商品行加锁，避免与增量更新交错写入
+    """
+    count = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            product_ids = list(
+                Product.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            products = list(Product.objects.filter(id__in=product_ids).select_related('category').order_by('id'))
+            specifications = defaultdict(list)
+            for specification in ProductSpecification.objects.filter(product_id__in=product_ids):
+                specifications[specification.product_id].append(specification)
+            rows = [
+                ProductFacet(product_id=product.id, facet=facet, value=value)
+                for product in products
+                for facet, value in build_facets(product, specifications[product.id])
+            ]
+            # 范围内已删除商品的记录一并删除，最后一批同时清理 ID 大于所有现存商品的残留记录
+            stale = ProductFacet.objects.filter(product_id__gt=last_id)
+            if product_ids:
+                stale = stale.filter(product_id__lte=product_ids[-1])
+            stale.delete()
+            ProductFacet.objects.bulk_create(rows, batch_size=batch_size * 10)
+        if not product_ids:
+            break
+        count += len({row.product_id for row in rows})
+        last_id = product_ids[-1]
+
+    get_facet_index().load(ProductFacet.objects.values_list('product_id', 'facet', 'value').iterator())
+    return count
+
+
+def parse_filters(query_params):
+    """
+    从查询参数中读取筛选条件，返回 {维度: [取值, ...]}
+
+    ?category=3&price=100-200,200-500&spec.颜色=黑色
+    """
+    filters = {}
+    for key in query_params:
+        if key in (CATEGORY, STATUS, PRICE) or key.startswith(SPEC_PREFIX):
+            values = [
+                value
+                for raw in query_params.getlist(key)
+                for value in raw.split(VALUE_SEPARATOR)
+                if value
+            ]
+            if values:
+                filters[key] = sorted(set(values))
+    return filters
+
+
+def filter_queryset(queryset, filters):
+    """按筛选条件过滤商品：维度之间求交，同一维度的多个取值求并"""
+    queryset = queryset.filter(is_active=True)
+    for facet, values in filters.items():
+        queryset = queryset.filter(
+            id__in=ProductFacet.objects.filter(facet=facet, value__in=values).values('product_id')
+        )
+    return queryset
+
+
+def price_histogram(price_counts):
+    """按区间顺序输出价格直方图"""
+    histogram = []
+    for position, lower in enumerate(PRICE_BUCKETS):
+        upper = PRICE_BUCKETS[position + 1] if position + 1 < len(PRICE_BUCKETS) else None
+        label = f'{lower}-{upper}' if upper is not None else f'{lower}+'
+        histogram.append({
+            'value': label,
+            'min': lower,
+            'max': upper,
+            'count': price_counts.get(label, 0),
+        })
+    return histogram
+
+
+def parse_facets(query_params, filters):
+    """
+    需要计数的维度：?facets=category,spec.颜色 指定，未指定时为 DEFAULT_FACETS；
+    有筛选条件的维度和价格（用于价格直方图）总是计数
+    """
+    raw = query_params.get('facets')
+    facets = {facet for facet in raw.split(VALUE_SEPARATOR) if facet} if raw else set(DEFAULT_FACETS)
+    return facets | set(filters) | {PRICE}
+
+
+def facet_counts(filters, facets):
+    """返回 (facets 中各维度取值的商品数, 价格直方图)，取值按商品数降序"""
+    counts = get_facet_index().count(filters, facets)
+    facets = {
+        facet: [
+            {'value': value, 'count': count}
+            for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))
+        ]
+        for facet, values in sorted(counts.items())
+        if facet != PRICE
+    }
+    return facets, price_histogram(counts.get(PRICE, {}))
@@ -0,0 +1,116 @@
+"""
+商品搜索倒排索引的维护与查询
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from apps.products.models import Product
+from .models import SearchToken
+from .tokenizer import is_cjk, tokenize, tokenize_query
+
+# 商品名称中的词项权重高于描述
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def build_terms(product):
+    """计算商品的 {词项: 权重}"""
+    weights = Counter()
+    for term in tokenize(product.name, unigrams=True):
+        weights[term] += NAME_WEIGHT
+    for term in tokenize(product.description, unigrams=True):
+        weights[term] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def index_product(product):
+    """增量更新单个商品的索引，词项未变化时不写库"""
+    terms = build_terms(product)
+    existing = dict(
+        SearchToken.objects.filter(product_id=product.pk).values_list('term', 'weight')
+    )
+    if existing == terms:
+        return
+
+    with transaction.atomic():
+        SearchToken.objects.filter(product_id=product.pk).delete()
+        SearchToken.objects.bulk_create([
+            SearchToken(term=term, product_id=product.pk, weight=weight)
+            for term, weight in terms.items()
+        ])
+
+
+def remove_product(product_id):
+    SearchToken.objects.filter(product_id=product_id).delete()
+
+
+def rebuild_index(batch_size=500):
+    """
+    重建全部索引，返回已索引的商品数量
+
+    按商品ID范围分批重建，每批在一个事务中删除该范围内的旧索引并写入新索引，
+    重建期间其余商品的索引保持可用；批内商品行加锁，避免与商品保存后的增量更新交错写入
+    """
+    count = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            products = list(
+                Product.objects.select_for_update()
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'name', 'description')[:batch_size]
+            )
+            # 最后一批同时清理 ID 大于所有现存商品的残留索引
+            stale = SearchToken.objects.filter(product_id__gt=last_id)
+            if products:
+                stale = stale.filter(product_id__lte=products[-1].id)
+            stale.delete()
+            SearchToken.objects.bulk_create([
+                SearchToken(term=term, product_id=product.pk, weight=weight)
+                for product in products
+                for term, weight in build_terms(product).items()
+            ], batch_size=batch_size * 10)
+        if not products:
+            break
+        count += len(products)
+        last_id = products[-1].id
+    return count
+
+
+def _term_condition(term):
+    # 英文/数字支持前缀匹配（如 "iph" 匹配 "iphone"），使用索引范围扫描
+    if is_cjk(term):
+        return Q(term=term)
+    return Q(term__startswith=term)
+
+
+def search_queryset(queryset, query):
+    """
+    按搜索词过滤商品 queryset，所有词项都需命中，
+    并以 search_score 注解相关度，按相关度降序排列
+    """
+    terms = tokenize_query(query)
+    if not terms:
+        return queryset.none()
+
+    any_term = Q()
+    for term in terms:
+        condition = _term_condition(term)
+        queryset = queryset.filter(
+            id__in=SearchToken.objects.filter(condition).values('product_id')
+        )
+        any_term |= condition
+
+    score = (
+        SearchToken.objects.filter(any_term, product_id=OuterRef('pk'))
+        .values('product_id')
+        .annotate(score=Sum('weight'))
+        .values('score')
+    )
+    return queryset.annotate(
+        search_score=Coalesce(Subquery(score, output_field=IntegerField()), 0)
+    ).order_by('-search_score', '-created_at')
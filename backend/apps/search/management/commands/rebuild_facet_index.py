@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.search.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = '重建商品筛选维度表和位图索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的商品数量')
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始重建商品筛选维度索引...')
+        count = rebuild_facets(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'筛选维度索引重建完成，共 {count} 个商品参与筛选'))
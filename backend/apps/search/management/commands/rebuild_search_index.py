@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.search.index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '重建商品搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批处理的商品数量')
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始重建商品搜索索引...')
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'搜索索引重建完成，共索引 {count} 个商品'))
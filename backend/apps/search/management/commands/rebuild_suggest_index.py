@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from apps.search.suggest import compact_suggestions, config, rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = '重建搜索联想词快照文件（同时刷新商品销量等权重），或将增量合并为新的快照'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compact', action='store_true',
+            help='只在增量超过 SEARCH_SUGGEST["DELTA_LIMIT"] 个条目时将其合并为新的快照，不查询数据库'
+        )
+        parser.add_argument('--loop', action='store_true', help='与 --compact 一起使用，持续运行，按间隔定期合并')
+        parser.add_argument('--interval', type=float, default=60, help='合并间隔（秒）')
+
+    def handle(self, *args, **options):
+        if not options['compact']:
+            self.stdout.write('开始重建搜索联想词快照...')
+            count = rebuild_suggestions()
+            self.stdout.write(self.style.SUCCESS(f'联想词快照重建完成，共 {count} 个条目，已写入 {config()["PATH"]}'))
+            return
+
+        while True:
+            count = compact_suggestions()
+            if count:
+                self.stdout.write(f'已将 {count} 个增量条目合并到联想词快照')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('联想词增量合并完成'))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0004_alter_category_options_alter_product_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='词项')),
+                ('weight', models.IntegerField(default=0, verbose_name='权重')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='products.product', verbose_name='商品')),
+            ],
+            options={
+                'verbose_name': '搜索索引',
+                'verbose_name_plural': '搜索索引',
+                'db_table': 'search_tokens',
+                'unique_together': {('term', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_category_path'),
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=100, verbose_name='维度')),
+                ('value', models.CharField(max_length=200, verbose_name='取值')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='products.product', verbose_name='商品')),
+            ],
+            options={
+                'verbose_name': '商品筛选维度',
+                'verbose_name_plural': '商品筛选维度',
+                'db_table': 'search_product_facets',
+                'indexes': [models.Index(fields=['facet', 'value'], name='search_prod_facet_e06c7c_idx')],
+                'unique_together': {('product', 'facet', 'value')},
+            },
+        ),
+    ]
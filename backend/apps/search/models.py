@@ -0,0 +1,37 @@
+from django.db import models
+from apps.products.models import Product
+
+
+class SearchToken(models.Model):
+    """商品搜索倒排索引：词项 -> 商品"""
+    term = models.CharField(max_length=64, verbose_name='词项')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens', verbose_name='商品')
+    weight = models.IntegerField(default=0, verbose_name='权重')
+
+    class Meta:
+        db_table = 'search_tokens'
+        verbose_name = '搜索索引'
+        verbose_name_plural = verbose_name
+        unique_together = ['term', 'product']
+
+    def __str__(self):
+        return f'{self.term} -> {self.product_id}'
+
+
+class ProductFacet(models.Model):
+    """商品所属的筛选维度取值，用于重建位图索引（见 facets.py）"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='facets', verbose_name='商品')
+    facet = models.CharField(max_length=100, verbose_name='维度')
+    value = models.CharField(max_length=200, verbose_name='取值')
+
+    class Meta:
+        db_table = 'search_product_facets'
+        verbose_name = '商品筛选维度'
+        verbose_name_plural = verbose_name
+        unique_together = ['product', 'facet', 'value']
+        indexes = [
+            models.Index(fields=['facet', 'value']),
+        ]
+
+    def __str__(self):
+        return f'{self.facet}={self.value} -> {self.product_id}'
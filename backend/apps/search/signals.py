@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from apps.products.models import Category, Product, ProductSpecification
+from . import facets, index, suggest
+from .facet_index import get_facet_index
+from .models import ProductFacet
+
+# 影响索引内容的字段
+INDEXED_FIELDS = {'name', 'description'}
+
+# 影响筛选维度的字段
+FACET_FIELDS = {'category', 'category_id', 'price', 'status', 'is_active'}
+
+# 影响联想词的字段
+SUGGEST_FIELDS = {'name', 'is_active'}
+
+
+@receiver(post_save, sender=Product)
+def update_product_index(sender, instance, update_fields=None, **kwargs):
+    """商品保存后增量更新索引（仅更新库存、销量等字段时跳过）"""
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(lambda: index.index_product(instance))
+
+
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, update_fields=None, **kwargs):
+    """商品保存后增量更新筛选维度"""
+    if update_fields is not None and not FACET_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(lambda: facets.index_product(instance.pk))
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestions(sender, instance, update_fields=None, **kwargs):
+    """商品名称或上下架变化后更新联想词"""
+    if update_fields is not None and not SUGGEST_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(lambda: suggest.update_suggestions(product_ids=[instance.pk]))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggest.update_suggestions(product_ids=[product_id]))
+
+
+@receiver(pre_delete, sender=Product)
+def remove_product_facets(sender, instance, **kwargs):
+    """商品删除时 ProductFacet 随之级联删除，提交后从位图索引中移除"""
+    removed = [
+        (instance.pk, facet, value)
+        for facet, value in ProductFacet.objects.filter(product_id=instance.pk).values_list('facet', 'value')
+    ]
+    if removed:
+        transaction.on_commit(lambda: get_facet_index().update(removed=removed))
+
+
+@receiver([post_save, post_delete], sender=ProductSpecification)
+def update_specification_facets(sender, instance, **kwargs):
+    """规格变更"""
+    transaction.on_commit(lambda: facets.index_product(instance.product_id))
+
+
+@receiver(post_save, sender=Category)
+def update_category_facets(sender, instance, **kwargs):
+    """分类移动后子树下商品的上级分类发生变化（移动前的路径由 Category.save 记录）"""
+    previous_path = getattr(instance, '_previous_path', None)
+    if previous_path and previous_path != instance.path:
+        transaction.on_commit(lambda: facets.index_category(instance.path))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: suggest.update_suggestions(category_ids=[category_id]))
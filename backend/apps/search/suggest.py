@@ -0,0 +1,547 @@
+"""
+搜索联想（输入提示）
+
+联想条目为上架商品和启用分类的名称，每个名称生成若干匹配键，输入内容是某个匹配键的前缀即命中：
+    名称本身及从其中每个单词开始的后缀    "apple iphone 15" -> "apple iphone 15", "iphone 15", "15"
+    中文的拼音首字母（需安装 pypinyin）    "苹果手机" -> "pgsj"
+
+全部匹配键按字节序排序后写入快照文件，查询时对内存映射（mmap）的文件二分查找前缀所在区间，
+再按条目权重（商品销量、分类下的商品数）取前 N 个，不查询数据库。
+快照文件由同一台机器上的所有 worker 进程共享，操作系统只在页缓存中保留一份。
+
+商品或分类变更时不重写整个快照，而是改写一个较小的增量文件（变更后的条目和需要屏蔽的旧条目），
+查询时合并两者。增量超过 DELTA_LIMIT 个条目后由 rebuild_suggest_index --compact 在后台合并为新的快照，
+请求中只写增量文件，不生成快照。
+销量变化不会触发增量更新，权重在 rebuild_suggest_index 重建快照时刷新。
+
+快照文件格式（整数均为本机字节序的 uint32）：
+    头部            魔数、版本号、匹配键数量、条目数量、热门前缀数量、每个热门前缀保存的条目数
+    key_offsets     每个匹配键在键区的起止位置（数量 + 1）
+    key_entries     匹配键所属的条目下标
+    key_weights     匹配键所属条目的权重，排序时无需解码条目
+    entry_offsets   每个条目在条目区的起止位置（数量 + 1）
+    hot_offsets     每个热门前缀在热门前缀区的起止位置（数量 + 1）
+    hot_entries     每个热门前缀权重最高的条目下标，不足时以 0xFFFFFFFF 补齐
+    键区            UTF-8 编码的匹配键，按字节序排列
+    条目区          JSON 编码的 [类型, ID, 名称, 权重]
+    热门前缀区      按字节序排列的热门前缀
+"""
+import bisect
+import contextlib
+import fcntl
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count
+
+from apps.products.models import Category, Product
+from .facets import CATEGORY as CATEGORY_FACET
+from .models import ProductFacet
+from .tokenizer import is_cjk, word_starts
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时不生成拼音首字母
+    lazy_pinyin = None
+
+DEFAULTS = {
+    'PATH': os.path.join(settings.BASE_DIR, 'var', 'search', 'suggest.idx'),
+    'DELTA_LIMIT': 1000,
+    'LIMIT': 10,
+    'MAX_LIMIT': 20,  # 不超过 HOT_SIZE
+}
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+
+MAGIC = b'SUGGEST2'
+HEADER = struct.Struct('=8sIIIII')
+UINT32_MAX = 2 ** 32 - 1
+
+# 匹配键的最大长度（字符），更长的输入只按前 MAX_KEY_LENGTH 个字符匹配
+MAX_KEY_LENGTH = 64
+
+# 命中超过 HOT_THRESHOLD 个匹配键的前缀（如单个字母）在生成快照时预先计算权重最高的 HOT_SIZE 个条目，
+# 其余前缀查询时最多考察 HOT_THRESHOLD 个键，单次查询耗时有上限
+HOT_THRESHOLD = 1000
+HOT_SIZE = 50
+
+# 增量屏蔽了过多热门条目时回退为扫描区间，最多考察的匹配键数量
+MAX_SCAN = 20000
+
+# 键区中不会出现的字节，前缀后接该字节即为前缀区间的上界
+_UPPER_SENTINEL = b'\xff'
+
+Entry = namedtuple('Entry', ['type', 'id', 'text', 'weight'])
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'SEARCH_SUGGEST', {})}
+
+
+def normalize(text):
+    """转为小写并合并连续空白"""
+    return ' '.join((text or '').lower().split())[:MAX_KEY_LENGTH]
+
+
+def pinyin_initials(text):
+    """中文字符的拼音首字母，'苹果 iPhone 手机' -> 'pgsj'"""
+    if lazy_pinyin is None or not any(is_cjk(char) for char in text):
+        return ''
+    return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER, errors='ignore')).lower()
+
+
+def build_keys(text):
+    """名称的全部匹配键"""
+    text = normalize(text)
+    keys = {text[start:] for start in word_starts(text)}
+    keys.add(text)
+    initials = pinyin_initials(text)
+    if initials:
+        keys.add(initials)
+    keys.discard('')
+    return keys
+
+
+def _weight(value):
+    return min(max(int(value or 0), 0), UINT32_MAX)
+
+
+def build_entries(product_ids=None, category_ids=None):
+    """
+    从数据库读取联想条目，ids 为 None 时读取全部
+
+    分类的权重为其子树下参与筛选的商品数，直接统计 ProductFacet 中的 category 维度
+    """
+    entries = []
+    if product_ids is None or product_ids:
+        products = Product.objects.filter(is_active=True)
+        if product_ids is not None:
+            products = products.filter(id__in=product_ids)
+        entries.extend(
+            Entry(PRODUCT, product_id, name, _weight(sales))
+            for product_id, name, sales in products.values_list('id', 'name', 'sales').iterator()
+        )
+    if category_ids is None or category_ids:
+        categories = Category.objects.filter(is_active=True)
+        if category_ids is not None:
+            categories = categories.filter(id__in=category_ids)
+        categories = list(categories.values_list('id', 'name'))
+        counts = dict(
+            ProductFacet.objects.filter(
+                facet=CATEGORY_FACET, value__in=[str(category_id) for category_id, _ in categories]
+            ).values('value').annotate(count=Count('id')).values_list('value', 'count')
+        )
+        entries.extend(
+            Entry(CATEGORY, category_id, name, _weight(counts.get(str(category_id))))
+            for category_id, name in categories
+        )
+    return entries
+
+
+def _atomic_write(path, chunks):
+    """先写临时文件再改名，已打开旧文件的进程继续读取旧内容，不会读到写了一半的文件"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def _top_entries(key_entries, key_weights, low, high):
+    """匹配键区间内权重最高的 HOT_SIZE 个不同条目的下标"""
+    size = HOT_SIZE * 2
+    while True:
+        result = []
+        for i in heapq.nlargest(size, range(low, high), key=key_weights.__getitem__):
+            if key_entries[i] not in result:
+                result.append(key_entries[i])
+                if len(result) == HOT_SIZE:
+                    return result
+        if size >= high - low:
+            return result
+        size *= 4
+
+
+def _hot_prefixes(keys, key_entries, key_weights):
+    """
+    命中超过 HOT_THRESHOLD 个匹配键的（字节）前缀及其权重最高的条目
+
+    keys 已排序，同一前缀的键是连续的，逐层按下一个字节拆分区间，区间不超过阈值时停止
+    """
+    hot = []
+    stack = [(0, len(keys), 0)]
+    while stack:
+        low, high, depth = stack.pop()
+        if high - low <= HOT_THRESHOLD:
+            continue
+        if depth:
+            hot.append((keys[low][0][:depth], _top_entries(key_entries, key_weights, low, high)))
+        # 与前缀相同的键排在最前面，不再拆分
+        i = low
+        while i < high and len(keys[i][0]) == depth:
+            i += 1
+        while i < high:
+            prefix = keys[i][0][:depth + 1]
+            j = bisect.bisect_left(keys, (prefix + _UPPER_SENTINEL,), i, high)
+            stack.append((i, j, depth + 1))
+            i = j
+    hot.sort()
+    return hot
+
+
+def _strings(values):
+    """拼接变长字节串，返回 (起止位置, 拼接结果)"""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in values:
+        blob += value
+        offsets.append(len(blob))
+    return offsets, blob
+
+
+def write_snapshot(path, entries):
+    """将条目写入新的快照文件，返回快照版本号"""
+    keys = sorted(
+        (key.encode('utf-8'), index)
+        for index, entry in enumerate(entries)
+        for key in build_keys(entry.text)
+    )
+    key_offsets, key_blob = _strings(key for key, _ in keys)
+    key_entries = array('I', (index for _, index in keys))
+    key_weights = array('I', (entries[index].weight for _, index in keys))
+    hot = _hot_prefixes(keys, key_entries, key_weights)
+    entry_offsets, entry_blob = _strings(
+        json.dumps(list(entry), ensure_ascii=False).encode('utf-8') for entry in entries
+    )
+    hot_offsets, hot_blob = _strings(prefix for prefix, _ in hot)
+    hot_entries = array('I')
+    for _, indexes in hot:
+        hot_entries.extend(indexes + [UINT32_MAX] * (HOT_SIZE - len(indexes)))
+
+    generation = int.from_bytes(os.urandom(4), 'little')
+    _atomic_write(path, [
+        HEADER.pack(MAGIC, generation, len(keys), len(entries), len(hot), HOT_SIZE),
+        key_offsets.tobytes(),
+        key_entries.tobytes(),
+        key_weights.tobytes(),
+        entry_offsets.tobytes(),
+        hot_offsets.tobytes(),
+        hot_entries.tobytes(),
+        key_blob,
+        entry_blob,
+        hot_blob,
+    ])
+    return generation
+
+
+class _Strings:
+    """快照中的一组变长字节串，实现序列协议供 bisect 二分查找"""
+
+    def __init__(self, mm, base, offsets):
+        self.mm = mm
+        self.base = base
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.mm[self.base + self.offsets[i]:self.base + self.offsets[i + 1]]
+
+
+class Snapshot:
+    """内存映射的只读快照"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, key_count, entry_count, hot_count, self.hot_size = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f'{path} 不是联想词快照文件')
+
+        view = memoryview(self.mm)
+        position = HEADER.size
+
+        def uint32s(count):
+            nonlocal position
+            result = view[position:position + count * 4].cast('I')
+            position += count * 4
+            return result
+
+        key_offsets = uint32s(key_count + 1)
+        self.key_entries = uint32s(key_count)
+        self.key_weights = uint32s(key_count)
+        entry_offsets = uint32s(entry_count + 1)
+        hot_offsets = uint32s(hot_count + 1)
+        self.hot_entries = uint32s(hot_count * self.hot_size)
+
+        self.keys = _Strings(self.mm, position, key_offsets)
+        position += key_offsets[key_count]
+        self.entry_blobs = _Strings(self.mm, position, entry_offsets)
+        position += entry_offsets[entry_count]
+        self.hot_prefixes = _Strings(self.mm, position, hot_offsets)
+
+    def entry(self, index):
+        return Entry(*json.loads(self.entry_blobs[index]))
+
+    def entries(self):
+        for index in range(len(self.entry_blobs)):
+            yield self.entry(index)
+
+    def _hot(self, prefix):
+        """预先计算的热门前缀结果，不是热门前缀时返回 None"""
+        position = bisect.bisect_left(self.hot_prefixes, prefix)
+        if position == len(self.hot_prefixes) or self.hot_prefixes[position] != prefix:
+            return None
+        row = self.hot_entries[position * self.hot_size:(position + 1) * self.hot_size]
+        return [index for index in row if index != UINT32_MAX]
+
+    def top(self, prefix, limit, exclude=()):
+        """
+        前缀命中的条目，按权重降序，最多 limit 个
+
+        命中键较多的前缀直接读取预先计算的结果；其余前缀的区间不超过 HOT_THRESHOLD 个键，
+        取权重最高的若干个键，同一条目的多个键、被增量屏蔽的条目会占用名额，不足时扩大候选数量重新选取
+        """
+        hot = self._hot(prefix)
+        if hot is not None:
+            results = [entry for entry in map(self.entry, hot) if (entry.type, entry.id) not in exclude]
+            # 预先计算的条目不足 hot_size 个说明已包含全部命中的条目
+            if len(results) >= limit or len(hot) < self.hot_size:
+                return results[:limit]
+
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + _UPPER_SENTINEL, low)
+        candidates = range(low, min(high, low + MAX_SCAN))
+        size = limit * 3
+        while True:
+            results = []
+            seen = set()
+            for i in heapq.nlargest(size, candidates, key=self.key_weights.__getitem__):
+                index = self.key_entries[i]
+                if index in seen:
+                    continue
+                seen.add(index)
+                entry = self.entry(index)
+                if (entry.type, entry.id) in exclude:
+                    continue
+                results.append(entry)
+                if len(results) == limit:
+                    return results
+            if size >= len(candidates):
+                return results
+            size *= 4
+
+
+class Delta:
+    """增量文件的内容，entries 为 {(类型, ID): 条目}，removed 为需要屏蔽的 {(类型, ID)}"""
+
+    def __init__(self, generation, entries=(), removed=()):
+        self.generation = generation
+        self.entries = {(entry.type, entry.id): entry for entry in entries}
+        self.removed = set(removed)
+        self._keys = None
+
+    @classmethod
+    def load(cls, path, generation):
+        """读取增量文件，文件不存在或不属于当前快照时返回空的增量"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(generation)
+        if data.get('generation') != generation:
+            return cls(generation)
+        return cls(
+            generation,
+            [Entry(*entry) for entry in data['entries']],
+            [tuple(key) for key in data['removed']],
+        )
+
+    def save(self, path):
+        data = {
+            'generation': self.generation,
+            'entries': [list(entry) for entry in self.entries.values()],
+            'removed': [list(key) for key in self.removed],
+        }
+        _atomic_write(path, [json.dumps(data, ensure_ascii=False).encode('utf-8')])
+
+    def __len__(self):
+        return len(self.entries) + len(self.removed)
+
+    @property
+    def masked(self):
+        """快照中需要屏蔽的条目：已删除的和在增量中有新版本的"""
+        return self.removed | set(self.entries)
+
+    def top(self, prefix, limit):
+        if self._keys is None:
+            self._keys = sorted(
+                (key.encode('utf-8'), entry)
+                for entry in self.entries.values()
+                for key in build_keys(entry.text)
+            )
+        low = bisect.bisect_left(self._keys, (prefix,))
+        high = bisect.bisect_left(self._keys, (prefix + _UPPER_SENTINEL,), low)
+        results = {}
+        for _, entry in self._keys[low:high]:
+            results[(entry.type, entry.id)] = entry
+        return heapq.nlargest(limit, results.values(), key=lambda entry: entry.weight)
+
+
+def _delta_path(path):
+    return f'{path}.delta'
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class SuggestIndex:
+    """
+    进程内的查询入口
+
+    每次查询前检查快照和增量文件是否被替换（一次 stat 系统调用），有变化时重新映射
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stamps = None
+        # (快照, 增量, 快照中被屏蔽的条目)，整体替换，并发查询不会读到不匹配的快照和增量
+        self.state = (None, None, frozenset())
+
+    def _refresh(self):
+        stamps = (_file_stamp(self.path), _file_stamp(_delta_path(self.path)))
+        if stamps == self.stamps:
+            return
+        with self.lock:
+            if stamps == self.stamps:
+                return
+            if stamps[0] is None:
+                self.state = (None, None, frozenset())
+            else:
+                snapshot = Snapshot(self.path)
+                delta = Delta.load(_delta_path(self.path), snapshot.generation)
+                self.state = (snapshot, delta, frozenset(delta.masked))
+            self.stamps = stamps
+
+    def suggest(self, query, limit):
+        """返回 [条目, ...]，按权重降序"""
+        prefix = normalize(query).encode('utf-8')
+        if not prefix:
+            return []
+        self._refresh()
+        snapshot, delta, masked = self.state
+        if snapshot is None:
+            return []
+        results = snapshot.top(prefix, limit, exclude=masked)
+        if delta:
+            results = heapq.nlargest(limit, results + delta.top(prefix, limit), key=lambda entry: entry.weight)
+        return results
+
+
+_index = None
+
+
+def get_suggest_index():
+    global _index
+    path = config()['PATH']
+    if _index is None or _index.path != path:
+        _index = SuggestIndex(path)
+    return _index
+
+
+def suggest(query, limit=None):
+    """联想查询，返回可直接序列化的 [{'type', 'id', 'text'}, ...]"""
+    options = config()
+    limit = min(limit or options['LIMIT'], options['MAX_LIMIT'])
+    return [
+        {'type': entry.type, 'id': entry.id, 'text': entry.text}
+        for entry in get_suggest_index().suggest(query, limit)
+    ]
+
+
+@contextlib.contextmanager
+def _write_lock(path):
+    """多个进程同时更新快照时按文件锁串行执行"""
+    with open(f'{path}.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def rebuild_suggestions():
+    """从数据库重建快照并清空增量，返回条目数量"""
+    path = config()['PATH']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _write_lock(path):
+        entries = build_entries()
+        write_snapshot(path, entries)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(_delta_path(path))
+    return len(entries)
+
+
+def update_suggestions(product_ids=(), category_ids=()):
+    """
+    增量更新部分商品和分类的联想条目，只改写增量文件，合并由 compact_suggestions() 在后台完成
+
+    尚未建立快照时不做任何事，快照由 rebuild_suggest_index 命令生成
+    """
+    path = config()['PATH']
+    if not os.path.exists(path):
+        return
+    product_ids, category_ids = set(product_ids), set(category_ids)
+    with _write_lock(path):
+        snapshot = Snapshot(path)
+        delta = Delta.load(_delta_path(path), snapshot.generation)
+        current = {(entry.type, entry.id): entry for entry in build_entries(product_ids, category_ids)}
+        changed = {(PRODUCT, product_id) for product_id in product_ids}
+        changed |= {(CATEGORY, category_id) for category_id in category_ids}
+        for key in changed:
+            if key in current:
+                delta.entries[key] = current[key]
+                delta.removed.discard(key)
+            else:
+                delta.entries.pop(key, None)
+                delta.removed.add(key)
+        delta.save(_delta_path(path))
+
+
+def compact_suggestions(force=False):
+    """
+    增量超过 DELTA_LIMIT 个条目（force 时只要不为空）时合并为新的快照，返回合并的增量条目数量
+
+    只读取快照和增量文件，不查询数据库
+    """
+    options = config()
+    path = options['PATH']
+    if not os.path.exists(path):
+        return 0
+    with _write_lock(path):
+        snapshot = Snapshot(path)
+        delta = Delta.load(_delta_path(path), snapshot.generation)
+        if not delta or (not force and len(delta) <= options['DELTA_LIMIT']):
+            return 0
+        masked = delta.masked
+        entries = [entry for entry in snapshot.entries() if (entry.type, entry.id) not in masked]
+        entries.extend(delta.entries.values())
+        write_snapshot(path, entries)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(_delta_path(path))
+    return len(delta)
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.products.models import Category, Product, ProductSpecification
+from apps.users.models import User
+from . import facets
+from .facets import PRICE, STATUS, build_facets, index_products, rebuild_facets
+from .index import rebuild_index
+from .models import ProductFacet, SearchToken
+
+
+class RebuildIndexTest(TestCase):
+    """按商品ID范围分批重建搜索索引"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='手机')
+        cls.products = [
+            Product.objects.create(category=category, name=name, description='', price=100, stock=10)
+            for name in ['iPhone', 'Galaxy', 'Pixel']
+        ]
+
+    def terms(self, product):
+        return set(SearchToken.objects.filter(product=product).values_list('term', flat=True))
+
+    def test_rebuild_in_batches(self):
+        rebuild_index()
+        # 不触发信号的修改，索引中仍是旧词项
+        Product.objects.filter(id=self.products[1].id).update(name='Nokia')
+        self.assertIn('galaxy', self.terms(self.products[1]))
+
+        self.assertEqual(rebuild_index(batch_size=2), 3)
+        self.assertIn('nokia', self.terms(self.products[1]))
+        self.assertNotIn('galaxy', self.terms(self.products[1]))
+        self.assertIn('iphone', self.terms(self.products[0]))
+        self.assertIn('pixel', self.terms(self.products[2]))
+
+
+@override_settings(CACHE_TTL={})
+class FacetCountTest(TestCase):
+    """分面计数：只计数请求的维度和有筛选条件的维度"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', 'tester@example.com', 'test123456')
+        cls.category = Category.objects.create(name='手机')
+        for price, color in [(99, '黑色'), (150, '白色'), (160, '黑色')]:
+            product = Product.objects.create(
+                category=cls.category, name='手机', description='', price=price, stock=10, status='published'
+            )
+            ProductSpecification.objects.create(product=product, name='颜色', value=color)
+
+    def setUp(self):
+        rebuild_facets()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def facets(self, **params):
+        return self.client.get('/products/products/facets/', params).data['facets']
+
+    def test_requested_facets(self):
+        self.assertEqual(set(self.facets()), {'category', 'status'})
+        self.assertEqual(set(self.facets(facets='spec.颜色')), {'spec.颜色'})
+        # 有筛选条件的维度总是计数，且不受自身筛选条件影响
+        facets = self.facets(**{'spec.颜色': '黑色'})
+        self.assertEqual(facets['spec.颜色'], [{'value': '黑色', 'count': 2}, {'value': '白色', 'count': 1}])
+        self.assertEqual(facets['category'], [{'value': str(self.category.id), 'count': 2}])
+
+    def test_index_products(self):
+        # 缺少和错误的取值在增量更新时修正，重复的商品ID只处理一次
+        product = Product.objects.filter(price=99).get()
+        ProductFacet.objects.filter(product=product, facet=PRICE).delete()
+        ProductFacet.objects.filter(product=product, facet=STATUS).update(value='draft')
+        index_products([product.id, product.id])
+        self.assertEqual(
+            set(ProductFacet.objects.filter(product=product).values_list('facet', 'value')),
+            build_facets(product, product.specifications.all())
+        )
+
+    def test_rebuild_in_batches(self):
+        products = list(Product.objects.order_by('id'))
+        expected = set(ProductFacet.objects.values_list('product_id', 'facet', 'value'))
+        ProductFacet.objects.filter(product=products[0], facet=STATUS).update(value='draft')
+        ProductFacet.objects.filter(product=products[2], facet=PRICE).delete()
+
+        # 第二批失败时第一批已重建，第二批的记录保持原样，筛选不会缺少商品
+        def fail_on_third(product, specifications):
+            if product.id == products[2].id:
+                raise RuntimeError
+            return build_facets(product, specifications)
+
+        with mock.patch.object(facets, 'build_facets', fail_on_third), self.assertRaises(RuntimeError):
+            rebuild_facets(batch_size=2)
+        self.assertEqual(
+            set(ProductFacet.objects.filter(product=products[0]).values_list('facet', 'value')),
+            build_facets(products[0], products[0].specifications.all())
+        )
+        self.assertEqual(ProductFacet.objects.filter(product=products[2]).count(), len(build_facets(
+            products[2], products[2].specifications.all()
+        )) - 1)
+
+        self.assertEqual(rebuild_facets(batch_size=2), 3)
+        self.assertEqual(set(ProductFacet.objects.values_list('product_id', 'facet', 'value')), expected)
@@ -0,0 +1,53 @@
+"""
+搜索分词
+
+中文（CJK）连续字符按二元组（bigram）切分，英文和数字按单词切分，统一转为小写。
+例如 "Apple 苹果手机" -> ["apple", "苹果", "果手", "手机"]
+
+建立索引时额外为每个中文字符生成单字词项，以支持单字搜索。
+"""
+import re
+
+# CJK 统一表意文字及扩展 A 区、兼容表意文字
+_CJK = '㐀-䶿一-鿿豈-﫿'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[a-z0-9]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+MAX_TERM_LENGTH = 64
+
+
+def is_cjk(text):
+    return bool(_CJK_RE.match(text))
+
+
+def tokenize(text, unigrams=False):
+    """
+    将文本切分为词项列表（保留重复项，用于统计词频）
+
+    unigrams=True 时为中文额外生成单字词项
+    """
+    if not text:
+        return []
+
+    terms = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if not is_cjk(run):
+            terms.append(run[:MAX_TERM_LENGTH])
+            continue
+        if len(run) == 1:
+            terms.append(run)
+            continue
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if unigrams:
+            terms.extend(run)
+    return terms
+
+
+def tokenize_query(text):
+    """将搜索词切分为去重后的词项列表，保持原有顺序"""
+    return list(dict.fromkeys(tokenize(text)))
+
+
+def word_starts(text):
+    """文本中每个英文单词、数字串和中文连续字符串的起始位置（文本应已转为小写）"""
+    return [match.start() for match in _TOKEN_RE.finditer(text)]
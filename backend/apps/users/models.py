@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.core.validators import RegexValidator
+from apps.core.dirty_fields import DirtyFieldsMixin
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, username, email, password=None, **extra_fields):
@@ -26,7 +27,7 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(username, email, password, **extra_fields)
 
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     # 移除 first_name 和 last_name
     first_name = None
     last_name = None
@@ -64,7 +65,7 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
-class UserAddress(models.Model):
+class UserAddress(DirtyFieldsMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='addresses')
     receiver = models.CharField(max_length=50, verbose_name='收货人')
     phone = models.CharField(
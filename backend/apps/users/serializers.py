@@ -2,16 +2,17 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from .models import UserAddress
+from apps.core.profiling import ProfiledSerializerMixin
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'phone', 'created_at', 'updated_at')
         read_only_fields = ('created_at', 'updated_at')
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
 
@@ -29,7 +30,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class ChangePasswordSerializer(serializers.Serializer):
+class ChangePasswordSerializer(ProfiledSerializerMixin, serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True, validators=[validate_password])
     new_password2 = serializers.CharField(required=True)
@@ -39,7 +40,7 @@ class ChangePasswordSerializer(serializers.Serializer):
             raise serializers.ValidationError({"new_password": "两次输入的密码不匹配"})
         return attrs
 
-class UserAddressSerializer(serializers.ModelSerializer):
+class UserAddressSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAddress
         fields = ('id', 'receiver', 'phone', 'province', 'city', 'district', 'address', 'is_default', 'created_at', 'updated_at')
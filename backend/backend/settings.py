@@ -14,6 +14,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 import pymysql
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,9 +54,13 @@ INSTALLED_APPS = [
     'apps.coupons.apps.CouponsConfig',
     'apps.returns.apps.ReturnsConfig',
     'apps.cart.apps.CartConfig',
+    'apps.search.apps.SearchConfig',
+    'apps.inventory.apps.InventoryConfig',
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestProfilingMiddleware',  # 放在第一位，统计完整的请求耗时
+    'apps.core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -174,7 +179,7 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'apps.core.profiling.ProfiledJSONRenderer',  # JSONRenderer，同时记录渲染耗时
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
@@ -205,6 +210,8 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
@@ -216,10 +223,99 @@ CACHES = {
     }
 }
 
+# Cart storage settings
+CART_STORAGE = {
+    'BACKEND': 'apps.cart.storage.RedisCartStorage',
+    'REDIS_URL': 'redis://127.0.0.1:6379/2',
+    'TTL': 7 * 24 * 3600,  # 热数据过期时间（秒），过期后从数据库重新加载
+}
+
+# Coupon claim quota settings
+COUPON_QUOTA = {
+    'BACKEND': 'apps.coupons.quota.RedisQuotaCounter',
+    'REDIS_URL': 'redis://127.0.0.1:6379/3',
+}
+
+# Coupon expiry (expire_coupons command)
+COUPON_EXPIRY = {
+    'RECHECK_WINDOW': 3600,  # 优惠券结束后继续检查晚落库的领取记录的时间（秒）
+}
+
+# Product facet bitmap index settings
+FACET_INDEX = {
+    'BACKEND': 'apps.search.facet_index.RedisFacetIndex',
+    'REDIS_URL': 'redis://127.0.0.1:6379/4',
+}
+
+# Partial saves (apps.core.dirty_fields)
+DIRTY_FIELDS = {
+    'WARN_FULL_SAVE': DEBUG,  # 未跟踪修改的实例整行保存时记录警告
+}
+
+# Idempotency-Key settings (order creation and payment)
+IDEMPOTENCY = {
+    'TTL': 24 * 3600,  # 成功响应的保存时间（秒）
+    'LOCK_TIMEOUT': 60,  # 处理锁的过期时间（秒），不小于 uwsgi.ini 中的 harakiri
+    'WAIT': 10,  # 并发的重复请求等待首次请求完成的最长时间（秒）
+    'POLL_INTERVAL': 0.1,
+}
+
+# Snowflake order / payment number settings (apps.core.snowflake)
+SNOWFLAKE = {
+    # 机器号（0-31）从环境变量 SNOWFLAKE_MACHINE_ID 读取，没有默认值，多机部署时每台机器必须不同
+    'MACHINE_ID': os.environ.get('SNOWFLAKE_MACHINE_ID'),
+    'LEASE_IDS': (16, 31),  # 管理命令等非 uWSGI 进程租用的进程号，uWSGI processes 不能超过 15
+    'LEASE_TTL': 3600,  # 进程号租约有效期（秒），保存在默认缓存中
+}
+
+# Order settings
+ORDERS = {
+    'UNPAID_TIMEOUT': 30 * 60,  # 超时未支付的订单由 cancel_unpaid_orders 取消（秒），不小于 RESERVATION_TTL
+}
+
+# Inventory reservation settings
+INVENTORY = {
+    'RESERVATION_TTL': 30 * 60,  # 下单后预占库存的保留时间（秒），超时未支付由 release_expired_reservations 释放
+}
+
+# Search suggestion (typeahead) settings
+SEARCH_SUGGEST = {
+    'PATH': os.path.join(BASE_DIR, 'var', 'search', 'suggest.idx'),  # 各进程共享的快照文件，需位于本机磁盘
+    'DELTA_LIMIT': 1000,  # 增量条目超过该数量时由 rebuild_suggest_index --compact 合并为新快照
+    'LIMIT': 10,
+    'MAX_LIMIT': 20,
+}
+
 # Cache timeout settings
 CACHE_TTL = {
     'PRODUCT_LIST': 300,  # 5 minutes
     'PRODUCT_DETAIL': 3600,  # 1 hour
     'CATEGORY_LIST': 3600,  # 1 hour
+    'CATEGORY_TREE': 3600,  # 1 hour
     'PRODUCT_SPECIFICATIONS': 3600,  # 1 hour
 }
+
+# Mock payment gateway settings
+PAYMENT_GATEWAY = {
+    'CALLBACK_URL': 'http://127.0.0.1:8000/orders/orders/payment_callback/',
+    'SECRET': SECRET_KEY,
+    'DELAY': 1,  # 模拟支付耗时（秒）
+}
+
+# Request profiling settings
+REQUEST_PROFILING = {
+    'ENABLED': True,
+    'SERVER_TIMING': DEBUG,  # Server-Timing 头会暴露内部耗时，仅在调试时返回
+    'DIR': os.path.join(BASE_DIR, 'var', 'profiling'),  # 各进程的统计快照目录
+    'WINDOW': 60,  # 时间窗口长度（秒）
+    'RETENTION': 60,  # 保留的窗口数量
+    'FLUSH_INTERVAL': 10,  # 写入快照的最小间隔（秒）
+}
+
+# Prometheus metrics settings
+METRICS = {
+    'ENABLED': True,
+    'DIR': os.path.join(BASE_DIR, 'var', 'metrics'),  # 各 uWSGI worker 的指标快照目录
+    'FLUSH_INTERVAL': 5,  # 写入快照的最小间隔（秒）
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],  # 允许访问 /metrics 的 IP，为空时不限制
+}
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from apps.core.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +28,7 @@ urlpatterns = [
     path('orders/', include('apps.orders.urls')),  # 订单相关API
     path('coupons/', include('apps.coupons.urls')),  # 消费券相关API
     path('returns/', include('apps.returns.urls')),  # 退换货相关API
+    path('metrics', metrics_view, name='metrics'),  # Prometheus 指标
 ]
 
 # 开发环境下添加媒体文件的URL配置
@@ -10,18 +10,29 @@ export function getOrderList(params) {
 }
 
 // 获取订单详情
-export function getOrderDetail(id) {
+export function getOrderDetail(id, params) {
   return request({
     url: `/orders/orders/${id}/`,
-    method: 'get'
+    method: 'get',
+    params
   })
 }
 
-// 创建订单
-export function createOrder(data) {
+// 创建订单，idempotencyKey 在重试时保持不变，避免重复下单
+export function createOrder(data, idempotencyKey) {
   return request({
     url: '/orders/orders/',
     method: 'post',
+    data,
+    headers: { 'Idempotency-Key': idempotencyKey }
+  })
+}
+
+// 结算试算，返回订单金额和按优惠金额排序的优惠券
+export function quoteOrder(data) {
+  return request({
+    url: '/orders/orders/quote/',
+    method: 'post',
     data
   })
 }
@@ -34,12 +45,13 @@ export function cancelOrder(id) {
   })
 }
 
-// 支付订单
-export function payOrder(id, data) {
+// 支付订单，idempotencyKey 在重试时保持不变，避免重复发起支付
+export function payOrder(id, data, idempotencyKey) {
   return request({
     url: `/orders/orders/${id}/pay/`,
     method: 'post',
-    data
+    data,
+    headers: { 'Idempotency-Key': idempotencyKey }
   })
 }
 
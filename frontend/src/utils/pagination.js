@@ -0,0 +1,9 @@
+/**
+ * 从分页接口返回的 next/previous 链接中取出游标
+ * @param {string|null} link - 接口返回的翻页链接
+ * @returns {string|null} 游标，链接为空或不带游标（即第一页）时返回 null
+ */
+export function getCursor(link) {
+  if (!link) return null
+  return new URL(link, window.location.origin).searchParams.get('cursor')
+}